@@ -6,7 +6,10 @@ try:
     from .settings import *
     from . import erkloader
     from . import rdfstack
+    from . import queryengine
     from . import ruleengine
+    from . import triplestore
+    from . import snapshot
     from . import auxiliary as aux
 except ImportError:
     # this might be relevant during the installation process
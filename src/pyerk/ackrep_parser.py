@@ -87,6 +87,7 @@ def load_ackrep_entities(base_path: str = None, strict: bool = True, prefix="ack
     # core.ds.uri_prefix_mapping.add_pair(__URI__, prefix)
     core.register_mod(__URI__, keymanager, check_uri=False)
     core.ds.uri_prefix_mapping.add_pair(__URI__, "mod")
+    core.ds.invalidate_key_str_cache()
     core.ds.uri_mod_dict[__URI__] = mod
 
     retcodes = []
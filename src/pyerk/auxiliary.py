@@ -1,6 +1,9 @@
 import os
 import sys
 import re as regex
+from collections import OrderedDict
+from collections.abc import MutableMapping, MutableSet
+from itertools import islice
 from typing import Iterable, Union, Dict, Any
 from rdflib import Literal
 from colorama import Style, Fore
@@ -63,6 +66,132 @@ class ListWithAttributes(list):
     var: Iterable
 
 
+class OrderedSet(MutableSet):
+    """
+    Set which preserves the insertion order (backed by a dict). Membership test, insertion and removal are O(1).
+
+    For compatibility with code which expects lists, iteration, indexing (`[0]`, `[-1]`, `[i]`) and slicing are
+    supported and return the same results as for a list. The first and the last element are accessed in O(1). Other
+    positions use a list which is created on demand and cached until the next modification (i.e. repeated indexing
+    is O(1) as well). Note: unlike a list, an OrderedSet contains every element only once and does not compare equal
+    to a list.
+    """
+
+    def __init__(self, iterable: Iterable = ()):
+        self._dict = dict.fromkeys(iterable)
+
+        # list of the elements (created on demand by `__getitem__`, None if outdated)
+        self._list = None
+
+    def __contains__(self, element):
+        return element in self._dict
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __reversed__(self):
+        return reversed(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return self._get_list()[index]
+
+        n = len(self._dict)
+        if index == 0 and n > 0:
+            return next(iter(self._dict))
+        if index in (-1, n - 1) and n > 0:
+            return next(reversed(self._dict))
+        try:
+            return self._get_list()[index]
+        except IndexError:
+            raise IndexError("OrderedSet index out of range")
+
+    def _get_list(self) -> list:
+        if self._list is None:
+            self._list = list(self._dict)
+        return self._list
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self._dict)})"
+
+    def __getstate__(self):
+        # the cached list is not pickled
+        return {"_dict": self._dict}
+
+    def __setstate__(self, state):
+        self._dict = state["_dict"]
+        self._list = None
+
+    def index(self, element) -> int:
+        return self._get_list().index(element)
+
+    def add(self, element) -> None:
+        if element not in self._dict:
+            self._dict[element] = None
+            self._list = None
+
+    def append(self, element) -> None:
+        # list-like alias (note: adding an already contained element has no effect)
+        self.add(element)
+
+    def discard(self, element) -> None:
+        if element in self._dict:
+            del self._dict[element]
+            self._list = None
+
+    def remove(self, element) -> None:
+        del self._dict[element]
+        self._list = None
+
+
+class LRUCache(MutableMapping):
+    """
+    Dict-like cache with a maximum number of entries (backed by an OrderedDict). Reading or writing an entry marks it
+    as recently used. If the maximum size is exceeded the least recently used entry is removed.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._dict = OrderedDict()
+
+    def __contains__(self, key):
+        # membership tests do not count as usage
+        return key in self._dict
+
+    def __getitem__(self, key):
+        value = self._dict[key]
+        self._dict.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        self._dict[key] = value
+        self._dict.move_to_end(key)
+        while len(self._dict) > self.maxsize:
+            self._dict.popitem(last=False)
+
+    def __delitem__(self, key) -> None:
+        del self._dict[key]
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    # iterating over the entries does not count as usage (and must not reorder them during the iteration)
+    def values(self):
+        return self._dict.values()
+
+    def items(self):
+        return self._dict.items()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(maxsize={self.maxsize}, {dict(self._dict)})"
+
+
 def apply_func_to_table_cells(func: callable, table: Iterable, *args, **kwargs) -> ListWithAttributes:
     res = ListWithAttributes()
     for row in table:
@@ -132,6 +261,14 @@ class SemanticRuleError(PyERKError):
     pass
 
 
+class SnapshotError(PyERKError):
+    pass
+
+
+class ReadOnlyError(PyERKError):
+    pass
+
+
 def ensure_valid_short_key(txt: str, strict: bool = True) -> bool:
     conds = [isinstance(txt, str)]
 
@@ -4,11 +4,14 @@ Core module of pyerk
 import os
 import sys
 from collections import defaultdict
+from collections.abc import Mapping
 from dataclasses import dataclass
 import inspect
+import linecache
 import types
 import abc
 import random
+import weakref
 from enum import Enum, unique
 import re as regex
 from addict import Dict as attr_dict
@@ -18,6 +21,7 @@ import re
 
 from . import auxiliary as aux
 from . import settings
+from . import triplestore
 from .auxiliary import (
     InvalidURIError,
     InvalidPrefixError,
@@ -165,6 +169,26 @@ class Entity(abc.ABC):
     def __eq__(self, other):
         return id(self) == id(other)
 
+    def __hash__(self):
+        # consistent with `__eq__`; this allows to use entities as dict keys and in (ordered) sets
+        return id(self)
+
+    def __getstate__(self):
+        # bound methods (see `add_method`) cannot be pickled directly: store their functions instead
+        state = dict(self.__dict__)
+        bound_methods = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, types.MethodType) and value.__self__ is self:
+                bound_methods[name] = state.pop(name).__func__
+        state["__bound_methods__"] = bound_methods
+        return state
+
+    def __setstate__(self, state):
+        bound_methods = state.pop("__bound_methods__", {})
+        self.__dict__.update(state)
+        for name, func in bound_methods.items():
+            self.__dict__[name] = types.MethodType(func, self)
+
     def __post_init__(self):
         # for a solution how to automate this see
         # https://stackoverflow.com/questions/55183333/how-to-use-an-equivalent-to-post-init-method-with-normal-class
@@ -209,13 +233,18 @@ class Entity(abc.ABC):
 
     def _get_relation_contents(self, rel_uri: str):
 
-        aux.ensure_valid_uri(rel_uri)
+        # this raises a KeyError for unknown relations (the uri is validated on cache misses)
+        relation_metadata = ds.get_relation_metadata(rel_uri)
 
-        relation_edges: List[RelationEdge] = ds.get_relation_edges(self.uri, rel_uri)
+        if relation_metadata.functional_for_each_language:
+            # the objects are retrieved from the language store (see below)
+            res = None
+        else:
+            relation_edges: List[RelationEdge] = ds._get_relation_edges(self.uri, rel_uri)
 
-        # for each of the relation edges get a list of the result-objects
-        # (this assumes the relation tuple to be a triple (sub, rel, obj))
-        res = [re.relation_tuple[2] for re in relation_edges if re.role is RelationRole.SUBJECT]
+            # for each of the relation edges get a list of the result-objects
+            # (this assumes the relation tuple to be a triple (sub, rel, obj))
+            res = [re.relation_tuple[2] for re in relation_edges if re.role is RelationRole.SUBJECT]
 
         # the following logic decides whether to e.g. return a list of length 1 or the contained entity itself
         # this depends on whether self is a functional relation (->  R22__is_functional)
@@ -224,18 +253,9 @@ class Entity(abc.ABC):
         # this must be handled separately to avoid infinite recursion:
         # (note that R22 itself is also a functional relation: only one of {True, False} is meaningful, same holds for
         # R32["is functional for each language"]). R32 also must be handled separately
+        # (see HARDCODED_FUNCTIONAL_RELATIONS which are evaluated in `DataStore.get_relation_metadata`)
 
-        relation = ds.relations[rel_uri]
-        hardcoded_functional_relations = [
-            aux.make_uri(settings.BUILTINS_URI, "R22"),
-            aux.make_uri(settings.BUILTINS_URI, "R32"),
-        ]
-
-        hardcoded_functional_fnc4elang_relations = [aux.make_uri(settings.BUILTINS_URI, "R1")]
-
-        # in the following or-expression the second operand is only evaluated if the first ist false
-        # if rel_uri in ["...#R22", "...#R32"] or relation.R22:
-        if rel_uri in hardcoded_functional_relations or relation.R22:
+        if relation_metadata.functional:
             if len(res) == 0:
                 return None
             else:
@@ -245,19 +265,13 @@ class Entity(abc.ABC):
         #  is a similar situation
         # if rel_key == "R32" this means that self 'is functional for each language'
 
-        elif rel_uri in hardcoded_functional_fnc4elang_relations or relation.R32:
+        elif relation_metadata.functional_for_each_language:
             # TODO: handle multilingual situations more flexible
 
             # todo: specify currently relevant language here (influences the return value); for now: using default
             language = settings.DEFAULT_DATA_LANGUAGE
 
-            filtered_res = []
-            for elt in res:
-
-                # if no language is defined (e.g. ordinary string) -> use default
-                lng = getattr(elt, "language", settings.DEFAULT_DATA_LANGUAGE)
-                if lng == language:
-                    filtered_res.append(elt)
+            filtered_res = ds.get_objects_for_language(self.uri, rel_uri, language)
 
             if len(filtered_res) == 0:
                 return None
@@ -265,7 +279,7 @@ class Entity(abc.ABC):
                 return filtered_res[0]
             else:
                 msg = (
-                    f"unexpectedly found more then one object for relation {relation.short_key} "
+                    f"unexpectedly found more then one object for relation {ds.relations[rel_uri].short_key} "
                     f"and language {language}."
                 )
 
@@ -408,28 +422,11 @@ class Entity(abc.ABC):
         if scope is not None:
             ds.scope_relation_edges[scope.uri].append(rledg)
 
-        # if the object is not a literal then also store the inverse relation
+        # if the object is not a literal then also make the edge accessible from the object
+        # (the inverse edge itself is created on demand, see `RelationEdge.dual_relation_edge`)
         if isinstance(rel_content, Entity):
-
-            inv_rledg = RelationEdge(
-                relation=rel,
-                relation_tuple=(self, rel, rel_content),
-                role=RelationRole.OBJECT,
-                corresponding_entity=self,
-                scope=scope,
-                qualifiers=qualifiers,
-                proxyitem=proxyitem,
-            )
-
-            # interconnect the primal RE with the inverse one:
-            rledg.dual_relation_edge = inv_rledg
-            inv_rledg.dual_relation_edge = rledg
-
-            # ds.set_relation_edge(rel_content.short_key, rel.short_key, inv_rledg)
-            tmp_list = ds.inv_relation_edges[rel_content.uri][rel.uri]
-
-            # TODO: maybe check length here for inverse functional
-            tmp_list.append(inv_rledg)
+            ds.set_inv_relation_edge(rledg)
+            pop_legacy_inv_rledg_keys(rledg)
         return rledg
 
     def get_relations(
@@ -446,7 +443,13 @@ class Entity(abc.ABC):
         :return:            either the whole dict or just one value (of type list)
         """
 
-        rel_dict = ds.relation_edges[self.uri]
+        if key_str_or_uri is None:
+            rel_dict = ds.get_relation_edge_dict(self.uri)
+        else:
+            # avoid to construct the whole dict if only one relation is requested
+            rel_dict = {}
+            uri = self._resolve_relation_uri(key_str_or_uri)
+            rel_dict[uri] = ds.get_relation_edges(self.uri, uri)
         return self._return_relations(rel_dict, key_str_or_uri, return_subj, return_obj)
 
     def get_inv_relations(
@@ -465,10 +468,25 @@ class Entity(abc.ABC):
         :return:            either the whole dict or just one value (of type list)
         """
 
-        inv_rel_dict = ds.inv_relation_edges[self.uri]
+        if key_str_or_uri is None:
+            inv_rel_dict = ds.get_inv_relation_edge_dict(self.uri)
+        else:
+            # avoid to construct the whole dict if only one relation is requested
+            inv_rel_dict = {}
+            uri = self._resolve_relation_uri(key_str_or_uri)
+            inv_rel_dict[uri] = ds.get_inv_relation_edges(self.uri, uri)
 
         return self._return_relations(inv_rel_dict, key_str_or_uri, return_subj, return_obj)
 
+    @staticmethod
+    def _resolve_relation_uri(key_str_or_uri: str) -> str:
+        if aux.ensure_valid_uri(key_str_or_uri, strict=False):
+            return key_str_or_uri
+
+        # we try to resolve a prefix and use the active module and finally builtins as fallback
+        pr_key = process_key_str(key_str_or_uri)
+        return pr_key.uri
+
     @staticmethod
     def _return_relations(
         base_dict,
@@ -491,13 +509,7 @@ class Entity(abc.ABC):
             return base_dict
 
         # the caller wants only results for this key (e.g. "R4")
-        if aux.ensure_valid_uri(key_str_or_uri, strict=False):
-            uri = key_str_or_uri
-        else:
-            # we try to resolve a prefix and use the active module and finally builtins as fallback
-            key_str = key_str_or_uri
-            pr_key = process_key_str(key_str)
-            uri = pr_key.uri
+        uri = Entity._resolve_relation_uri(key_str_or_uri)
 
         rledg_res: Union[RelationEdge, List[RelationEdge]] = base_dict.get(uri, [])
         if return_subj:
@@ -506,7 +518,7 @@ class Entity(abc.ABC):
                 rledg_res: List[RelationEdge]
                 res = [re.subject for re in rledg_res]
             else:
-                assert isinstance(rledg_res, RelationEdge)
+                assert isinstance(rledg_res, (RelationEdge, DualRelationEdge))
                 res = rledg_res.subject
         elif return_obj:
             # do not return the RelationEdge instance(s) but only the object(s)
@@ -514,7 +526,7 @@ class Entity(abc.ABC):
                 rledg_res: List[RelationEdge]
                 res = [re.object for re in rledg_res]
             else:
-                assert isinstance(rledg_res, RelationEdge)
+                assert isinstance(rledg_res, (RelationEdge, DualRelationEdge))
                 res = rledg_res.object
 
         else:
@@ -522,12 +534,40 @@ class Entity(abc.ABC):
         return res
 
 
+class InverseRelationEdgeView(Mapping):
+    """
+    Read-only dict-like access like {obj_uri: {rel_uri: [inverse_edge, ...]}} (`ds.inv_relation_edges`). The inverse
+    edges (role: OBJECT) are created on demand from the primal edges in `ds.inv_primal_relation_edges`. Like a
+    defaultdict, unknown keys result in an empty value (but are not inserted).
+    """
+
+    def __init__(self, datastore: "DataStore"):
+        self.datastore = datastore
+
+    def __getitem__(self, obj_uri: str) -> Dict[str, List["RelationEdge"]]:
+        return defaultdict(list, self.datastore.get_inv_relation_edge_dict(obj_uri))
+
+    def __iter__(self):
+        return iter(list(self.datastore.inv_primal_relation_edges))
+
+    def __len__(self):
+        return len(self.datastore.inv_primal_relation_edges)
+
+    def __contains__(self, obj_uri):
+        return obj_uri in self.datastore.inv_primal_relation_edges
+
+    def get(self, obj_uri, default=None):
+        if obj_uri not in self:
+            return default
+        return self[obj_uri]
+
+
 class DataStore:
     """
     Provides objects to store all data that would be global otherwise
     """
 
-    def __init__(self):
+    def __init__(self, storage_engine: Optional[str] = None):
         self.items = {}
         self.relations = {}
 
@@ -539,24 +579,67 @@ class DataStore:
         # mappings like .a = {"my/mod/uri": "/path/to/mod.py"} and .b = {"/path/to/mod.py": "my/mod/uri"}
         self.mod_path_mapping = aux.OneToOneMapping()
 
-        # for every entity uri store a dict that maps relation uris to lists of corresponding relation-edges
+        # for every entity uri store a dict that maps relation uris to (ordered) sets of corresponding relation-edges
+        # (empty containers are removed immediately, see `remove_relation_edge`)
         self.relation_edges = defaultdict(dict)
 
-        # also do this for the inverse relations (for easy querying)
-        self.inv_relation_edges = defaultdict(lambda: defaultdict(list))
+        # also do this for the inverse relations (for easy querying): {obj_uri: {rel_uri: OrderedSet(primal_edges)}}
+        # (only the primal edges are stored, see `RelationEdge.dual_relation_edge`)
+        self.inv_primal_relation_edges = defaultdict(lambda: defaultdict(aux.OrderedSet))
+
+        # read-only view like {obj_uri: {rel_uri: [inverse_edge, ...]}} (inverse edges have role: OBJECT)
+        self.inv_relation_edges = InverseRelationEdgeView(self)
 
         # for every scope-item key store the relevant relation-edges
         self.scope_relation_edges = defaultdict(list)
 
         # for every relation key store the relevant relation-edges
-        self.relation_relation_edges = defaultdict(list)
+        self.relation_relation_edges = defaultdict(aux.OrderedSet)
 
         # store a map {uri: RE-instance} of all relation edges
         self.relation_edge_uri_map = {}
 
-        # this will be set on demand
+        # cache like {(code_object, lineno): source_line} (see `get_key_str_by_inspection`)
+        self.key_str_inspection_cache = {}
+
+        # mapping like {mod_uri: n} which counts the calls of `get_key_str_by_inspection` (e.g. during loading)
+        self.key_str_inspection_counter = defaultdict(int)
+
+        # cache like {rel_uri: RelationMetadata} (see `get_relation_metadata`)
+        self.relation_metadata = {}
+
+        # cache like {(entity_uri, rel_uri): {language1: [obj1, ...], ...}} (see `get_objects_for_language`)
+        self.language_store = {}
+
+        # multiset {(subj_uri, rel_uri, obj_key): count} for O(1) membership tests (see `has_relation_edge`)
+        self.relation_edge_triples = defaultdict(int)
+
+        # this will be set on demand (see `rdfstack.get_rdfgraph`)
         self.rdfgraph = None
 
+        # relation edges which were stored or removed since the last synchronization of `self.rdfgraph`
+        self.rdfgraph_pending_rledgs = []
+
+        # counter which is increased on every change of the stored relation edges (serves to invalidate caches)
+        self.generation = 0
+
+        # cache like {query: (generation, preprocessed_query)} (see `preprocess_query`)
+        self.preprocessed_query_cache = aux.LRUCache(settings.QUERY_CACHE_SIZE)
+
+        # caches for rdfstack.perform_sparql_query: {query: prepared_query} and {(query, ...): result}
+        self.sparql_query_cache = aux.LRUCache(settings.QUERY_CACHE_SIZE)
+        self.sparql_result_cache = aux.LRUCache(settings.QUERY_CACHE_SIZE)
+        self.sparql_result_cache_generation = 0
+
+        # cache like {prepared_query: query_plan_or_None} (see queryengine.py); the entries are removed together with
+        # the query objects (e.g. when they are dropped from `sparql_query_cache`)
+        self.native_query_plan_cache = weakref.WeakKeyDictionary()
+
+        # index like {(rel_uri, class_uri): set_of_uris} for the type constraints of semantic rules
+        # (see ruleengine.get_instance_uris); it is cleared if `self.generation` changes
+        self.instance_index = {}
+        self.instance_index_generation = 0
+
         # dict to store important QualifierFactory instances which are created in builtin_entities but needed in core
         self.qff_dict = {}
 
@@ -567,21 +650,86 @@ class DataStore:
         # mapping like {uri_1: keymanager_1, ...}
         self.uri_keymanager_dict = {}
 
+        # mapping like {uri_1: rledg_key_allocator_1, ...} (relation edges do not consume keys of the KeyManager)
+        self.uri_rledg_key_allocator_dict = {}
+
         # mapping like .a = {uri_1: prefix_1, ...} and .b = {prefix_1: uri_1}
         self.uri_prefix_mapping = aux.OneToOneMapping()
 
         # initialize:
         self.uri_prefix_mapping.add_pair(settings.BUILTINS_URI, "bi")
 
+        # cache for `process_key_str` like {(key_str, active_mod_uri, check, resolve_prefix): ProcessedStmtKey}
+        self.key_str_cache = {}
+
+        # mapping like {short_key: [cache_key1, ...]} (allows to invalidate all cache entries for one short_key)
+        self.key_str_cache_short_keys = defaultdict(list)
+
         # mapping like {uri1: modname1, ...}
         self.modnames = {}
 
         # dict like {uri1: <mod1>, ...}
         self.uri_mod_dict = {}
 
+        # dict like {uri1: sha256_hexdigest_of_source1, ...} (for modules loaded from a file, see erkloader)
+        self.uri_content_hash_dict = {}
+
+        # dict like {uri1: uri2, ...} where module 1 was loaded during the execution of module 2
+        self.uri_parent_mod_dict = {}
+
+        # inter-module reference graph: {mod_uri1: {mod_uri2: n, ...}, ...} where n is the number of relation edges
+        # created in module 1 which refer to entities (or relation edges) of module 2 (builtins are not included)
+        self.mod_reference_counts = defaultdict(dict)
+
+        # dict like {rel_uri: RelationStatistics(), ...} (only for relations with stored relation edges)
+        self.relation_statistics = {}
+
         # this list serves to keep track of nested scopes
         self.scope_stack = []
 
+        # instance of triplestore.ColumnarTripleStore if the "columnar" storage engine is active, else None
+        self.triple_store = None
+        self.set_storage_engine(storage_engine or settings.DATASTORE_ENGINE)
+
+    @property
+    def storage_engine(self) -> str:
+        return "dict" if self.triple_store is None else "columnar"
+
+    def set_storage_engine(self, engine: str) -> None:
+        """
+        Select the data structures which hold the relation edges and migrate all existing edges.
+
+        :param engine:  "dict" (nested dicts keyed by uris, default) or "columnar" (see triplestore.py)
+        :return:        None
+        """
+
+        if engine not in ("dict", "columnar"):
+            msg = f"Unknown storage engine: {engine}. Expected 'dict' or 'columnar'."
+            raise ValueError(msg)
+
+        if engine == self.storage_engine:
+            return
+
+        # all relation edges in the order of their creation
+        rledg_list = list(self.relation_edge_uri_map.values())
+
+        if engine == "columnar":
+            self.triple_store = triplestore.ColumnarTripleStore()
+            self.relation_edges = triplestore.SubjectIndexView(self.triple_store)
+            self.inv_primal_relation_edges = triplestore.ObjectIndexView(self.triple_store)
+            self.relation_relation_edges = triplestore.PredicateIndexView(self.triple_store)
+            for rledg in rledg_list:
+                self.triple_store.add_edge(rledg)
+        else:
+            self.triple_store = None
+            self.relation_edges = defaultdict(dict)
+            self.inv_primal_relation_edges = defaultdict(lambda: defaultdict(aux.OrderedSet))
+            self.relation_relation_edges = defaultdict(aux.OrderedSet)
+            for rledg in rledg_list:
+                self._insert_relation_edge(rledg)
+                if rledg.corresponding_entity is not None:
+                    self.set_inv_relation_edge(rledg)
+
     def get_entity_by_key_str(self, key_str, mod_uri=None) -> Entity:
         """
         :param key_str:     str like I1234 or I1234__some_label
@@ -641,16 +789,160 @@ class DataStore:
         """
         aux.ensure_valid_uri(rel_uri)
         aux.ensure_valid_uri(entity_uri)
+        return self._get_relation_edges(entity_uri, rel_uri)
+
+    def _get_relation_edges(self, entity_uri: str, rel_uri: str) -> List["RelationEdge"]:
+        """
+        Like `get_relation_edges` but without validation of the arguments.
+        """
+
+        if self.triple_store is not None:
+            return self.triple_store.get_edges(entity_uri, rel_uri)
 
         # We return an empty list if the entity has no such relation.
-        # TODO: model this as defaultdict?
-        return self.relation_edges[entity_uri].get(rel_uri, list())
+        # (check before accessing the *defaultdict* to avoid to create a key just by looking)
+        if entity_uri not in self.relation_edges:
+            return []
+        return list(self.relation_edges[entity_uri].get(rel_uri, ()))
+
+    def get_relation_metadata(self, rel_uri: str) -> "RelationMetadata":
+        """
+        Return the (cached) RelationMetadata for the relation with uri `rel_uri`. The cache entry is invalidated when
+        the relevant relation edges (R11, R22, R32) of that relation change.
+
+        :param rel_uri:
+        :return:            RelationMetadata instance (raise KeyError for unknown relations)
+        """
+
+        res = self.relation_metadata.get(rel_uri)
+        if res is not None:
+            return res
+
+        aux.ensure_valid_uri(rel_uri)
+        relation = self.relations[rel_uri]
+
+        # note: accessing relation.R22 etc. invokes `get_relation_metadata` for R22 etc. (which are hardcoded)
+        res = RelationMetadata()
+        res.functional = rel_uri in HARDCODED_FUNCTIONAL_RELATIONS or bool(relation.R22)
+
+        # (R32 is only relevant for non-functional relations; not evaluating it also avoids infinite recursion)
+        if not res.functional:
+            res.functional_for_each_language = rel_uri in HARDCODED_FUNCTIONAL_FNC4ELANG_RELATIONS or bool(relation.R32)
+        res.range = tuple(rledg.relation_tuple[2] for rledg in self._get_relation_edges(rel_uri, R11_URI))
+
+        self.relation_metadata[rel_uri] = res
+        return res
+
+    def _invalidate_relation_metadata(self, re_object: "RelationEdge") -> None:
+        if re_object.relation_tuple[1].uri in RELATION_METADATA_RELATIONS:
+            self.relation_metadata.pop(re_object.relation_tuple[0].uri, None)
+
+    def _invalidate_label_dependent_caches(self, re_object: "RelationEdge") -> None:
+        # `process_key_str(..., check=True)` compares the label part of a key with R1 of the entity
+        if re_object.relation_tuple[1].uri == R1_URI:
+            self.invalidate_key_str_cache(re_object.relation_tuple[0].short_key)
+
+    def get_objects_for_language(self, entity_uri: str, rel_uri: str, language: str) -> list:
+        """
+        Return the list of objects of the relation edges (entity, rel, obj) where obj has the language `language`
+        (e.g. all labels in German). Objects without language (e.g. ordinary strings) are assumed to be from the
+        default language (`settings.DEFAULT_DATA_LANGUAGE` at the time of this call).
+
+        The objects are grouped by language on the first call and then cached until the relation edges of
+        (entity_uri, rel_uri) change.
+
+        :param entity_uri:
+        :param rel_uri:
+        :param language:    str like "en" or "de" (see settings.SUPPORTED_LANGUAGES)
+        :return:            list of objects (typically of length 0 or 1 for R1, R2)
+        """
+
+        language_dict = self.language_store.get((entity_uri, rel_uri))
+        if language_dict is None:
+            language_dict = {}
+            for rledg in self._get_relation_edges(entity_uri, rel_uri):
+                obj = rledg.relation_tuple[2]
+                lng = obj.language if isinstance(obj, Literal) else DEFAULT_LANGUAGE_KEY
+                language_dict.setdefault(lng, []).append(obj)
+            self.language_store[(entity_uri, rel_uri)] = language_dict
+
+        res = list(language_dict.get(language, ()))
+        if language == settings.DEFAULT_DATA_LANGUAGE and DEFAULT_LANGUAGE_KEY in language_dict:
+            res = res + language_dict[DEFAULT_LANGUAGE_KEY]
+        return res
+
+    def get_relation_edge_dict(self, entity_uri: str) -> Dict[str, List["RelationEdge"]]:
+        """
+        Return a dict like {rel_uri1: [re1, ...], ...} of relation edges where `entity_uri` is the subject.
+        """
+
+        re_dict = self.relation_edges.get(entity_uri, {})
+        return {rel_uri: list(container) for rel_uri, container in re_dict.items()}
+
+    def get_inv_relation_edges(self, entity_uri: str, rel_uri: str) -> List["RelationEdge"]:
+        """
+        Return the list of inverse relation edges (role: OBJECT) where `entity_uri` is the object.
+
+        Note: `self.inv_primal_relation_edges` stores the primal edges; the inverse edges are created here on demand.
+
+        :param entity_uri:
+        :param rel_uri:
+        :return:
+        """
+
+        return [rledg.dual_relation_edge for rledg in self._get_inv_index_edges(entity_uri, rel_uri)]
+
+    def _get_inv_index_edges(self, entity_uri: str, rel_uri: str) -> List["RelationEdge"]:
+        """
+        Return the list of primal edges where `entity_uri` is the object.
+        """
+
+        if self.triple_store is not None:
+            return self.triple_store.get_inv_edges(entity_uri, rel_uri)
+
+        # (check before accessing the *defaultdict* to avoid to create a key just by looking)
+        if entity_uri not in self.inv_primal_relation_edges:
+            return []
+        return list(self.inv_primal_relation_edges[entity_uri].get(rel_uri, ()))
+
+    def get_inv_relation_edge_dict(self, entity_uri: str) -> Dict[str, List["RelationEdge"]]:
+        """
+        Return a dict like {rel_uri1: [inv_re1, ...], ...} of inverse relation edges (role: OBJECT).
+        """
+
+        inv_re_dict = self.inv_primal_relation_edges.get(entity_uri, {})
+        return {rel_uri: [rledg.dual_relation_edge for rledg in lst] for rel_uri, lst in inv_re_dict.items()}
+
+    @staticmethod
+    def _make_triple_key(subj_uri: str, rel_uri: str, obj) -> tuple:
+        if isinstance(obj, (Entity, RelationEdge)):
+            return subj_uri, rel_uri, obj.uri
+        return subj_uri, rel_uri, triplestore.URIInterner.make_key(obj, is_literal=True)
+
+    def _make_triple_key_for_rledg(self, re_object: "RelationEdge") -> tuple:
+        subj_uri = re_object.relation_tuple[0].uri
+        rel_uri = re_object.relation_tuple[1].uri
+        if re_object.corresponding_entity is not None:
+            return self._make_triple_key(subj_uri, rel_uri, re_object.corresponding_entity)
+        return self._make_triple_key(subj_uri, rel_uri, re_object.corresponding_literal)
+
+    def has_relation_edge(self, subj_uri: str, rel_uri: str, obj) -> bool:
+        """
+        Check in O(1) whether there is (at least) one relation edge (subj, rel, obj).
+
+        :param subj_uri:    uri of the subject
+        :param rel_uri:     uri of the relation
+        :param obj:         entity or literal
+        :return:            bool
+        """
+
+        return self._make_triple_key(subj_uri, rel_uri, obj) in self.relation_edge_triples
 
     def set_relation_edge(self, re_object: "RelationEdge") -> None:
         """
         Insert a RelationEdge into the relevant data structures of the DataStorage (self)
 
-        This method does not handle the dual realtion. It must be created and stored separately.
+        This method does not make the edge accessible from its object. See `set_inv_relation_edge`.
 
         :param re_object:   RelationEdge instance
         :return:
@@ -661,20 +953,25 @@ class DataStore:
         aux.ensure_valid_uri(subj_uri)
         aux.ensure_valid_uri(rel_uri)
 
-        self.relation_relation_edges[rel_uri].append(re_object)
-        self.relation_edge_uri_map[re_object.uri] = re_object
-
         relation = self.relations[rel_uri]
 
-        # inner_obj will be either a list of relation_edges or None
-        # for some R22-related reason (see below) we cannot use a default dict here,
-        # thus we need to do the case distinction manually
-        inner_obj = self.relation_edges[subj_uri].get(rel_uri, None)
+        if self.triple_store is not None:
+            n_existing = self.triple_store.count(subj_uri, rel_uri)
+        else:
+            # inner_obj will be either an OrderedSet of relation_edges or None
+            # for some R22-related reason (see below) we cannot use a default dict here,
+            # thus we need to do the case distinction manually
+            inner_obj = self.relation_edges.get(subj_uri, {}).get(rel_uri, None)
 
-        if inner_obj is None:
-            self.relation_edges[subj_uri][rel_uri] = [re_object]
+            if inner_obj is not None and not isinstance(inner_obj, aux.OrderedSet):
+                msg = (
+                    f"unexpected type ({type(inner_obj)}) of dict content for entity {subj_uri} and "
+                    f"relation {rel_uri}. Expected OrderedSet or None"
+                )
+                raise TypeError(msg)
+            n_existing = 0 if inner_obj is None else len(inner_obj)
 
-        elif isinstance(inner_obj, list):
+        if n_existing > 0:
             # R22__is_functional, this means there can only be one value for this relation and this item
             if relation.R22:
                 msg = (
@@ -685,14 +982,263 @@ class DataStore:
             elif relation.R32:
                 # TODO: handle multiple laguages here !!qa
                 pass
-            inner_obj.append(re_object)
 
+        self.relation_edge_uri_map[re_object.uri] = re_object
+        self._register_relation_edge(re_object)
+
+    def _register_relation_edge(self, re_object: "RelationEdge") -> None:
+        """
+        Insert a RelationEdge into the storage engine and update the dependent data structures (without any checks).
+        """
+
+        self.relation_edge_triples[self._make_triple_key_for_rledg(re_object)] += 1
+        self._update_mod_references(re_object, 1)
+        self._update_relation_statistics(re_object, 1)
+        self._insert_relation_edge(re_object)
+        self._record_relation_edge_change(re_object)
+        self._invalidate_relation_metadata(re_object)
+        self._invalidate_label_dependent_caches(re_object)
+        self.language_store.pop((re_object.relation_tuple[0].uri, re_object.relation_tuple[1].uri), None)
+
+    def is_stored_relation_edge(self, re_object: "RelationEdge") -> bool:
+        """
+        Return whether a RelationEdge is contained in the storage engine (edges which were rejected by
+        `set_relation_edge`, e.g. due to R22, exist but are not stored).
+        """
+
+        if self.triple_store is not None:
+            return self.triple_store.contains_edge(re_object)
+
+        subj_uri = re_object.relation_tuple[0].uri
+        rel_uri = re_object.relation_tuple[1].uri
+        return re_object in self.relation_edges.get(subj_uri, {}).get(rel_uri, ())
+
+    def restore_relation_edge(self, re_object: "RelationEdge", stored: bool = True) -> None:
+        """
+        Insert an existing (e.g. unpickled) RelationEdge into all relevant data structures without any checks.
+
+        :param re_object:   RelationEdge instance
+        :param stored:      bool; see `is_stored_relation_edge`
+        """
+
+        self.relation_edge_uri_map[re_object.uri] = re_object
+        self.rledgs_created_in_mod[re_object.base_uri][re_object.uri] = re_object
+        if not stored:
+            return
+
+        self._register_relation_edge(re_object)
+        if re_object.corresponding_entity is not None:
+            self.set_inv_relation_edge(re_object)
+
+    def _insert_relation_edge(self, re_object: "RelationEdge") -> None:
+        """
+        Insert a RelationEdge into the storage engine without any checks.
+        """
+
+        if self.triple_store is not None:
+            self.triple_store.add_edge(re_object)
+            return
+
+        subj_uri = re_object.relation_tuple[0].uri
+        rel_uri = re_object.relation_tuple[1].uri
+
+        self.relation_relation_edges[rel_uri].add(re_object)
+
+        inner_obj = self.relation_edges[subj_uri].get(rel_uri, None)
+        if inner_obj is None:
+            self.relation_edges[subj_uri][rel_uri] = aux.OrderedSet((re_object,))
         else:
-            msg = (
-                f"unexpected type ({type(inner_obj)}) of dict content for entity {subj_uri} and "
-                f"relation {rel_uri}. Expected list or None"
-            )
-            raise TypeError(msg)
+            inner_obj.add(re_object)
+
+    def set_inv_relation_edge(self, re_object: "RelationEdge") -> None:
+        """
+        Make a (primal) RelationEdge accessible from its object (which must be an entity). The inverse edge
+        (role: OBJECT) itself is not stored but created on demand.
+
+        :param re_object:   RelationEdge instance
+        :return:
+        """
+
+        if self.triple_store is not None:
+            # the columnar store indexes the object already in `add_edge`
+            return
+
+        obj_uri = re_object.relation_tuple[2].uri
+        rel_uri = re_object.relation_tuple[1].uri
+
+        # TODO: maybe check length here for inverse functional
+        self.inv_primal_relation_edges[obj_uri][rel_uri].add(re_object)
+
+    def remove_relation_edge(self, re_object: "RelationEdge") -> None:
+        """
+        Remove a RelationEdge (role: SUBJECT) from the relevant data structures (tolerate if it is not present).
+        """
+
+        self._invalidate_relation_metadata(re_object)
+        self._invalidate_label_dependent_caches(re_object)
+        self.language_store.pop((re_object.relation_tuple[0].uri, re_object.relation_tuple[1].uri), None)
+        self._record_relation_edge_change(re_object)
+
+        if self.triple_store is not None:
+            if self.triple_store.remove_edge(re_object):
+                self._discard_triple_key(re_object)
+                self._update_mod_references(re_object, -1)
+                self._update_relation_statistics(re_object, -1)
+            return
+
+        subj_uri = re_object.relation_tuple[0].uri
+        rel_uri = re_object.relation_tuple[1].uri
+
+        if self._discard_from_index(self.relation_edges, subj_uri, rel_uri, re_object):
+            self._discard_triple_key(re_object)
+            self._update_mod_references(re_object, -1)
+            self._update_relation_statistics(re_object, -1)
+
+        # ds.relation_relation_edges: for every relation key stores a set of relevant relation-edges
+        # (check before accessing the *defaultdict* to avoid to create a key just by looking)
+        rel_edges = self.relation_relation_edges.get(rel_uri)
+        if rel_edges is not None:
+            rel_edges.discard(re_object)
+            if len(rel_edges) == 0:
+                del self.relation_relation_edges[rel_uri]
+
+    def _record_relation_edge_change(self, re_object: "RelationEdge") -> None:
+        self.generation += 1
+
+        # graphs which are backed by the DataStore itself (see `rdfstack.DataStoreRDFStore`) need no synchronization
+        if self.rdfgraph is not None and not getattr(self.rdfgraph.store, "is_datastore_view", False):
+            self.rdfgraph_pending_rledgs.append(re_object)
+
+    def _update_mod_references(self, re_object: "RelationEdge", delta: int) -> None:
+        """
+        Update the inter-module reference graph for a relation edge which is stored (delta=1) or removed (delta=-1).
+        """
+
+        src_uri = re_object.base_uri
+        for elt in re_object.relation_tuple:
+            # literals have no base_uri
+            target_uri = getattr(elt, "base_uri", None)
+            if target_uri is None or target_uri == src_uri or target_uri == settings.BUILTINS_URI:
+                continue
+            counts = self.mod_reference_counts[src_uri]
+            n = counts.get(target_uri, 0) + delta
+            if n > 0:
+                counts[target_uri] = n
+            else:
+                counts.pop(target_uri, None)
+                if len(counts) == 0:
+                    del self.mod_reference_counts[src_uri]
+
+    def _update_relation_statistics(self, re_object: "RelationEdge", delta: int) -> None:
+        subj_uri, rel_uri, obj_key = self._make_triple_key_for_rledg(re_object)
+        stats = self.relation_statistics.get(rel_uri)
+        if stats is None:
+            stats = self.relation_statistics[rel_uri] = RelationStatistics()
+        stats.update(subj_uri, obj_key, delta)
+        if stats.n_edges == 0:
+            del self.relation_statistics[rel_uri]
+
+    def get_relation_statistics(self, rel_uri: str) -> "RelationStatistics":
+        """
+        Return the statistics of the stored relation edges of a relation (empty statistics for unused relations).
+        """
+
+        stats = self.relation_statistics.get(rel_uri)
+        if stats is None:
+            return RelationStatistics()
+        return stats
+
+    def get_referencing_mod_uris(self, mod_uri: str) -> List[str]:
+        """
+        Return the uris of all modules which have relation edges that refer to entities of the module `mod_uri`.
+        """
+
+        return [src_uri for src_uri, counts in self.mod_reference_counts.items() if mod_uri in counts]
+
+    def _discard_triple_key(self, re_object: "RelationEdge") -> None:
+        triple_key = self._make_triple_key_for_rledg(re_object)
+        n = self.relation_edge_triples.pop(triple_key, 0) - 1
+        if n > 0:
+            self.relation_edge_triples[triple_key] = n
+
+    @staticmethod
+    def _discard_from_index(index: dict, key1: str, key2: str, re_object: "RelationEdge") -> bool:
+        """
+        Remove `re_object` from `index[key1][key2]` in O(1) and do not keep empty containers (this makes a global
+        clean-up after unloading a module obsolete).
+
+        :return:    bool; whether the edge was present
+        """
+
+        inner_dict = index.get(key1)
+        if inner_dict is None:
+            return False
+        container = inner_dict.get(key2)
+        if container is None or re_object not in container:
+            return False
+        container.remove(re_object)
+        if len(container) == 0:
+            del inner_dict[key2]
+            if len(inner_dict) == 0:
+                del index[key1]
+        return True
+
+    def remove_inv_relation_edge(self, re_object: "RelationEdge") -> None:
+        """
+        Counterpart of `set_inv_relation_edge` (tolerate if the edge is not present).
+        """
+
+        if self.triple_store is not None:
+            # nothing to do: `remove_edge` also removes the object index entry
+            return
+
+        obj_uri = re_object.relation_tuple[2].uri
+        rel_uri = re_object.relation_tuple[1].uri
+
+        self._discard_from_index(self.inv_primal_relation_edges, obj_uri, rel_uri, re_object)
+
+    def collect_entity_relation_edges(self, entity_uri: str) -> tuple:
+        """
+        Return the dicts of relation edges where `entity_uri` is subject or object (e.g. to unlink them).
+        Note: the edges stay stored until they are unlinked individually (which is O(1) per edge).
+
+        :param entity_uri:
+        :return:            2-tuple of dicts like ({rel_uri1: [re1, ...], ...}, {rel_uri2: [re2, ...], ...})
+                            (both dicts contain primal edges)
+        """
+
+        if self.triple_store is not None:
+            return self.relation_edges[entity_uri], self.inv_primal_relation_edges[entity_uri]
+
+        re_dict = self.get_relation_edge_dict(entity_uri)
+        inv_primal_re_dict = self.inv_primal_relation_edges.get(entity_uri, {})
+        inv_re_dict = {rel_uri: list(container) for rel_uri, container in inv_primal_re_dict.items()}
+        return re_dict, inv_re_dict
+
+    def collect_relation_relation_edges(self, rel_uri: str) -> List["RelationEdge"]:
+        """
+        Return the list of relation edges which use `rel_uri` as predicate (see also `collect_entity_relation_edges`).
+        """
+
+        if self.triple_store is not None:
+            return self.relation_relation_edges[rel_uri]
+        return list(self.relation_relation_edges.get(rel_uri, ()))
+
+    def invalidate_key_str_cache(self, short_key: Optional[str] = None) -> None:
+        """
+        Remove entries from the cache of `process_key_str`. This is necessary when the result of the key resolution
+        might change, i.e. when modules (and their prefixes) are loaded or unloaded or when entities are created.
+
+        :param short_key:   optional; if passed only the entries which refer to this short_key are removed
+        """
+
+        if short_key is None:
+            self.key_str_cache.clear()
+            self.key_str_cache_short_keys.clear()
+            return
+
+        for cache_key in self.key_str_cache_short_keys.pop(short_key, []):
+            self.key_str_cache.pop(cache_key, None)
 
     def get_uri_for_prefix(self, prefix: str) -> str:
         res = self.uri_prefix_mapping.b.get(prefix)
@@ -703,6 +1249,21 @@ class DataStore:
         return res
 
     def preprocess_query(self, query):
+        """
+        Remove the labels from entity keys like `:I1234__some_label` in a sparql query (after checking them).
+
+        The result is cached as long as the stored relation edges (and thus the labels) do not change.
+        """
+
+        cached = self.preprocessed_query_cache.get(query)
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+
+        new_query = self._preprocess_query(query)
+        self.preprocessed_query_cache[query] = (self.generation, new_query)
+        return new_query
+
+    def _preprocess_query(self, query):
         if "__" in query:
             prefixes = re.findall(r"[\w]*:[ ]*<.*?>", query)
             prefix_dict = {}
@@ -822,6 +1383,92 @@ class ProcessedStmtKey:
     original_key_str: str = None
 
 
+# uris of the builtin relations which control the behavior of `Entity._get_relation_contents`
+R1_URI = aux.make_uri(settings.BUILTINS_URI, "R1")
+R11_URI = aux.make_uri(settings.BUILTINS_URI, "R11")
+R22_URI = aux.make_uri(settings.BUILTINS_URI, "R22")
+R32_URI = aux.make_uri(settings.BUILTINS_URI, "R32")
+
+# R22 and R32 are functional themselves (handled separately to avoid infinite recursion), R1 is functional for each
+# language
+HARDCODED_FUNCTIONAL_RELATIONS = (R22_URI, R32_URI)
+HARDCODED_FUNCTIONAL_FNC4ELANG_RELATIONS = (R1_URI,)
+
+# key in `DataStore.language_store` for objects without language (interpreted as `settings.DEFAULT_DATA_LANGUAGE`)
+DEFAULT_LANGUAGE_KEY = "__default__"
+
+# changes of these relations invalidate the RelationMetadata of the respective subject (a relation)
+RELATION_METADATA_RELATIONS = (R11_URI, R22_URI, R32_URI)
+
+
+@dataclass
+class RelationMetadata:
+    """
+    Container for the properties of a relation which are needed on every access of a relation-attribute
+    (see `DataStore.get_relation_metadata`)
+    """
+
+    # R22__is_functional
+    functional: bool = False
+    # R32__is_functional_for_each_language
+    functional_for_each_language: bool = False
+    # objects of R11__has_range_of_result
+    range: tuple = ()
+
+
+class RelationStatistics:
+    """
+    Cardinality statistics of the stored relation edges of one relation (see `DataStore.get_relation_statistics`).
+    They are updated incrementally and serve to estimate the selectivity of triple patterns (e.g. in queryengine.py).
+    """
+
+    def __init__(self):
+        self.n_edges = 0
+
+        # dicts like {subj_uri: number_of_edges, ...} and {obj_key: number_of_edges, ...}
+        self.subject_counts = {}
+        self.object_counts = {}
+
+        # fan-out and fan-in histograms like {number_of_edges: number_of_subjects (or objects), ...}
+        self.fanout_histogram = defaultdict(int)
+        self.fanin_histogram = defaultdict(int)
+
+    @staticmethod
+    def _update_counts(counts: dict, histogram: dict, key, delta: int) -> None:
+        old = counts.get(key, 0)
+        new = old + delta
+        if old > 0:
+            histogram[old] -= 1
+            if histogram[old] == 0:
+                del histogram[old]
+        if new > 0:
+            counts[key] = new
+            histogram[new] += 1
+        else:
+            counts.pop(key, None)
+
+    def update(self, subj_key, obj_key, delta: int) -> None:
+        self.n_edges += delta
+        self._update_counts(self.subject_counts, self.fanout_histogram, subj_key, delta)
+        self._update_counts(self.object_counts, self.fanin_histogram, obj_key, delta)
+
+    @property
+    def n_subjects(self) -> int:
+        return len(self.subject_counts)
+
+    @property
+    def n_objects(self) -> int:
+        return len(self.object_counts)
+
+    @property
+    def avg_fanout(self) -> float:
+        return self.n_edges / self.n_subjects if self.subject_counts else 0
+
+    @property
+    def avg_fanin(self) -> float:
+        return self.n_edges / self.n_objects if self.object_counts else 0
+
+
 def unpack_l1d(l1d: Dict[str, object]):
     """
     unpack a dict of length 1
@@ -852,8 +1499,22 @@ def process_key_str(key_str: str, check: bool = True, resolve_prefix: bool = Tru
 
 
     :return:            a data structure which allows to access short_key, type and label separately
+                        (note: the result is cached and thus must not be modified)
     """
 
+    cache_key = (key_str, get_active_mod_uri(strict=False), check, resolve_prefix)
+    res = ds.key_str_cache.get(cache_key)
+    if res is not None:
+        return res
+
+    # note: if the key can not be resolved an exception is raised and nothing is cached
+    res = _process_key_str(key_str, check, resolve_prefix)
+    ds.key_str_cache[cache_key] = res
+    ds.key_str_cache_short_keys[res.short_key].append(cache_key)
+    return res
+
+
+def _process_key_str(key_str: str, check: bool, resolve_prefix: bool) -> ProcessedStmtKey:
     res = ProcessedStmtKey()
     res.original_key_str = key_str
     res.delimiter = "__"
@@ -1043,6 +1704,7 @@ def create_item(key_str: str = "", **kwargs) -> Item:
     itm = Item(base_uri=mod_uri, key_str=item_key, **new_kwargs)
     assert itm.uri not in ds.items, f"Problematic (duplicated) uri: {itm.uri}"
     ds.items[itm.uri] = itm
+    ds.invalidate_key_str_cache(itm.short_key)
 
     # acces the defaultdict(list)
     ds.entities_created_in_mod[mod_uri].append(itm.uri)
@@ -1078,6 +1740,63 @@ class RelationRole(Enum):
     OBJECT = 2
 
 
+class KeyPermutation:
+    """
+    Constant-memory pseudo-random bijection of range(n) (balanced Feistel network with cycle walking).
+
+    This allows to access the i-th element of a "shuffled range" in O(1) without materializing the whole list.
+    """
+
+    n_rounds = 4
+
+    def __init__(self, n: int, seed: int):
+        """
+
+        :param n:       int; size of the permuted range (must be positive)
+        :param seed:    int; determines the (reproducible) order
+        """
+
+        if n <= 0:
+            msg = f"Invalid size of key range: {n}"
+            raise ValueError(msg)
+        self.n = n
+
+        # the Feistel network permutes range(2**(2*half_bits)) which is the smallest square power of two >= n
+        n_bits = max((n - 1).bit_length(), 2)
+        self.half_bits = (n_bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+
+        random_ng = random.Random(x=seed)
+        self.round_keys = [random_ng.getrandbits(64) for _ in range(self.n_rounds)]
+
+    def __len__(self):
+        return self.n
+
+    def _round_function(self, value: int, round_key: int) -> int:
+        # integer mixing (cf. splitmix64 finalizer)
+        x = ((value ^ round_key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 31
+        x = (x * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 29
+        return x & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round_function(right, round_key)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.n:
+            raise IndexError(f"index out of range: {index}")
+
+        # cycle walking: apply the permutation of the larger domain until the result is in range(n)
+        value = self._encrypt(index)
+        while value >= self.n:
+            value = self._encrypt(value)
+        return value
+
+
 # for now we want unique numbers for keys for relations and items etc (although this is not necessary)
 class KeyManager:
     """
@@ -1087,26 +1806,51 @@ class KeyManager:
     # TODO: the term "maxval" is misleading because it will be used in range where the upper bound is exclusive
     # however, using range(minval, maxval+1) would results in different shuffling and thus will probably need some
     # refactoring of existing modules
-    def __init__(self, minval=1000, maxval=9999, keyseed=None):
+    def __init__(self, minval=1000, maxval=9999, keyseed=None, lazy=False, position=0):
         """
 
-        :param minval:  int
-        :param maxval:  int
-        :param keyseed: int; This allows a module to create its own random key order
+        :param minval:      int
+        :param maxval:      int
+        :param keyseed:     int; This allows a module to create its own random key order
+        :param lazy:        bool; if True, keys are computed on demand by a KeyPermutation instead of shuffling a
+                            materialized list (constant memory, suitable for huge key ranges). Note: the key order
+                            differs from the default mode.
+        :param position:    int; (lazy mode only) number of keys which have already been popped (allows to resume
+                            from a persisted state, see `.position`)
         """
 
         self.instance = self
         self.minval = minval
         self.maxval = maxval
         self.keyseed = keyseed
+        self.lazy = lazy
 
         self.key_reservoir = None
 
+        # only used in lazy mode
+        self.key_permutation = None
+        self.position = position
+
+        if not lazy and position != 0:
+            msg = "Argument `position` is only supported in lazy mode."
+            raise ValueError(msg)
+
         self._generate_key_numbers()
 
     def pop(self, index: int = -1) -> int:
 
-        key = self.key_reservoir.pop(index)
+        if not self.lazy:
+            key = self.key_reservoir.pop(index)
+            return key
+
+        if index != -1:
+            msg = "In lazy mode only the next key (index=-1) can be popped."
+            raise ValueError(msg)
+        if self.position >= len(self.key_permutation):
+            raise IndexError("pop from exhausted key range")
+
+        key = self.minval + self.key_permutation[self.position]
+        self.position += 1
         return key
 
     def _generate_key_numbers(self) -> None:
@@ -1128,11 +1872,72 @@ class KeyManager:
         if not self.keyseed:
             # use hardcoded fallback
             self.keyseed = 1750
+
+        if self.lazy:
+            self.key_permutation = KeyPermutation(self.maxval - self.minval, seed=self.keyseed)
+            return
+
         random_ng = random.Random(x=self.keyseed)
         self.key_reservoir = list(range(self.minval, self.maxval))
         random_ng.shuffle(self.key_reservoir)
 
 
+class RelationEdgeKeyAllocator:
+    """
+    Allocates the numeric part of the short keys of relation edges (one instance per module).
+
+    In contrast to the KeyManager there is no (bounded, shuffled) reservoir: the numbers are simply counted upwards.
+    This is O(1) in time and memory and allows modules with an arbitrary number of relation edges. Because relation
+    edges are (re-)created every time a module is loaded, their keys do not need to be stable or "meaningless".
+    """
+
+    def __init__(self, start: int = 1):
+        """
+
+        :param start:   int; first number to be allocated
+        """
+        self.next_value = start
+
+    def pop(self) -> int:
+        key = self.next_value
+        self.next_value += 1
+        return key
+
+
+def pop_rledg_key() -> str:
+    """
+    Create a short key for a relation edge like "RE123" (unique within the currently active module).
+
+    :return:    str
+    """
+
+    if settings.RLEDG_KEYS_FROM_KEYMANAGER:
+        # old key sequence (see settings)
+        return f"RE{pop_uri_based_key()}"
+
+    active_mod_uri = get_active_mod_uri()
+    allocator = ds.uri_rledg_key_allocator_dict.get(active_mod_uri)
+    if allocator is None:
+        allocator = ds.uri_rledg_key_allocator_dict[active_mod_uri] = RelationEdgeKeyAllocator()
+    return f"RE{allocator.pop()}"
+
+
+def pop_legacy_inv_rledg_keys(rledg: "RelationEdge") -> None:
+    """
+    Compatibility mode (see `settings.RLEDG_KEYS_FROM_KEYMANAGER`): consume the keys which older versions of pyerk
+    used for the (stored) inverse edge of `rledg` and for its copies of the qualifier edges (and their inverse edges).
+
+    :param rledg:   primal RelationEdge whose object is an entity
+    """
+
+    if not settings.RLEDG_KEYS_FROM_KEYMANAGER:
+        return
+
+    n_keys = 1 + sum(2 if qf.corresponding_entity is not None else 1 for qf in rledg.qualifiers)
+    for _ in range(n_keys):
+        pop_uri_based_key()
+
+
 def pop_uri_based_key(prefix: Optional[str] = None, prefix2: str = "") -> Union[int, str]:
     """
     Create a short key (int or str) (optionally with prefixes) from the reservoir.
@@ -1211,8 +2016,28 @@ class QualifierFactory:
 class RelationEdge:
     """
     Models a conrete (instantiated/applied) relation between entities. This is basically a dict.
+
+    To save memory only the primal edge (role: SUBJECT) is stored. The inverse edge (role: OBJECT) is a lightweight
+    view which is created on demand, see `DualRelationEdge`.
     """
 
+    __slots__ = (
+        "short_key",
+        "base_uri",
+        "uri",
+        "relation",
+        "relation_tuple",
+        "scope",
+        "corresponding_entity",
+        "corresponding_literal",
+        "qualifiers",
+        "proxyitem",
+        "unlinked",
+        "_dual_view",
+    )
+
+    role = RelationRole.SUBJECT
+
     def __init__(
         self,
         relation: Relation = None,
@@ -1228,7 +2053,8 @@ class RelationEdge:
 
         :param relation:
         :param relation_tuple:
-        :param role:                    RelationRole.SUBJECT for normal and RelationRole.OBJECT for inverse edges
+        :param role:                    must be None or RelationRole.SUBJECT (inverse edges are created on demand
+                                        via `.dual_relation_edge`)
         :param corresponding_entity:    This is the entity on the "other side" of the relation (depending of `role`) or
                                         None in case that other side is a literal
         :param corresponding_literal:   This is the literal on the "other side" of the relation (depending of `role`) or
@@ -1238,23 +2064,22 @@ class RelationEdge:
         :param proxyitem:               associated item; e.g. a equation-item
         """
 
-        self.short_key = f"RE{pop_uri_based_key()}"
+        if role not in (None, RelationRole.SUBJECT):
+            msg = f"Unexpected role: {role}. Inverse relation edges are available via `.dual_relation_edge`."
+            raise ValueError(msg)
+
+        self.short_key = pop_rledg_key()
         mod_uri = get_active_mod_uri()
         self.base_uri = mod_uri
         self.uri = f"{aux.make_uri(self.base_uri, self.short_key)}"
         self.relation = relation
-        self.rsk = relation.short_key  # to conviniently access this attribute in visualization
         self.relation_tuple = relation_tuple
-        self.subject = relation_tuple[0]
-        self.predicate = relation_tuple[1]
-        self.object = relation_tuple[2]
-        self.role = role
         self.scope = scope
         self.corresponding_entity = corresponding_entity
         self.corresponding_literal = corresponding_literal
         self.qualifiers = []
+        self._dual_view = None
         self._process_qualifiers(qualifiers)
-        self.dual_relation_edge = None
         self.unlinked = None
 
         ds.rledgs_created_in_mod[mod_uri][self.uri] = self
@@ -1265,6 +2090,35 @@ class RelationEdge:
         # TODO: replace this by qualifier
         self.proxyitem = proxyitem
 
+    @property
+    def subject(self):
+        return self.relation_tuple[0]
+
+    @property
+    def predicate(self):
+        return self.relation_tuple[1]
+
+    @property
+    def object(self):
+        return self.relation_tuple[2]
+
+    @property
+    def rsk(self):
+        # to conviniently access this attribute in visualization
+        return self.relation.short_key
+
+    @property
+    def dual_relation_edge(self) -> Optional["DualRelationEdge"]:
+        """
+        Return the inverse edge (role: OBJECT) as a lightweight view (created on the first access) or None if the
+        object is a literal.
+        """
+        if self.corresponding_entity is None:
+            return None
+        if self._dual_view is None:
+            self._dual_view = DualRelationEdge(self)
+        return self._dual_view
+
     @property
     def key_str(self):
         # TODO: the "attribute" `.key_str` for RelationEdge is deprecated; use `.short_key` instead
@@ -1310,36 +2164,12 @@ class RelationEdge:
             # we might also need dual edge
             if isinstance(qf.obj, Entity):
                 # add inverse relation
-                dual_rledg = qf_rledg.create_dual()
-                ds.inv_relation_edges[qf.obj.uri][qf.rel.uri].append(dual_rledg)
-
-    def create_dual(self):
-        if self.role == RelationRole.SUBJECT:
-            new_role = RelationRole.OBJECT
-        elif self.role == RelationRole.OBJECT:
-            new_role = RelationRole.SUBJECT
-        else:
-            msg = (
-                f"Unexpected value for `self.role`: {self.role}. Expected either `RelationRole.SUBJECT` or "
-                "`RelationRole.OBJECT`"
-            )
-            raise ValueError(msg)
-
-        dual_rledg = RelationEdge(
-            relation=self.relation,
-            relation_tuple=self.relation_tuple,
-            role=new_role,
-            corresponding_entity=self.corresponding_entity,
-            scope=self.scope,
-            qualifiers=self.qualifiers,
-            proxyitem=self.proxyitem,
-        )
+                ds.set_inv_relation_edge(qf_rledg)
+                pop_legacy_inv_rledg_keys(qf_rledg)
 
-        # establish interconnection
-        dual_rledg.dual_relation_edge = self
-        self.dual_relation_edge = dual_rledg
-
-        return dual_rledg
+    def create_dual(self) -> Optional["DualRelationEdge"]:
+        # TODO: obsolete; use `.dual_relation_edge` directly
+        return self.dual_relation_edge
 
     def is_qualifier(self):
         return isinstance(self.subject, RelationEdge)
@@ -1358,34 +2188,14 @@ class RelationEdge:
 
         subj, pred, obj = self.relation_tuple
 
-        if self.is_qualifier():
-            # _xx !! -> uri
-            _ = ds.relation_edges.pop(subj.uri, [])
-
-        if self.role == RelationRole.SUBJECT:
-
-            subj_rel_edges: Dict[str : List[RelationEdge]] = ds.relation_edges[subj.uri]
-            tolerant_removal(subj_rel_edges.get(pred.uri, []), self)
+        ds.remove_relation_edge(self)
 
-            # ds.relation_relation_edges: for every relation key stores a list of relevant relation-edges
-            # (check before accessing the *defaultdict* to avoid to create a key just by looking)
-            if pred.uri in ds.relation_relation_edges:
-                tolerant_removal(ds.relation_relation_edges.get(pred.uri, []), self)
-
-        elif self.role == RelationRole.OBJECT:
+        if self.corresponding_entity is not None:
             assert isinstance(obj, Entity)
-            obj_rel_edges: Dict[str : List[RelationEdge]] = ds.inv_relation_edges[obj.uri]
-            # (check before accessing, see above)
-            if pred.uri in obj_rel_edges:
-                tolerant_removal(obj_rel_edges[pred.uri], self)
-        else:
-            msg = f"Unexpected .role attribute: {self.role}"
-            raise ValueError(msg)
+            ds.remove_inv_relation_edge(self)
 
         # this prevents from infinite recursion
         self.unlinked = True
-        if self.dual_relation_edge is not None:
-            self.dual_relation_edge.unlink()
 
         for qf in self.qualifiers:
             qf: RelationEdge
@@ -1397,6 +2207,70 @@ class RelationEdge:
         ds.released_keys.append(self.short_key)
 
 
+class DualRelationEdge:
+    """
+    Inverse view (role: OBJECT) on a primal RelationEdge (see `RelationEdge.dual_relation_edge`). It only stores a
+    reference to the primal edge, all data (uri, qualifiers, scope, ...) is taken from there.
+    Note: the qualifiers are shared, i.e. the subject of a qualifier is the primal edge
+    (`inv_rledg.dual_relation_edge`).
+    """
+
+    __slots__ = ("primal",)
+
+    role = RelationRole.OBJECT
+
+    def __init__(self, primal: RelationEdge):
+        self.primal = primal
+
+    def __eq__(self, other):
+        return isinstance(other, DualRelationEdge) and self.primal is other.primal
+
+    def __hash__(self):
+        return hash((DualRelationEdge, id(self.primal)))
+
+    def __repr__(self):
+        return f"{self.primal.short_key}(dual){self.primal.relation_tuple}"
+
+    def __getstate__(self):
+        return {"primal": self.primal}
+
+    def __setstate__(self, state):
+        self.primal = state["primal"]
+
+    short_key = property(lambda self: self.primal.short_key)
+    key_str = property(lambda self: self.primal.short_key)
+    base_uri = property(lambda self: self.primal.base_uri)
+    uri = property(lambda self: self.primal.uri)
+    relation = property(lambda self: self.primal.relation)
+    relation_tuple = property(lambda self: self.primal.relation_tuple)
+    subject = property(lambda self: self.primal.subject)
+    predicate = property(lambda self: self.primal.predicate)
+    object = property(lambda self: self.primal.object)
+    rsk = property(lambda self: self.primal.rsk)
+    scope = property(lambda self: self.primal.scope)
+    qualifiers = property(lambda self: self.primal.qualifiers)
+    proxyitem = property(lambda self: self.primal.proxyitem)
+    unlinked = property(lambda self: self.primal.unlinked)
+
+    # "the other side" of the relation (from the perspective of the object)
+    corresponding_entity = property(lambda self: self.primal.relation_tuple[0])
+    corresponding_literal = None
+
+    @property
+    def dual_relation_edge(self) -> RelationEdge:
+        return self.primal
+
+    def create_dual(self) -> RelationEdge:
+        # TODO: obsolete; use `.dual_relation_edge` directly
+        return self.primal
+
+    def is_qualifier(self):
+        return self.primal.is_qualifier()
+
+    def unlink(self, *args) -> None:
+        self.primal.unlink(*args)
+
+
 def tolerant_removal(sequence, element):
     """
     call sequence.remove(element) but tolerate KeyError and ValueError
@@ -1448,6 +2322,7 @@ def create_relation(key_str: str = "", **kwargs) -> Relation:
     rel = Relation(mod_uri, rel_key, **new_kwargs)
     assert rel.uri not in ds.relations
     ds.relations[rel.uri] = rel
+    ds.invalidate_key_str_cache(rel.short_key)
     ds.entities_created_in_mod[mod_uri].append(rel.uri)
     return rel
 
@@ -1543,8 +2418,17 @@ def get_key_str_by_inspection(upcount=1) -> str:
 
     # this is strongly inspired by sympy.var
     try:
-        fi = inspect.getframeinfo(frame)
-        code_context = fi.code_context
+        ds.key_str_inspection_counter[get_active_mod_uri(strict=False)] += 1
+
+        # the source line is cached for each call site (`inspect.getframeinfo` would read the file and compute the
+        # context lines for every call)
+        cache_key = (frame.f_code, frame.f_lineno)
+        line = ds.key_str_inspection_cache.get(cache_key)
+        if line is None:
+            filename = frame.f_code.co_filename
+            linecache.checkcache(filename)
+            line = linecache.getline(filename, frame.f_lineno, frame.f_globals)
+            ds.key_str_inspection_cache[cache_key] = line
     finally:
         # we should explicitly break cyclic dependencies as stated in inspect
         # doc
@@ -1552,7 +2436,7 @@ def get_key_str_by_inspection(upcount=1) -> str:
 
     # !! TODO: parsing the assignment should be more robust (correct parsing of logical lines)
     # assume that there is at least one `=` in the line
-    lhs, rhs = code_context[0].split("=")[:2]
+    lhs, rhs = line.split("=")[:2]
     res: str = lhs.split("(")[-1].strip()
     assert res.isidentifier()
     return res
@@ -1663,7 +2547,8 @@ def unload_mod(mod_uri: str, strict=True) -> None:
         _unlink_entity(uri)
         assert uri not in ds.relation_relation_edges.keys()
 
-    intersection_set = set(entity_uris).intersection(ds.relation_relation_edges.keys())
+    # (iterate over the entities of this module only, not over all relations)
+    intersection_set = {uri for uri in entity_uris if uri in ds.relation_relation_edges}
 
     msg = "Unexpectedly some of the entity keys are still present"
     assert len(intersection_set) == 0, msg
@@ -1673,6 +2558,13 @@ def unload_mod(mod_uri: str, strict=True) -> None:
         assert isinstance(rledg, RelationEdge)
         rledg.unlink()
 
+    # the resolution of key strings might have changed
+    ds.invalidate_key_str_cache()
+
+    # the module might be reloaded from a modified source file
+    ds.key_str_inspection_cache.clear()
+    ds.key_str_inspection_counter.pop(mod_uri, None)
+
     try:
         ds.mod_path_mapping.remove_pair(key_a=mod_uri)
     except KeyError:
@@ -1681,9 +2573,6 @@ def unload_mod(mod_uri: str, strict=True) -> None:
         else:
             pass
 
-    aux.clean_dict(ds.relation_edges)
-    aux.clean_dict(ds.inv_relation_edges)
-
     # TODO: obsolete
     res = list(ds.released_keys)
 
@@ -1693,6 +2582,10 @@ def unload_mod(mod_uri: str, strict=True) -> None:
         if strict:
             raise
 
+    ds.uri_rledg_key_allocator_dict.pop(mod_uri, None)
+    ds.uri_content_hash_dict.pop(mod_uri, None)
+    ds.uri_parent_mod_dict.pop(mod_uri, None)
+
     try:
         ds.uri_mod_dict.pop(mod_uri)
     except KeyError:
@@ -1719,6 +2612,7 @@ def _unlink_entity(uri: str) -> None:
     entity: Entity = ds.get_entity_by_uri(uri)
     res1 = ds.items.pop(uri, None)
     res2 = ds.relations.pop(uri, None)
+    ds.relation_metadata.pop(uri, None)
 
     if uri == "Ia9108":
         pass
@@ -1729,8 +2623,7 @@ def _unlink_entity(uri: str) -> None:
         raise KeyError(msg)
 
     # now delete the relation edges from the data structures
-    re_dict = ds.relation_edges.pop(entity.uri, {})
-    inv_re_dict = ds.inv_relation_edges.pop(entity.uri, {})
+    re_dict, inv_re_dict = ds.collect_entity_relation_edges(entity.uri)
 
     # in case res1 is a scope-item we delete all corressponding relation edges, otherwise nothing happens
     scope_rels = ds.scope_relation_edges.pop(uri, [])
@@ -1747,7 +2640,7 @@ def _unlink_entity(uri: str) -> None:
 
     if isinstance(entity, Relation):
 
-        tmp = ds.relation_relation_edges.pop(uri, [])
+        tmp = ds.collect_relation_relation_edges(uri)
         re_list.extend(tmp)
 
     # now iterate over all RelationEdge instances
@@ -1755,11 +2648,6 @@ def _unlink_entity(uri: str) -> None:
         re: RelationEdge
         re.unlink(uri)
 
-    # during unlinking of the RelationEdges the default dicts might have been recreating some keys -> pop again
-    # TODO: obsolete because we clean up the defaultdicts anyway
-    ds.relation_edges.pop(entity.uri, None)
-    ds.inv_relation_edges.pop(entity.uri, None)
-
     ds.released_keys.append(uri)
 
 
@@ -2,7 +2,13 @@ import importlib.util
 import sys
 import os
 import inspect
+import hashlib
+import pickle
+import multiprocessing
+from typing import List, Optional, Sequence
+
 import pyerk
+from . import snapshot
 
 from ipydex import IPS, activate_ips_on_exception
 
@@ -11,8 +17,18 @@ activate_ips_on_exception()
 ModuleType = type(sys)
 
 
+# this stack serves to record which modules are loaded during the execution of a module (see `load_mod_from_path`)
+_load_stack = []
+
+
+def get_content_hash(source: bytes) -> str:
+    return hashlib.sha256(source).hexdigest()
+
+
 # noinspection PyProtectedMember
-def load_mod_from_path(modpath: str, prefix: str, modname=None, allow_reload=True, smart_relative=True) -> ModuleType:
+def load_mod_from_path(
+    modpath: str, prefix: str, modname=None, allow_reload=True, smart_relative=True, use_cache=None
+) -> ModuleType:
     """
 
     :param modpath:         file system path for the module to be loaded
@@ -21,6 +37,9 @@ def load_mod_from_path(modpath: str, prefix: str, modname=None, allow_reload=Tru
     :param allow_reload:    flag; if False, an error is raised if the module was already loades
     :param smart_relative:  flag; if True, relative paths are interpreted w.r.t. the calling module
                             (not w.r.t. current working path)
+    :param use_cache:       flag; if True, the entities and relation edges of the module are stored in (and restored
+                            from) the directory `settings.LOADER_CACHE_DIR` instead of executing the module again;
+                            default: None -> use the cache if `settings.LOADER_CACHE_DIR` is set
     :return:
     """
     if modname is None:
@@ -48,6 +67,53 @@ def load_mod_from_path(modpath: str, prefix: str, modname=None, allow_reload=Tru
             msg = f"Unintended attempt to reload module {old_mod_uri}"
             raise pyerk.aux.ModuleAlreadyLoadedError(msg)
 
+    if use_cache is None:
+        use_cache = pyerk.settings.LOADER_CACHE_DIR is not None
+
+    with open(modpath, "rb") as fp:
+        content_hash = get_content_hash(fp.read())
+
+    if _load_stack:
+        # this module is loaded by another module (which is currently executed)
+        _load_stack[-1].append((modpath, prefix, modname, allow_reload))
+
+    cache_fpath = None
+    if use_cache:
+        cache_fpath = get_cache_fpath(content_hash, prefix, modname)
+        _load_stack.append([])
+        try:
+            mod = _load_mod_from_cache(cache_fpath)
+        finally:
+            nested_loads = _load_stack.pop()
+        if mod is not None:
+            _register_loaded_mod(mod, content_hash, nested_loads)
+            return mod
+
+    _load_stack.append([])
+    try:
+        mod = _exec_mod(modpath, prefix, modname)
+    finally:
+        nested_loads = _load_stack.pop()
+
+    _register_loaded_mod(mod, content_hash, nested_loads)
+
+    if use_cache:
+        _write_cache(cache_fpath, mod, nested_loads)
+
+    return mod
+
+
+def _register_loaded_mod(mod: ModuleType, content_hash: str, nested_loads: list) -> None:
+    pyerk.ds.uri_content_hash_dict[mod.__URI__] = content_hash
+
+    # remember which modules were loaded by this module (relevant for `reload_mods`)
+    for nested_modpath, *_ in nested_loads:
+        nested_mod_uri = pyerk.ds.mod_path_mapping.b.get(nested_modpath)
+        if nested_mod_uri is not None:
+            pyerk.ds.uri_parent_mod_dict[nested_mod_uri] = mod.__URI__
+
+
+def _exec_mod(modpath: str, prefix: str, modname: str) -> ModuleType:
     spec = importlib.util.spec_from_file_location(modname, modpath)
     mod = importlib.util.module_from_spec(spec)
 
@@ -85,6 +151,7 @@ def load_mod_from_path(modpath: str, prefix: str, modname=None, allow_reload=Tru
 
     pyerk.aux.ensure_valid_baseuri(mod_uri)
     pyerk.ds.uri_prefix_mapping.add_pair(mod_uri, prefix)
+    pyerk.ds.invalidate_key_str_cache()
 
     pyerk.ds.uri_mod_dict[mod_uri] = mod
 
@@ -93,3 +160,292 @@ def load_mod_from_path(modpath: str, prefix: str, modname=None, allow_reload=Tru
 
     mod.__fresh_load__ = True
     return mod
+
+
+# keys of the dicts which are stored in the cache files (see `_write_cache`)
+CACHE_ENTRY_KEYS = {"nested_loads", "nested_hashes", "nested_mod_uris", "dependency_hashes", "data"}
+
+
+def get_cache_fpath(content_hash: str, prefix: str, modname: str) -> str:
+    """
+    Return the path of the cache file for a module (the content of the module file determines the name).
+    """
+
+    # the prefix and the modname are stored in the cached data, thus they are part of the key
+    key = get_content_hash(f"{content_hash};{prefix};{modname}".encode("utf8"))
+    return os.path.join(pyerk.settings.LOADER_CACHE_DIR, f"{modname}-{key}.erkcache")
+
+
+def _load_mod_from_cache(cache_fpath: str) -> Optional[ModuleType]:
+    """
+    Restore a module from the cache file if it exists and is still valid, i.e. if the modules on which it depends are
+    loaded and have the same content hash as when the cache file was written.
+
+    :return:    the restored module or None
+    """
+
+    if not os.path.isfile(cache_fpath):
+        return None
+
+    try:
+        with open(cache_fpath, "rb") as fp:
+            entry = pickle.load(fp)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        entry = None
+
+    if not isinstance(entry, dict) or not CACHE_ENTRY_KEYS.issubset(entry):
+        # e.g. a truncated file or a file from an older version of pyerk (it is rewritten after the execution)
+        os.remove(cache_fpath)
+        return None
+
+    # check the content hashes before anything is loaded (otherwise the nested modules would be loaded twice in case
+    # of a cache miss: here and during the execution of the module)
+    if not _check_dependency_hashes(entry):
+        return None
+
+    # load the modules which the module itself loads (in the same order)
+    for nested_modpath, nested_prefix, nested_modname, nested_allow_reload in entry["nested_loads"]:
+        load_mod_from_path(
+            nested_modpath,
+            prefix=nested_prefix,
+            modname=nested_modname,
+            allow_reload=nested_allow_reload,
+            smart_relative=False,
+            use_cache=True,
+        )
+
+    # (this should only fail if the nested modules themselves were changed in an unexpected way)
+    for mod_uri, content_hash in entry["dependency_hashes"].items():
+        if pyerk.ds.uri_content_hash_dict.get(mod_uri) != content_hash:
+            return None
+
+    try:
+        mod_list = snapshot.load_modules(entry["data"])
+    except pyerk.aux.SnapshotError:
+        # e.g. the cache file was written by another version of pyerk
+        return None
+
+    return mod_list[0]
+
+
+def _check_dependency_hashes(entry: dict) -> bool:
+    """
+    Check whether the dependencies of a cache entry are unchanged: the files of the nested modules (which are loaded
+    by the module itself) and the other modules (which must already be loaded).
+    """
+
+    for modpath, content_hash in entry["nested_hashes"].items():
+        if not os.path.isfile(modpath):
+            return False
+        with open(modpath, "rb") as fp:
+            if get_content_hash(fp.read()) != content_hash:
+                return False
+
+    for mod_uri, content_hash in entry["dependency_hashes"].items():
+        if mod_uri in entry["nested_mod_uris"]:
+            # already checked via the file
+            continue
+        if pyerk.ds.uri_content_hash_dict.get(mod_uri) != content_hash:
+            return False
+
+    return True
+
+
+def _write_cache(cache_fpath: str, mod: ModuleType, nested_loads: list) -> None:
+    """
+    Store the entities and relation edges of a freshly executed module in the cache directory.
+
+    Modules which cannot be serialized or which depend on modules that were not loaded from a file are not cached.
+    """
+
+    try:
+        data = snapshot.dump_modules([mod.__URI__])
+    except pyerk.aux.SnapshotError:
+        return
+
+    dependency_hashes = {}
+    for mod_uri in snapshot.get_header(data)["dependencies"]:
+        content_hash = pyerk.ds.uri_content_hash_dict.get(mod_uri)
+        if content_hash is None:
+            return
+        dependency_hashes[mod_uri] = content_hash
+
+    nested_hashes = {}
+    nested_mod_uris = []
+    for nested_modpath, *_ in nested_loads:
+        nested_mod_uri = pyerk.ds.mod_path_mapping.b.get(nested_modpath)
+        content_hash = pyerk.ds.uri_content_hash_dict.get(nested_mod_uri)
+        if content_hash is None:
+            return
+        nested_hashes[nested_modpath] = content_hash
+        nested_mod_uris.append(nested_mod_uri)
+
+    entry = {
+        "nested_loads": nested_loads,
+        "nested_hashes": nested_hashes,
+        "nested_mod_uris": nested_mod_uris,
+        "dependency_hashes": dependency_hashes,
+        "data": data,
+    }
+
+    os.makedirs(os.path.dirname(cache_fpath), exist_ok=True)
+
+    # write to a temporary file first to avoid corrupted cache files (e.g. due to parallel processes)
+    tmp_fpath = f"{cache_fpath}.{os.getpid()}.tmp"
+    with open(tmp_fpath, "wb") as fp:
+        pickle.dump(entry, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_fpath, cache_fpath)
+
+
+def get_modified_mod_uris() -> List[str]:
+    """
+    Return the uris of all loaded modules whose source file has changed since loading (in the order of loading).
+    """
+
+    res = []
+    for mod_uri in pyerk.ds.uri_mod_dict:
+        content_hash = pyerk.ds.uri_content_hash_dict.get(mod_uri)
+        modpath = pyerk.ds.mod_path_mapping.a.get(mod_uri)
+        if content_hash is None or modpath is None:
+            continue
+        if not os.path.isfile(modpath):
+            # the module can not be reloaded
+            continue
+        with open(modpath, "rb") as fp:
+            if get_content_hash(fp.read()) != content_hash:
+                res.append(mod_uri)
+    return res
+
+
+def get_dependent_mod_uris(mod_uris: List[str]) -> List[str]:
+    """
+    Return the uris of the given modules and of all loaded modules which (directly or indirectly) refer to their
+    entities (in the order of loading).
+
+    :param mod_uris:    list of module uris
+    """
+
+    affected = set(mod_uris)
+    stack = list(mod_uris)
+    while stack:
+        mod_uri = stack.pop()
+        for src_uri in pyerk.ds.get_referencing_mod_uris(mod_uri):
+            if src_uri not in affected:
+                affected.add(src_uri)
+                stack.append(src_uri)
+
+    # modules which are not in uri_mod_dict have not been loaded by erkloader and thus cannot be reloaded
+    return [mod_uri for mod_uri in pyerk.ds.uri_mod_dict if mod_uri in affected]
+
+
+def reload_mods(mod_uris: Optional[List[str]] = None, use_cache=None) -> List[ModuleType]:
+    """
+    Incrementally reload modules: unload the given modules and all modules which refer to their entities and
+    load them again (in the original order). All other modules remain untouched.
+
+    :param mod_uris:    list of module uris; default: None -> all modules whose source file has changed
+    :param use_cache:   passed to `load_mod_from_path`
+    :return:            list of the reloaded modules
+    """
+
+    if mod_uris is None:
+        mod_uris = get_modified_mod_uris()
+
+    affected = get_dependent_mod_uris(mod_uris)
+    affected_set = set(affected)
+
+    load_args = []
+    for mod_uri in affected:
+        if pyerk.ds.uri_parent_mod_dict.get(mod_uri) in affected_set:
+            # this module will be loaded by its parent module
+            continue
+        load_args.append(
+            (pyerk.ds.mod_path_mapping.a[mod_uri], pyerk.ds.uri_prefix_mapping.a[mod_uri], pyerk.ds.modnames[mod_uri])
+        )
+
+    # unload in reverse order such that no module refers to an already unloaded module
+    for mod_uri in reversed(affected):
+        pyerk.unload_mod(mod_uri)
+
+    res = []
+    for modpath, prefix, modname in load_args:
+        mod = load_mod_from_path(modpath, prefix=prefix, modname=modname, smart_relative=False, use_cache=use_cache)
+        res.append(mod)
+    return res
+
+
+def _load_mod_in_worker(args) -> list:
+    """
+    Load a module in a worker process (see `load_mods_in_parallel`) and return the serialized results: a list of
+    tuples (mod_uri, data, content_hash, parent_mod_uri) for every module which was (re)loaded (in the order of
+    loading).
+    """
+
+    modpath, prefix, modname, use_cache = args
+    old_mods = dict(pyerk.ds.uri_mod_dict)
+    load_mod_from_path(modpath, prefix=prefix, modname=modname, smart_relative=False, use_cache=use_cache)
+
+    # this includes the modules which were loaded (or reloaded) by the module itself
+    new_mod_uris = [mod_uri for mod_uri, mod in pyerk.ds.uri_mod_dict.items() if old_mods.get(mod_uri) is not mod]
+
+    res = []
+    for mod_uri in new_mod_uris:
+        data = snapshot.dump_modules([mod_uri])
+        content_hash = pyerk.ds.uri_content_hash_dict[mod_uri]
+        res.append((mod_uri, data, content_hash, pyerk.ds.uri_parent_mod_dict.get(mod_uri)))
+    return res
+
+
+def load_mods_in_parallel(mod_specs: Sequence[tuple], processes=None, use_cache=None) -> List[ModuleType]:
+    """
+    Load modules which do not depend on each other in worker processes and merge the results (in the given order).
+
+    Each worker executes one module (based on a fork of the current process, i.e. all modules which are already
+    loaded are available) and returns serialized fragments of the DataStore (see `snapshot.dump_modules`). Modules
+    which are loaded by several of the given modules (shared dependencies) are merged only once. The old versions of
+    the modules are unloaded only after all workers have succeeded.
+
+    :param mod_specs:   sequence of tuples like (modpath, prefix) or (modpath, prefix, modname)
+    :param processes:   number of worker processes; default: None -> number of cpus
+    :param use_cache:   passed to `load_mod_from_path`
+    :return:            list of the loaded modules (one for each entry of `mod_specs`)
+    """
+
+    args_list = []
+    for spec in mod_specs:
+        modpath, prefix, modname = (tuple(spec) + (None,))[:3]
+        modpath = os.path.abspath(modpath)
+        if modname is None:
+            modname = os.path.split(modpath)[-1][:-3]
+        args_list.append((modpath, prefix, modname, use_cache))
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes < 2 or len(args_list) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        # parallelization would not pay off (or is not possible because the workers rely on the state of this process)
+        return [
+            load_mod_from_path(modpath, prefix=prefix, modname=modname, smart_relative=False, use_cache=use_cache)
+            for modpath, prefix, modname, use_cache in args_list
+        ]
+
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(processes=min(processes, len(args_list))) as pool:
+        results = pool.map(_load_mod_in_worker, args_list)
+
+    # all workers succeeded: replace the old versions of the modules
+    merged_mod_uris = set()
+    for worker_result in results:
+        for mod_uri, data, content_hash, parent_mod_uri in worker_result:
+            if mod_uri in merged_mod_uris:
+                # shared dependency which was already merged from the result of another worker
+                continue
+            if mod_uri in pyerk.ds.uri_mod_dict:
+                pyerk.unload_mod(mod_uri, strict=False)
+            snapshot.load_modules(data)
+            pyerk.ds.uri_content_hash_dict[mod_uri] = content_hash
+            if parent_mod_uri is not None:
+                pyerk.ds.uri_parent_mod_dict[mod_uri] = parent_mod_uri
+            merged_mod_uris.add(mod_uri)
+
+    return [pyerk.ds.uri_mod_dict[pyerk.ds.mod_path_mapping.b[modpath]] for modpath, *_ in args_list]
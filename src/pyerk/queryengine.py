@@ -0,0 +1,386 @@
+"""
+This module contains a native query engine which evaluates basic graph patterns (conjunctions of triple patterns)
+directly on the indexes of `core.ds` (without copying the data into an rdflib graph).
+
+It can be used directly, e.g.:
+
+```
+for row in match_bgp([("?s", p.R16, ocse.I7733)]):
+    print(row["s"])
+```
+
+and serves as fast path in `rdfstack.perform_sparql_query` for sparql queries which only consist of a basic graph
+pattern with optional filters, projection, DISTINCT and LIMIT/OFFSET (see `evaluate_prepared_query`). All other
+queries are evaluated by rdflib.
+
+Internally, every term is represented by a key: entities by their uri (str) and literals by the corresponding
+`rdflib.Literal` (which is not equal to any plain str). This reproduces the semantics of the rdf graph (see
+`rdfstack.make_rdf_triple`), including that a triple which corresponds to several relation edges matches only once.
+"""
+
+from itertools import chain, islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from rdflib import Literal, URIRef, Variable
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import FrozenBindings, Query, QueryContext
+
+from . import core
+from . import auxiliary as aux
+
+try:
+    # rdflib does not offer a public function to evaluate filter expressions (effective boolean value)
+    from rdflib.plugins.sparql.evalutils import _ebv
+except ImportError:
+    # queries with filters are then evaluated by rdflib (see `_QueryPlan`)
+    _ebv = None
+
+
+class UnsupportedQueryError(aux.PyERKError):
+    """
+    raised if a query cannot be evaluated by the native engine
+    """
+
+    pass
+
+
+def make_key(obj):
+    """
+    Return the key which represents a term in the engine.
+
+    :param obj:     Entity, rdflib term or literal value
+    """
+
+    if isinstance(obj, core.Entity):
+        return obj.uri
+    if isinstance(obj, URIRef):
+        return str(obj)
+    if isinstance(obj, Literal):
+        return obj
+    # a literal value or a RelationEdge (subject of a qualifier), see rdfstack.make_rdf_triple
+    return Literal(obj)
+
+
+def make_rdf_term(key):
+    if isinstance(key, Literal):
+        return key
+    return URIRef(key)
+
+
+def make_pyerk_object(key, uri_cache: dict):
+    if isinstance(key, Literal):
+        return key.value
+    entity = uri_cache.get(key)
+    if entity is None:
+        entity = uri_cache[key] = core.ds.get_entity_by_uri(key)
+    return entity
+
+
+def _make_triple_keys(re: core.RelationEdge) -> tuple:
+    subj, pred, obj = re.relation_tuple
+    return make_key(subj), pred.uri, make_key(obj)
+
+
+class TriplePattern:
+    """
+    Triple pattern whose elements are either variables (instances of `Variable`) or keys (see `make_key`).
+    """
+
+    def __init__(self, subj, pred, obj):
+        self.terms = (subj, pred, obj)
+        self.variables = {term for term in self.terms if isinstance(term, Variable)}
+
+    def substitute(self, bindings: dict) -> tuple:
+        return tuple(bindings.get(term, term) if isinstance(term, Variable) else term for term in self.terms)
+
+    def __repr__(self):
+        return f"TriplePattern{self.terms}"
+
+
+def _is_bound(term) -> bool:
+    return not isinstance(term, Variable)
+
+
+def _is_uri_key(term) -> bool:
+    return _is_bound(term) and not isinstance(term, Literal)
+
+
+def get_candidate_rledgs(subj, pred, obj):
+    """
+    Return the relation edges which might match the (substituted) pattern based on the most specific index.
+    """
+
+    ds = core.ds
+    if _is_uri_key(subj):
+        inner_dict = ds.relation_edges.get(subj)
+    elif _is_uri_key(obj):
+        inner_dict = ds.inv_primal_relation_edges.get(obj)
+    elif _is_uri_key(pred):
+        return ds.relation_relation_edges.get(pred, ())
+    else:
+        return chain.from_iterable(ds.relation_relation_edges.values())
+
+    if inner_dict is None:
+        return ()
+    if _is_uri_key(pred):
+        return inner_dict.get(pred, ())
+    return chain.from_iterable(inner_dict.values())
+
+
+def match_pattern(pattern: TriplePattern, bindings: dict) -> Iterator[dict]:
+    """
+    Yield the extensions of `bindings` for all (distinct) triples which match the pattern.
+    """
+
+    terms = pattern.substitute(bindings)
+
+    # the data might change while the results are consumed -> iterate over a copy
+    rledgs = list(get_candidate_rledgs(*terms))
+
+    seen = set()
+    for re in rledgs:
+        triple = _make_triple_keys(re)
+        if triple in seen:
+            continue
+
+        new_bindings = None
+        for term, key in zip(terms, triple):
+            if isinstance(term, Variable):
+                if new_bindings is None:
+                    new_bindings = dict(bindings)
+                bound_key = new_bindings.get(term)
+                if bound_key is None:
+                    # a variable might occur more than once in the same pattern
+                    new_bindings[term] = key
+                elif bound_key != key:
+                    break
+            elif term != key:
+                break
+        else:
+            seen.add(triple)
+            yield bindings if new_bindings is None else new_bindings
+
+
+def estimate_cost(pattern: TriplePattern, bindings: dict) -> float:
+    """
+    Estimate the number of matches of a pattern w.r.t. the current bindings (the pattern with the smallest estimate
+    is evaluated first). The estimate is based on the relation statistics of the DataStore (see
+    `core.RelationStatistics`).
+    """
+
+    subj, pred, obj = pattern.substitute(bindings)
+    ds = core.ds
+
+    if _is_uri_key(pred):
+        stats = ds.get_relation_statistics(pred)
+        if _is_uri_key(subj):
+            n = stats.subject_counts.get(subj, 0)
+            return min(n, 1) if _is_bound(obj) else n
+        if _is_uri_key(obj):
+            n = stats.object_counts.get(obj, 0)
+            return min(n, 1) if _is_bound(subj) else n
+        if _is_bound(subj):
+            # literal subject (qualifier)
+            return stats.avg_fanout
+        if _is_bound(obj):
+            # literal object
+            return stats.avg_fanin
+        return stats.n_edges
+
+    # unbound predicate
+    if _is_uri_key(subj):
+        n = sum(len(rledgs) for rledgs in ds.relation_edges.get(subj, {}).values())
+        return min(n, 1) if _is_bound(obj) else n
+    if _is_uri_key(obj):
+        n = sum(len(rledgs) for rledgs in ds.inv_primal_relation_edges.get(obj, {}).values())
+        return min(n, 1) if _is_bound(subj) else n
+    return len(ds.relation_edge_triples)
+
+
+def _evaluate_patterns(patterns: List[TriplePattern], bindings: dict) -> Iterator[dict]:
+    if not patterns:
+        yield bindings
+        return
+
+    # evaluate the most selective pattern first (w.r.t. the current bindings)
+    idx = min(range(len(patterns)), key=lambda i: estimate_cost(patterns[i], bindings))
+    pattern = patterns[idx]
+    remaining = patterns[:idx] + patterns[idx + 1 :]
+
+    for new_bindings in match_pattern(pattern, bindings):
+        yield from _evaluate_patterns(remaining, new_bindings)
+
+
+def evaluate_bgp(patterns: List[TriplePattern], init_bindings: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Yield all solutions (dicts like {Variable("s"): key, ...}) of a basic graph pattern.
+    """
+
+    return _evaluate_patterns(list(patterns), dict(init_bindings or {}))
+
+
+def _make_term(arg):
+    if isinstance(arg, Variable):
+        return arg
+    if isinstance(arg, str) and not isinstance(arg, Literal) and arg.startswith("?"):
+        return Variable(arg[1:])
+    return make_key(arg)
+
+
+def match_bgp(
+    patterns: List[tuple],
+    init_bindings: Optional[dict] = None,
+    filter_func: Optional[Callable[[dict], bool]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, object]]:
+    """
+    Python API: yield all solutions of a conjunction of triple patterns as dicts like {"s": <Item I1234>, ...}.
+
+    :param patterns:        list of 3-tuples; elements are either variables (strings like "?s") or entities or
+                            literal values
+    :param init_bindings:   optional dict like {"s": <Item I1234>, ...} which binds variables
+    :param filter_func:     optional callable which receives a solution dict and returns whether to keep it
+    :param limit:           optional maximum number of solutions
+    """
+
+    triple_patterns = [TriplePattern(*[_make_term(arg) for arg in pattern]) for pattern in patterns]
+    bindings = {Variable(str(name).lstrip("?")): make_key(value) for name, value in (init_bindings or {}).items()}
+
+    def _iter_solutions():
+        uri_cache = {}
+        for solution in evaluate_bgp(triple_patterns, bindings):
+            res = {str(var): make_pyerk_object(key, uri_cache) for var, key in solution.items()}
+            if filter_func is None or filter_func(res):
+                yield res
+
+    return islice(_iter_solutions(), limit)
+
+
+def _contains_exists(expr) -> bool:
+    """
+    Return True if a filter expression contains EXISTS or NOT EXISTS (which are evaluated on the rdflib graph).
+    """
+
+    if isinstance(expr, CompValue):
+        if expr.name in ("Builtin_EXISTS", "Builtin_NOTEXISTS"):
+            return True
+        return any(_contains_exists(value) for value in expr.values())
+    if isinstance(expr, (list, tuple)):
+        return any(_contains_exists(value) for value in expr)
+    return False
+
+
+class _QueryPlan:
+    """
+    Evaluable form of a supported sparql query (see `evaluate_prepared_query`).
+    """
+
+    def __init__(self, algebra: CompValue):
+        self.start = 0
+        self.length = None
+        self.distinct = False
+        self.filters = []
+        self.needs_graph = False
+
+        part = algebra.p
+        if part.name == "Slice":
+            self.start = part.start or 0
+            self.length = part.length
+            part = part.p
+        if part.name in ("Distinct", "Reduced"):
+            # (REDUCED allows but does not require the elimination of duplicates)
+            self.distinct = True
+            part = part.p
+        if part.name != "Project":
+            raise UnsupportedQueryError(f"unsupported algebra: {part.name}")
+        self.vars = list(part.PV)
+        part = part.p
+        while part.name == "Filter":
+            if _ebv is None:
+                raise UnsupportedQueryError("filters are not supported with this version of rdflib")
+            self.filters.append(part.expr)
+            self.needs_graph = self.needs_graph or _contains_exists(part.expr)
+            part = part.p
+        if part.name != "BGP":
+            raise UnsupportedQueryError(f"unsupported algebra: {part.name}")
+
+        self.patterns = []
+        for triple in part.triples:
+            terms = []
+            for term in triple:
+                if not isinstance(term, (Variable, URIRef, Literal)):
+                    # e.g. blank nodes or property paths
+                    raise UnsupportedQueryError(f"unsupported term: {term!r}")
+                terms.append(term if isinstance(term, Variable) else make_key(term))
+            self.patterns.append(TriplePattern(*terms))
+
+    def _check_filters(self, ctx: QueryContext, solution: dict) -> bool:
+        rdf_bindings = {var: make_rdf_term(key) for var, key in solution.items()}
+        frozen_bindings = FrozenBindings(ctx, rdf_bindings)
+        return all(_ebv(expr, frozen_bindings) for expr in self.filters)
+
+    def iter_rows(self, init_bindings: dict, ctx: QueryContext) -> Iterator[list]:
+        bindings = {Variable(str(name)): make_key(value) for name, value in init_bindings.items()}
+        uri_cache = {}
+        seen = set()
+
+        def _iter_rows():
+            for solution in evaluate_bgp(self.patterns, bindings):
+                if self.filters and not self._check_filters(ctx, solution):
+                    continue
+                row_keys = tuple(solution.get(var) for var in self.vars)
+                if self.distinct:
+                    if row_keys in seen:
+                        continue
+                    seen.add(row_keys)
+                yield [None if key is None else make_pyerk_object(key, uri_cache) for key in row_keys]
+
+        stop = None if self.length is None else self.start + self.length
+        return islice(_iter_rows(), self.start, stop)
+
+
+def get_query_plan(prepared_query: Query) -> Optional[_QueryPlan]:
+    """
+    Return the (cached) query plan for a prepared query or None if the query is not supported by this engine.
+    """
+
+    plan_cache = core.ds.native_query_plan_cache
+    if prepared_query in plan_cache:
+        return plan_cache[prepared_query]
+
+    algebra = prepared_query.algebra
+    plan = None
+    if algebra.name == "SelectQuery" and not algebra.datasetClause:
+        try:
+            plan = _QueryPlan(algebra)
+        except UnsupportedQueryError:
+            pass
+
+    plan_cache[prepared_query] = plan
+    return plan
+
+
+def evaluate_prepared_query(
+    prepared_query: Query, init_bindings: dict, get_graph: Optional[Callable] = None
+) -> Optional[Tuple[List[Variable], Iterator[list]]]:
+    """
+    Evaluate a prepared sparql query natively (if supported).
+
+    :param prepared_query:  result of `rdflib.plugins.sparql.prepareQuery`
+    :param init_bindings:   dict like {"s": rdflib_term, ...}
+    :param get_graph:       optional callable which returns the rdflib graph; it is only called if a filter
+                            expression needs the graph as context (EXISTS, NOT EXISTS)
+    :return:                None (if not supported) or tuple (vars, row_iterator); the rows contain pyerk objects
+    """
+
+    plan = get_query_plan(prepared_query)
+    if plan is None:
+        return None
+
+    graph = None
+    if plan.needs_graph and get_graph is not None:
+        graph = get_graph()
+
+    # variables which are not bound by the basic graph pattern are looked up in `initBindings` by the filter evaluation
+    ctx = QueryContext(graph, initBindings={Variable(str(name)): value for name, value in init_bindings.items()})
+    return plan.vars, plan.iter_rows(init_bindings, ctx)
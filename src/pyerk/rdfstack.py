@@ -1,14 +1,17 @@
 """
 This module serves to perform integrity checks on the knowledge base
 """
-from typing import Union
+from itertools import chain, islice
+from typing import Iterator, Optional, Tuple, Union
 
-from . import core as pyerk, auxiliary as aux
+from . import core as pyerk, auxiliary as aux, queryengine
 
 # noinspection PyUnresolvedReferences
 from ipydex import IPS
-from rdflib import Graph, Literal, URIRef
-from rdflib.plugins.sparql.processor import SPARQLResult
+from rdflib import Graph, Literal, URIRef, plugin
+from rdflib.store import Store
+from rdflib.plugins.sparql.processor import SPARQLResult, prepareQuery
+from rdflib.plugins.sparql.sparql import Query
 from rdflib.query import Result
 
 
@@ -20,24 +23,190 @@ from pyparsing import ParseException
 ERK_URI = f"{pyerk.settings.BUILTINS_URI}{pyerk.settings.URI_SEP}"
 
 
+def make_rdf_triple(re: pyerk.RelationEdge) -> tuple:
+    row = []
+    for entity in re.relation_tuple:
+        if isinstance(entity, pyerk.Entity):
+            row.append(URIRef(f"{entity.uri}"))
+        else:
+            # no entity but a literal value
+            row.append(Literal(entity))
+    return tuple(row)
+
+
 def create_rdf_triples() -> Graph:
 
     # based on https://rdflib.readthedocs.io/en/stable/gettingstarted.html
     g = Graph()
 
-    for re_uri, re in pyerk.ds.relation_edge_uri_map.items():
-        row = []
-        for entity in re.relation_tuple:
-            if isinstance(entity, pyerk.Entity):
-                row.append(URIRef(f"{entity.uri}"))
-            else:
-                # no entity but a literal value
-                row.append(Literal(entity))
-        # noinspection PyTypeChecker
-        g.add(row)
+    ds = pyerk.ds
+    triple_keys = ds.relation_edge_triples
+
+    # only consider relation edges which are stored (i.e. not rejected by `ds.set_relation_edge`)
+    quads = (
+        (*make_rdf_triple(re), g)
+        for re in ds.relation_edge_uri_map.values()
+        if ds._make_triple_key_for_rledg(re) in triple_keys
+    )
+    g.addN(quads)
     return g
 
 
+def get_rdfgraph() -> Graph:
+    """
+    Return `ds.rdfgraph` (create it on the first call, see `settings.RDFGRAPH_BACKEND`). If the graph is a separate
+    copy of the triples, synchronize it with the changes of the DataStore since the last call.
+    """
+
+    ds = pyerk.ds
+    if ds.rdfgraph is None:
+        ds.rdfgraph_pending_rledgs.clear()
+        if pyerk.settings.RDFGRAPH_BACKEND == "datastore":
+            ds.rdfgraph = Graph(store=DataStoreRDFStore())
+        elif pyerk.settings.RDFGRAPH_BACKEND == "memory":
+            ds.rdfgraph = create_rdf_triples()
+        else:
+            msg = f"Unknown rdfgraph backend: {pyerk.settings.RDFGRAPH_BACKEND}"
+            raise ValueError(msg)
+        return ds.rdfgraph
+
+    if ds.rdfgraph_pending_rledgs:
+        sync_rdfgraph(ds.rdfgraph, ds.rdfgraph_pending_rledgs)
+        ds.rdfgraph_pending_rledgs.clear()
+
+    return ds.rdfgraph
+
+
+def sync_rdfgraph(g: Graph, rledgs: list) -> None:
+    """
+    Add or remove the triples of the given (changed) relation edges such that the graph reflects the current state of
+    the DataStore.
+
+    Note: Several relation edges might correspond to the same triple (also with different pyerk values, e.g. the
+    str "abc" and `Literal("abc")`). Thus the decision is based on the current content of the DataStore and not on the
+    order of changes.
+    """
+
+    ds = pyerk.ds
+    quads = []
+    removed_triples = []
+    for re in rledgs:
+        triple = make_rdf_triple(re)
+        if ds._make_triple_key_for_rledg(re) in ds.relation_edge_triples:
+            quads.append((*triple, g))
+        elif not _has_stored_rdf_triple(re, triple):
+            removed_triples.append(triple)
+
+    for triple in removed_triples:
+        g.remove(triple)
+    g.addN(quads)
+
+
+def _has_stored_rdf_triple(re: pyerk.RelationEdge, triple: tuple) -> bool:
+    """
+    Return whether any stored relation edge with the same subject and predicate as `re` corresponds to `triple`.
+    """
+
+    subj_uri = re.relation_tuple[0].uri
+    rel_uri = re.relation_tuple[1].uri
+    return any(make_rdf_triple(other) == triple for other in pyerk.ds._get_relation_edges(subj_uri, rel_uri))
+
+
+class DataStoreRDFStore(Store):
+    """
+    Read-only rdflib Store which answers triple patterns directly from the indexes of `core.ds` (no copy of the
+    triples is created). Usage: `Graph(store=DataStoreRDFStore())` or `Graph(store="pyerk")`. Modifications via rdflib
+    raise `aux.ReadOnlyError`.
+    """
+
+    # this tells the DataStore that no synchronization is necessary
+    is_datastore_view = True
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration=configuration, identifier=identifier)
+        self._namespaces = {}
+        self._prefixes = {}
+
+    @staticmethod
+    def _get_candidate_rledgs(subj, pred, obj):
+        """
+        Return the relation edges which might match the pattern (based on the most specific index).
+        """
+
+        ds = pyerk.ds
+        if isinstance(subj, URIRef):
+            inner_dict = ds.relation_edges.get(str(subj))
+        elif isinstance(obj, URIRef):
+            inner_dict = ds.inv_primal_relation_edges.get(str(obj))
+        elif isinstance(pred, URIRef):
+            return ds.relation_relation_edges.get(str(pred), ())
+        else:
+            return chain.from_iterable(ds.relation_relation_edges.values())
+
+        if inner_dict is None:
+            return ()
+        if isinstance(pred, URIRef):
+            return inner_dict.get(str(pred), ())
+        return chain.from_iterable(inner_dict.values())
+
+    def triples(self, triple_pattern, context=None):
+        subj, pred, obj = triple_pattern
+
+        # the data might change while the results are consumed -> iterate over a copy
+        rledgs = list(self._get_candidate_rledgs(subj, pred, obj))
+
+        # several relation edges might correspond to the same triple
+        seen = set()
+        for re in rledgs:
+            triple = make_rdf_triple(re)
+            if subj is not None and triple[0] != subj:
+                continue
+            if pred is not None and triple[1] != pred:
+                continue
+            if obj is not None and triple[2] != obj:
+                continue
+            if triple in seen:
+                continue
+            seen.add(triple)
+            yield triple, iter(())
+
+    def __len__(self, context=None):
+        return len(pyerk.ds.relation_edge_triples)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add(self, triple, context, quoted=False):
+        msg = "DataStoreRDFStore is read-only. Use the pyerk API to create relation edges."
+        raise aux.ReadOnlyError(msg)
+
+    def addN(self, quads):
+        msg = "DataStoreRDFStore is read-only. Use the pyerk API to create relation edges."
+        raise aux.ReadOnlyError(msg)
+
+    def remove(self, triple, context=None):
+        msg = "DataStoreRDFStore is read-only. Use the pyerk API to remove relation edges."
+        raise aux.ReadOnlyError(msg)
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self._namespaces or namespace in self._prefixes):
+            return
+        self._namespaces[prefix] = namespace
+        self._prefixes[namespace] = prefix
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def namespaces(self):
+        return iter(list(self._namespaces.items()))
+
+
+plugin.register("pyerk", Store, "pyerk.rdfstack", "DataStoreRDFStore")
+
+
 def check_subclass(entity, class_item):
 
     # wip!
@@ -55,25 +224,180 @@ def check_subclass(entity, class_item):
 Sparql_results_type = Union[aux.ListWithAttributes, SPARQLResult, Result]
 
 
-def perform_sparql_query(qsrc: str, return_raw=False) -> Sparql_results_type:
+# namespaces which rdflib binds to every new graph (e.g. "rdf", "rdfs", "owl", "xsd")
+DEFAULT_NAMESPACES = dict(Graph().namespaces())
+
 
-    if pyerk.ds.rdfgraph is None:
-        pyerk.ds.rdfgraph = create_rdf_triples()
+def get_query_namespaces() -> dict:
+    """
+    Return the namespaces which can be used in sparql queries without PREFIX declaration: the prefixes of the loaded
+    modules (e.g. "bi" for the builtin entities) and the default namespaces of rdflib.
+    """
 
-    res = pyerk.ds.rdfgraph.query(qsrc)
+    namespaces = {prefix: f"{uri}{pyerk.settings.URI_SEP}" for uri, prefix in pyerk.ds.uri_prefix_mapping.a.items()}
+    namespaces.update(DEFAULT_NAMESPACES)
+    return namespaces
 
-    if return_raw:
-        return res
+
+def get_prepared_query(qsrc: str) -> Query:
+    """
+    Return the parsed and algebra-compiled form of a sparql query (cached by the query text and the module prefixes).
+    """
+
+    ds = pyerk.ds
+    cache_key = (qsrc, tuple(ds.uri_prefix_mapping.a.items()))
+    prepared_query = ds.sparql_query_cache.get(cache_key)
+    if prepared_query is None:
+        # (the rdflib graph is not needed to prepare the query)
+        prepared_query = prepareQuery(qsrc, initNs=get_query_namespaces())
+        ds.sparql_query_cache[cache_key] = prepared_query
+    return prepared_query
+
+
+def convert_from_pyerk_to_rdf(value) -> Union[URIRef, Literal]:
+    if isinstance(value, (URIRef, Literal)):
+        return value
+    if isinstance(value, pyerk.Entity):
+        return URIRef(value.uri)
+    return Literal(value)
+
+
+def perform_sparql_query(
+    qsrc: str, return_raw=False, init_bindings: dict = None, preprocess=False, use_result_cache=False
+) -> Sparql_results_type:
+    """
+    :param qsrc:                sparql query
+    :param return_raw:          flag; if True return the result of rdflib (without conversion to pyerk objects)
+    :param init_bindings:       optional dict like {"s": <Item I1234>, ...} which binds variables of the query
+    :param preprocess:          flag; if True apply `ds.preprocess_query` (allows keys like `:I1234__some_label`)
+    :param use_result_cache:    flag; if True the result is cached until the stored relation edges change
+                                (the caller always gets a copy)
+    """
+
+    ds = pyerk.ds
+    qsrc, init_bindings = _prepare_query_arguments(qsrc, init_bindings, preprocess)
+
+    if use_result_cache:
+        if ds.sparql_result_cache_generation != ds.generation:
+            ds.sparql_result_cache.clear()
+            ds.sparql_result_cache_generation = ds.generation
+        cache_key = (qsrc, tuple(sorted(init_bindings.items())), return_raw)
+        res = ds.sparql_result_cache.get(cache_key)
+        if res is not None:
+            return _copy_result(res, return_raw)
+
+    prepared_query = get_prepared_query(qsrc)
+    native_result = None
+    if not return_raw and pyerk.settings.USE_NATIVE_QUERY_ENGINE:
+        native_result = queryengine.evaluate_prepared_query(prepared_query, init_bindings, get_graph=get_rdfgraph)
+
+    if native_result is not None:
+        res_vars, rows = native_result
+        res = aux.ListWithAttributes(rows)
+        res.vars = res_vars
+    else:
+        res = get_rdfgraph().query(prepared_query, initBindings=init_bindings)
+
+        if not return_raw:
+            res2 = aux.ListWithAttributes(iter_converted_rows(res))
+            res2.vars = res.vars
+            res = res2
+
+    if use_result_cache:
+        # store a copy (raw results might be consumed lazily by the caller)
+        ds.sparql_result_cache[cache_key] = _copy_result(res, return_raw)
+        return _copy_result(ds.sparql_result_cache[cache_key], return_raw)
+    return res
+
+
+def _prepare_query_arguments(qsrc: str, init_bindings: Optional[dict], preprocess: bool) -> Tuple[str, dict]:
+    if preprocess:
+        qsrc = pyerk.ds.preprocess_query(qsrc)
+
+    if init_bindings is None:
+        init_bindings = {}
     else:
-        res2 = aux.apply_func_to_table_cells(convert_from_rdf_to_pyerk, res)
+        init_bindings = {str(key): convert_from_pyerk_to_rdf(value) for key, value in init_bindings.items()}
+    return qsrc, init_bindings
+
+
+def iter_sparql_query(
+    qsrc: str, init_bindings: dict = None, preprocess=False, limit: Optional[int] = None
+) -> Iterator[list]:
+    """
+    Perform a sparql query and return an iterator over the result rows (converted to pyerk objects). The rows are
+    evaluated lazily, i.e. the full result table is never created and stopping the iteration stops the evaluation.
+
+    :param qsrc:            sparql query
+    :param init_bindings:   see `perform_sparql_query`
+    :param preprocess:      see `perform_sparql_query`
+    :param limit:           optional maximum number of rows
+    """
+
+    qsrc, init_bindings = _prepare_query_arguments(qsrc, init_bindings, preprocess)
+    prepared_query = get_prepared_query(qsrc)
+    if pyerk.settings.USE_NATIVE_QUERY_ENGINE:
+        native_result = queryengine.evaluate_prepared_query(prepared_query, init_bindings, get_graph=get_rdfgraph)
+        if native_result is not None:
+            return islice(native_result[1], limit)
+
+    res = get_rdfgraph().query(prepared_query, initBindings=init_bindings)
+    return iter_converted_rows(res, limit=limit)
+
+
+def iter_converted_rows(res: Result, limit: Optional[int] = None) -> Iterator[list]:
+    """
+    Lazily convert the rows of an rdflib result to lists of pyerk objects.
+
+    :param res:     rdflib result
+    :param limit:   optional maximum number of rows
+    """
+
+    if limit is not None and limit <= 0:
+        return
+
+    # the same entities typically occur in many rows
+    uri_cache = {}
+    for i, row in enumerate(res, start=1):
+        yield [convert_from_rdf_to_pyerk(cell, uri_cache) for cell in row]
+        if i == limit:
+            return
+
+
+def _copy_result(res: Sparql_results_type, return_raw: bool) -> Sparql_results_type:
+    """
+    Return a copy of a (cached) query result such that callers cannot modify the cache.
+    """
+    if return_raw:
+        res2 = Result(res.type)
         res2.vars = res.vars
+        if res.type == "SELECT":
+            # the bindings themselves are immutable (FrozenBindings)
+            res2.bindings = list(res.bindings)
+        elif res.type == "ASK":
+            res2.askAnswer = res.askAnswer
+        else:
+            res2.graph = Graph()
+            res2.graph.addN((*triple, res2.graph) for triple in res.graph)
         return res2
+    res2 = aux.ListWithAttributes(list(row) for row in res)
+    res2.vars = res.vars
+    return res2
 
 
-def convert_from_rdf_to_pyerk(rdfnode) -> object:
+def convert_from_rdf_to_pyerk(rdfnode, uri_cache: Optional[dict] = None) -> object:
+    """
+    :param rdfnode:     URIRef, Literal or None
+    :param uri_cache:   optional dict like {uri: entity, ...} which is used and updated to resolve uris
+    """
     if isinstance(rdfnode, URIRef):
         uri = rdfnode.toPython()
-        entity_object = pyerk.ds.get_entity_by_uri(uri)
+        if uri_cache is None:
+            entity_object = pyerk.ds.get_entity_by_uri(uri)
+        else:
+            entity_object = uri_cache.get(uri)
+            if entity_object is None:
+                entity_object = uri_cache[uri] = pyerk.ds.get_entity_by_uri(uri)
     elif isinstance(rdfnode, Literal):
         entity_object = rdfnode.value
     elif rdfnode is None:
@@ -6,10 +6,13 @@ This module contains code to enable semantic inferences based on special items (
 
 """
 
-from typing import List, Tuple, Optional
+import multiprocessing
+import os
+from typing import Dict, List, Tuple, Optional
 
 import networkx as nx
 from networkx.algorithms import isomorphism as nxiso
+from rdflib import Literal, Variable
 # noinspection PyUnresolvedReferences
 from addict import Addict as Container
 
@@ -17,17 +20,139 @@ from addict import Addict as Container
 from ipydex import IPS
 
 from . import core
+from . import settings
+from . import queryengine
 from . import builtin_entities as bi
 from . import builtin_entities as b
 
 
-def apply_all_semantic_rules(mod_context_uri=None):
+def apply_all_semantic_rules(
+    mod_context_uri=None, fixpoint: bool = False, max_rounds: Optional[int] = None, processes: Optional[int] = 1
+) -> List[core.RelationEdge]:
+    """
+    Apply all semantic rules and return the list of new relation edges.
+
+    :param mod_context_uri: uri of the module in which the new relation edges are created
+    :param fixpoint:        if True, the rules are applied repeatedly until no new relation edges are created. Every
+                            round after the first only considers matches which involve at least one node pair whose
+                            edge changed in the previous round (semi-naive evaluation). In this mode the graph
+                            contains all item-valued edges (see `create_simple_graph`) and assertions which already
+                            exist are not created again.
+    :param max_rounds:      optional maximum number of rounds (only relevant in fixpoint mode)
+    :param processes:       number of worker processes for the matching phase (see `match_rules_in_parallel`);
+                            default: 1 -> no parallelization; None -> number of cpus. In parallel mode all rules of a
+                            round are matched against the state at the beginning of the round, i.e. the consequences
+                            of the edges which are created in this round are found in the next round. Thus parallel
+                            mode requires `fixpoint=True` (otherwise the result would depend on `processes`).
+    """
+
+    if processes != 1 and not fixpoint:
+        msg = f"parallel rule application (processes={processes}) requires fixpoint=True"
+        raise ValueError(msg)
+
     rule_instances = get_all_rules()
     new_rledg_list = []
-    for rule in rule_instances:
-        ra = RuleApplicator(rule, mod_context_uri=mod_context_uri)
-        res = ra.apply()
-        new_rledg_list.extend(res)
+
+    # the graph is created only once; every RuleApplicator updates it with the relation edges it creates
+    G = create_simple_graph(all_edges=fixpoint)
+    applicators = [
+        RuleApplicator(rule, mod_context_uri=mod_context_uri, G=G, skip_existing_assertions=fixpoint)
+        for rule in rule_instances
+    ]
+
+    # None means: consider all matches
+    changed_node_pairs = None
+    n_rounds = 0
+    while True:
+        new_changed_node_pairs = set()
+        uri_result_maps = match_rules_in_parallel(applicators, changed_node_pairs, processes=processes)
+        for i, ra in enumerate(applicators):
+            uri_result_map = None
+            if uri_result_maps is not None:
+                uri_result_map = uri_result_maps[i]
+                if new_changed_node_pairs:
+                    # drop the matches which were invalidated by the edges of the previous rules of this round
+                    uri_result_map = [d for d in uri_result_map if is_induced_match(G, ra.P, d)]
+
+            res = ra.apply(changed_node_pairs=changed_node_pairs, uri_result_map=uri_result_map)
+            new_rledg_list.extend(res)
+            new_changed_node_pairs.update(ra.changed_node_pairs)
+
+        n_rounds += 1
+        if not fixpoint or not new_changed_node_pairs:
+            break
+        if max_rounds is not None and n_rounds >= max_rounds:
+            break
+        changed_node_pairs = new_changed_node_pairs
+
+    return new_rledg_list
+
+
+# state of the main process which is inherited by the (forked) worker processes (see `match_rules_in_parallel`)
+_parallel_state = None
+
+
+def _match_rule_in_worker(args) -> List[Dict[int, str]]:
+    """
+    Match the premises of one rule in a worker process (see `match_rules_in_parallel`).
+    """
+
+    idx, anchor_uris = args
+    applicators, changed_node_pairs = _parallel_state
+    return applicators[idx].match_subgraph_P_uris(changed_node_pairs, anchor_uris=anchor_uris)
+
+
+def match_rules_in_parallel(
+    applicators: List["RuleApplicator"], changed_node_pairs: Optional[set] = None, processes: Optional[int] = None
+) -> Optional[List[List[Dict[int, str]]]]:
+    """
+    Perform the matching phase of several rules in worker processes (based on a fork of the current process, i.e.
+    the workers share the current state of the DataStore and the graph). If there are more processes than rules, the
+    candidate nodes of the anchor node of each rule (see `RuleApplicator.get_anchor_candidates`) are partitioned
+    between several workers. The results are merged in a deterministic order.
+
+    :param applicators:         list of RuleApplicator instances
+    :param changed_node_pairs:  passed to `RuleApplicator.match_subgraph_P_uris`
+    :param processes:           number of worker processes; default: None -> number of cpus
+
+    :return:                    None (if parallelization would not pay off or is not possible) or list which contains
+                                the results of `match_subgraph_P_uris` for every applicator
+    """
+
+    global _parallel_state
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes < 2 or not applicators or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+
+    n_parts = max(1, processes // len(applicators))
+    tasks = []
+    for idx, ra in enumerate(applicators):
+        if n_parts == 1:
+            tasks.append((idx, None))
+            continue
+        candidates = ra.get_anchor_candidates(changed_node_pairs)
+        chunk_size = max(1, -(-len(candidates) // n_parts))
+        for start in range(0, len(candidates), chunk_size):
+            tasks.append((idx, set(candidates[start : start + chunk_size])))
+
+    if len(tasks) < 2:
+        return None
+
+    _parallel_state = (applicators, changed_node_pairs)
+    try:
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(processes=min(processes, len(tasks))) as pool:
+            results = pool.map(_match_rule_in_worker, tasks)
+    finally:
+        _parallel_state = None
+
+    res = [[] for _ in applicators]
+    for (idx, _), uri_result_map in zip(tasks, results):
+        res[idx].extend(uri_result_map)
+    return res
 
 
 def get_all_rules():
@@ -49,7 +174,7 @@ def filter_relevant_rledgs(re_list: List[core.RelationEdge]) -> List[core.Relati
 
     res = []
     for rledg in re_list:
-        assert isinstance(rledg, core.RelationEdge)
+        assert isinstance(rledg, (core.RelationEdge, core.DualRelationEdge))
         if isinstance(rledg.subject, core.RelationEdge) and rledg.subject.role == core.RelationRole.SUBJECT:
             res.append(rledg.subject)
     return res
@@ -59,10 +184,35 @@ class RuleApplicator:
     """
     Class to handle the application of a single semantic rule.
     """
-    def __init__(self, rule: core.Entity, mod_context_uri: Optional[str] = None):
+    def __init__(
+        self,
+        rule: core.Entity,
+        mod_context_uri: Optional[str] = None,
+        G: Optional[nx.DiGraph] = None,
+        matcher: Optional[str] = None,
+        skip_existing_assertions: bool = False,
+    ):
+        """
+        :param rule:            instance of I41["semantic rule"]
+        :param mod_context_uri: uri of the module in which the new relation edges are created
+        :param G:               optional graph (created by `create_simple_graph`) which is shared between several
+                                RuleApplicators; it is updated by `apply`
+        :param matcher:         key of `SUBGRAPH_MATCHERS` ("join" or "vf2"); default: settings.RULEENGINE_MATCHER
+        :param skip_existing_assertions:
+                                if True, assertions which already exist in the DataStore are not created again
+                                (necessary for fixpoint iteration, see `apply_all_semantic_rules`)
+        """
         self.rule = rule
         self.mod_context_uri = mod_context_uri
 
+        if matcher is None:
+            matcher = settings.RULEENGINE_MATCHER
+        if matcher not in SUBGRAPH_MATCHERS:
+            msg = f"unknown subgraph matcher: {matcher} (expected one of {list(SUBGRAPH_MATCHERS)})"
+            raise ValueError(msg)
+        self.matcher = matcher
+        self.skip_existing_assertions = skip_existing_assertions
+
         self.vars = rule.scp__context.get_inv_relations("R20__has_defining_scope", return_subj=True)
         self.premises_rledgs = filter_relevant_rledgs(rule.scp__premises.get_inv_relations("R20"))
         self.assertions_rledgs = filter_relevant_rledgs(rule.scp__assertions.get_inv_relations("R20"))
@@ -70,24 +220,47 @@ class RuleApplicator:
         # a: {rule_sope_uri1: P_node_index1, ...}, b: {P_node_index1: rule_sope_uri1, ...}
         self.local_nodes = core.aux.OneToOneMapping()
 
-        self.G: nx.DiGraph = create_simple_graph()
+        if G is None:
+            G = create_simple_graph()
+        self.G: nx.DiGraph = G
 
         self.P: nx.DiGraph = self.create_prototype_subgraph_from_rule()
 
-    def apply(self) -> List[core.RelationEdge]:
+        # set of node pairs (uri1, uri2) of self.G whose edge was changed by the last call of `apply`
+        self.changed_node_pairs = set()
+
+    def apply(
+        self, changed_node_pairs: Optional[set] = None, uri_result_map: Optional[List[dict]] = None
+    ) -> List[core.RelationEdge]:
+        """
+        Apply the rule and return the list of new relation edges.
+
+        :param changed_node_pairs:  optional set of node pairs (uri1, uri2); if given, only those matches are
+                                    considered which contain both nodes of at least one of these pairs
+        :param uri_result_map:      optional result of `match_subgraph_P_uris` which was computed before (e.g. in a
+                                    worker process, see `apply_all_semantic_rules`)
+        """
 
         if self.mod_context_uri is None:
             assert core.get_active_mod_uri(strict=True)
-            res = self._apply()
+            res = self._apply(changed_node_pairs, uri_result_map)
         else:
             core.aux.ensure_valid_baseuri(self.mod_context_uri)
             with core.uri_context(self.mod_context_uri):
-                res = self._apply()
+                res = self._apply(changed_node_pairs, uri_result_map)
+
+        # keep the (possibly shared) graph consistent with the DataStore
+        self.changed_node_pairs = update_simple_graph(self.G, res)
         return res
 
-    def _apply(self) -> List[core.RelationEdge]:
+    def _apply(
+        self, changed_node_pairs: Optional[set] = None, uri_result_map: Optional[List[dict]] = None
+    ) -> List[core.RelationEdge]:
 
-        result_map = self.match_subgraph_P()
+        if uri_result_map is None:
+            result_map = self.match_subgraph_P(changed_node_pairs)
+        else:
+            result_map = self.introduce_entities(uri_result_map)
 
         asserted_relation_templates = self.get_asserted_relation_templates()
 
@@ -110,6 +283,10 @@ class RuleApplicator:
                 assert isinstance(rel, core.Relation)
                 assert isinstance(new_subj, core.Entity)
 
+                if self.skip_existing_assertions and core.ds.has_relation_edge(new_subj.uri, rel.uri, new_obj):
+                    # the assertion is already known (e.g. from an earlier application of this rule)
+                    continue
+
                 # TODO: add qualifiers
                 new_rledg = new_subj.set_relation(rel, new_obj)
                 new_rledg_list.append(new_rledg)
@@ -129,17 +306,49 @@ class RuleApplicator:
 
         return res
 
-    def match_subgraph_P(self) -> List[dict]:
+    def match_subgraph_P(
+        self, changed_node_pairs: Optional[set] = None, anchor_uris: Optional[set] = None
+    ) -> List[dict]:
+        """
+        :param changed_node_pairs:  see `match_subgraph_P_uris`
+        :param anchor_uris:         see `match_subgraph_P_uris`
+        """
+
+        return self.introduce_entities(self.match_subgraph_P_uris(changed_node_pairs, anchor_uris=anchor_uris))
+
+    def match_subgraph_P_uris(
+        self, changed_node_pairs: Optional[set] = None, anchor_uris: Optional[set] = None
+    ) -> List[Dict[int, str]]:
+        """
+        :param changed_node_pairs:  optional set of node pairs (uri1, uri2); if given, only those matches are
+                                    returned which contain both nodes of at least one of these pairs
+        :param anchor_uris:         optional set of uris; if given, only those matches are returned which map the
+                                    anchor node (see `get_anchor_node`) to one of these uris
+
+        :return:                    list of dicts like {P_node_index1: uri1, ...}
+        """
         assert self.P is not None
-        GM = nxiso.DiGraphMatcher(self.G, self.P, node_match=None, edge_match=edge_matcher)
-        res = list(GM.subgraph_isomorphisms_iter())
+        G = self.get_match_graph(changed_node_pairs)
+
+        P = self.P
+        if anchor_uris is not None:
+            P = self.P.copy()
+            P.nodes[self.get_anchor_node()]["allowed_uris"] = anchor_uris
+
+        res = SUBGRAPH_MATCHERS[self.matcher](G, P)
+
+        if changed_node_pairs is not None:
+            res = [d for d in res if any((n1, n2) in changed_node_pairs for n1 in d.values() for n2 in d.values())]
+
+        return res
 
-        # invert the dicts (todo: find out why switching G and P does not work)
-        # and introduce items for uris
+    @staticmethod
+    def introduce_entities(uri_result_map: List[Dict[int, str]]) -> List[dict]:
 
+        # introduce items for uris
         new_res = []
-        for d in res:
-            new_res.append(dict((v, core.ds.get_entity_by_uri(k)) for k, v in d.items()))
+        for d in uri_result_map:
+            new_res.append(dict((k, core.ds.get_entity_by_uri(v)) for k, v in d.items()))
 
         # new_res is a list of dicts like
         # [{
@@ -150,6 +359,50 @@ class RuleApplicator:
 
         return new_res
 
+    def get_match_graph(self, changed_node_pairs: Optional[set] = None) -> nx.DiGraph:
+        """
+        Return self.G or (if changed_node_pairs is given) the subgraph of the relevant neighborhood
+        """
+
+        if changed_node_pairs is None:
+            return self.G
+        return self.G.subgraph(self.get_neighborhood_nodes(changed_node_pairs))
+
+    def get_anchor_node(self) -> int:
+        """
+        Return the node of P with the highest degree (this serves to partition the matching, see
+        `match_rules_in_parallel`)
+        """
+
+        return max(self.P.nodes, key=lambda node: (self.P.degree(node), -node))
+
+    def get_anchor_candidates(self, changed_node_pairs: Optional[set] = None) -> List[str]:
+        """
+        Return the sorted list of uris which satisfy the type constraint of the anchor node.
+        """
+
+        allowed_uris = get_type_constraint_uris(self.P.nodes[self.get_anchor_node()]["itm"])
+        G = self.get_match_graph(changed_node_pairs)
+        return sorted(uri for uri in G.nodes if allowed_uris is None or uri in allowed_uris)
+
+    def get_neighborhood_nodes(self, node_pairs: set) -> set:
+        """
+        Return the nodes of self.G which might be part of a match that contains both nodes of one of the pairs.
+
+        Because P is (weakly) connected, all nodes of such a match have an (undirected) distance to the first node of
+        the pair which is not greater than the diameter of P.
+        """
+
+        radius = nx.diameter(self.P.to_undirected(as_view=True))
+        U = self.G.to_undirected(as_view=True)
+
+        res = set()
+        for uri1, uri2 in node_pairs:
+            if uri1 not in U or uri2 not in U or uri1 in res:
+                continue
+            res.update(nx.single_source_shortest_path_length(U, uri1, cutoff=radius))
+        return res
+
     def create_prototype_subgraph_from_rule(self) -> nx.DiGraph:
 
         P = nx.DiGraph()
@@ -198,6 +451,218 @@ class RuleApplicator:
         return P
 
 
+def match_subgraph_vf2(G: nx.DiGraph, P: nx.DiGraph) -> List[Dict[int, str]]:
+    """
+    Find all (induced) subgraphs of G which are isomorphic to P with the VF2 algorithm of networkx. This serves as
+    reference implementation for `match_subgraph_join`.
+
+    :return:    list of dicts like {P_node_index1: uri1, ...}
+    """
+
+    GM = nxiso.DiGraphMatcher(G, P, node_match=node_matcher, edge_match=edge_matcher)
+
+    # invert the dicts (todo: find out why switching G and P does not work)
+    return [dict((v, k) for k, v in d.items()) for d in GM.subgraph_isomorphisms_iter()]
+
+
+def match_subgraph_join(G: nx.DiGraph, P: nx.DiGraph) -> List[Dict[int, str]]:
+    """
+    Find all (induced) subgraphs of G which are isomorphic to P (same results as `match_subgraph_vf2`).
+
+    Every edge of P is treated as triple pattern. The patterns are joined via the indexes of the DataStore (see
+    `queryengine.match_pattern`), starting with the pattern of the rarest relation and then always continuing with the
+    pattern with the smallest estimated number of matches (see `queryengine.estimate_cost`). Every new binding is
+    immediately checked against the type constraint of the node (see `get_type_constraint_uris`) and against G (node
+    membership, injectivity and the edges to all previously bound nodes).
+
+    :return:    list of dicts like {P_node_index1: uri1, ...}
+    """
+
+    node_vars = {node: Variable(f"n{node}") for node in P.nodes}
+    var_nodes = {var: node for node, var in node_vars.items()}
+    allowed_uris = {node: get_node_constraint_uris(data) for node, data in P.nodes(data=True)}
+    patterns = [
+        queryengine.TriplePattern(node_vars[n1], data["rel_uri"], node_vars[n2]) for n1, n2, data in P.edges(data=True)
+    ]
+
+    def _check_new_binding(bindings: dict, var, uri) -> bool:
+        if isinstance(uri, Literal) or uri not in G:
+            return False
+        node = var_nodes[var]
+        if allowed_uris[node] is not None and uri not in allowed_uris[node]:
+            return False
+        for other_var, other_uri in bindings.items():
+            if other_var == var:
+                continue
+            if other_uri == uri:
+                # the mapping must be injective
+                return False
+            other_node = var_nodes[other_var]
+            if not _edges_match(G, P, uri, other_uri, node, other_node):
+                return False
+            if not _edges_match(G, P, other_uri, uri, other_node, node):
+                return False
+        return _edges_match(G, P, uri, uri, node, node)
+
+    res = []
+
+    def _extend(remaining_patterns: list, bindings: dict):
+        if not remaining_patterns:
+            res.append({var_nodes[var]: uri for var, uri in bindings.items()})
+            return
+
+        costs = [queryengine.estimate_cost(pattern, bindings) for pattern in remaining_patterns]
+        idx = costs.index(min(costs))
+        pattern = remaining_patterns[idx]
+        new_remaining_patterns = remaining_patterns[:idx] + remaining_patterns[idx + 1 :]
+
+        for new_bindings in queryengine.match_pattern(pattern, bindings):
+            new_vars = [var for var in pattern.variables if var not in bindings]
+            if all(_check_new_binding(new_bindings, var, new_bindings[var]) for var in new_vars):
+                _extend(new_remaining_patterns, new_bindings)
+
+    if not patterns:
+        # P consists of one isolated node
+        for node, var in node_vars.items():
+            for uri in G.nodes:
+                if _check_new_binding({var: uri}, var, uri):
+                    res.append({node: uri})
+        return res
+
+    _extend(patterns, {})
+    return res
+
+
+SUBGRAPH_MATCHERS = {
+    "join": match_subgraph_join,
+    "vf2": match_subgraph_vf2,
+}
+
+
+def _edges_match(G: nx.DiGraph, P: nx.DiGraph, uri1: str, uri2: str, node1: int, node2: int) -> bool:
+    # induced subgraph: G has an edge iff P has an edge (with the same relation)
+    if not G.has_edge(uri1, uri2):
+        return not P.has_edge(node1, node2)
+    return P.has_edge(node1, node2) and G.edges[uri1, uri2]["rel_uri"] == P.edges[node1, node2]["rel_uri"]
+
+
+def is_induced_match(G: nx.DiGraph, P: nx.DiGraph, uri_match: Dict[int, str]) -> bool:
+    """
+    Check whether a match (dict like {P_node_index1: uri1, ...}) is (still) valid w.r.t. the edges of G.
+    """
+
+    if any(uri not in G for uri in uri_match.values()):
+        return False
+    return all(
+        _edges_match(G, P, uri1, uri2, node1, node2)
+        for node1, uri1 in uri_match.items()
+        for node2, uri2 in uri_match.items()
+    )
+
+
+def node_matcher(n1d: dict, n2d: dict) -> bool:
+    """
+
+    :param n1d:     attribute data of node from "main graph" (see `create_simple_graph`)
+    :param n2d:     attribute data of node from "prototype graph" (see
+                    `RuleApplicator.create_prototype_subgraph_from_rule`)
+
+    :return:        boolean matching result
+
+    A node should match if it satisfies the type constraint of the rule variable (see `get_type_constraint_uris`)
+    and the optional node attribute "allowed_uris"
+    """
+
+    uri = n1d["itm"].uri
+    type_constraint_uris = get_type_constraint_uris(n2d["itm"])
+    if type_constraint_uris is not None and uri not in type_constraint_uris:
+        return False
+
+    # optional additional constraint (see `RuleApplicator.match_subgraph_P_uris`)
+    allowed_uris = n2d.get("allowed_uris")
+    return allowed_uris is None or uri in allowed_uris
+
+
+def get_node_constraint_uris(node_data: dict) -> Optional[set]:
+    """
+    Return the set of uris which are allowed for a node of the prototype graph or None (if there is no constraint).
+    This combines the type constraint and the optional node attribute "allowed_uris" (see
+    `RuleApplicator.match_subgraph_P_uris`).
+    """
+
+    res = get_type_constraint_uris(node_data["itm"])
+    allowed_uris = node_data.get("allowed_uris")
+    if allowed_uris is not None:
+        res = allowed_uris if res is None else res & allowed_uris
+    return res
+
+
+def get_type_constraint_uris(c: Container) -> Optional[set]:
+    """
+    Return the set of uris which are allowed for a rule variable or None (if there is no constraint).
+
+    :param c:       Container with the values of R3 and R4 of the rule variable (see
+                    `RuleApplicator.create_prototype_subgraph_from_rule`)
+    """
+
+    res = None
+    if c.R4 is not None:
+        res = get_instance_uris(c.R4.uri)
+    if c.R3 is not None:
+        subclass_uris = get_subclass_uris(c.R3.uri)
+        res = subclass_uris if res is None else res & subclass_uris
+    return res
+
+
+def _get_instance_index() -> dict:
+    ds = core.ds
+    if ds.instance_index_generation != ds.generation:
+        ds.instance_index.clear()
+        ds.instance_index_generation = ds.generation
+    return ds.instance_index
+
+
+def _get_inv_relation_subject_uris(obj_uri: str, rel_uri: str) -> List[str]:
+    rledgs = core.ds.inv_primal_relation_edges.get(obj_uri, {}).get(rel_uri, ())
+    return [rledg.relation_tuple[0].uri for rledg in rledgs]
+
+
+def get_subclass_uris(class_uri: str) -> set:
+    """
+    Return the uris of all (transitive) subclasses (R3) of a class (not including the class itself).
+    """
+
+    index = _get_instance_index()
+    key = (bi.R3.uri, class_uri)
+    res = index.get(key)
+    if res is None:
+        res = set()
+        stack = [class_uri]
+        while stack:
+            for subclass_uri in _get_inv_relation_subject_uris(stack.pop(), bi.R3.uri):
+                if subclass_uri not in res:
+                    res.add(subclass_uri)
+                    stack.append(subclass_uri)
+        index[key] = res
+    return res
+
+
+def get_instance_uris(class_uri: str) -> set:
+    """
+    Return the uris of all instances (R4) of a class and of all its (transitive) subclasses (R3).
+    """
+
+    index = _get_instance_index()
+    key = (bi.R4.uri, class_uri)
+    res = index.get(key)
+    if res is None:
+        res = set()
+        for uri in [class_uri, *get_subclass_uris(class_uri)]:
+            res.update(_get_inv_relation_subject_uris(uri, bi.R4.uri))
+        index[key] = res
+    return res
+
+
 def edge_matcher(e1d: dict, e2d: dict) -> bool:
     """
 
@@ -218,20 +683,24 @@ def edge_matcher(e1d: dict, e2d: dict) -> bool:
     return True
 
 
-def create_simple_graph() -> nx.DiGraph:
+def create_simple_graph(all_edges: bool = False) -> nx.DiGraph:
     """
     Create graph without regarding qualifiers. Nodes: uris
 
+    :param all_edges:   if False (default), only the first item-valued edge of every (subject, relation) is
+                        considered, otherwise all item-valued edges (see `get_node_relations`); the value is stored
+                        in `G.graph` and also used by `update_simple_graph`
+
     :return:
     """
-    G = nx.DiGraph()
+    G = nx.DiGraph(all_edges=all_edges)
 
     for item_uri, item in core.ds.items.items():
 
         if is_node_for_simple_graph(item):
             G.add_node(item_uri, itm=item)
 
-    all_rels = get_all_node_relations()
+    all_rels = get_all_node_relations(all_edges=all_edges)
     for uri_tup, rel_cont in all_rels.items():
         uri1, uri2 = uri_tup
         if uri1 in G.nodes and uri2 in G.nodes:
@@ -240,6 +709,101 @@ def create_simple_graph() -> nx.DiGraph:
     return G
 
 
+def update_simple_graph(G: nx.DiGraph, rledg_list: List[core.RelationEdge]) -> set:
+    """
+    Update a graph created by `create_simple_graph` after the relation edges in `rledg_list` have been created
+    (e.g. by applying a semantic rule). Only the nodes and edges of the affected subjects are recomputed, such that
+    the result is the same as of a complete recreation.
+
+    :param G:           graph to update (in place)
+    :param rledg_list:  list of new relation edges
+
+    :return:            set of node pairs (uri1, uri2) whose edge was added, changed or removed
+                        (pairs with removed nodes are omitted) and of pairs (uri, uri) of nodes which were added or
+                        whose type closure (see `get_type_constraint_uris`) changed
+    """
+
+    changed_node_pairs = set()
+
+    subj_uris = {}
+    for rledg in rledg_list:
+        subj = rledg.relation_tuple[0]
+        if isinstance(subj, core.Item):
+            subj_uris[subj.uri] = subj
+
+    for subj_uri, subj in subj_uris.items():
+        if not is_node_for_simple_graph(subj):
+            if subj_uri in G.nodes:
+                # (this also removes all edges of this node)
+                G.remove_node(subj_uri)
+            continue
+
+        if subj_uri not in G.nodes:
+            G.add_node(subj_uri, itm=subj)
+            changed_node_pairs.add((subj_uri, subj_uri))
+
+            # the edges which point to the new node have been omitted so far
+            for src_uri in get_inv_node_relation_subjects(subj_uri):
+                if src_uri in G.nodes and src_uri not in subj_uris:
+                    changed_node_pairs.update(_set_simple_graph_edges(G, src_uri))
+
+        changed_node_pairs.update(_set_simple_graph_edges(G, subj_uri))
+
+    for uri in get_type_changed_uris(rledg_list):
+        if uri in G.nodes:
+            changed_node_pairs.add((uri, uri))
+
+    return changed_node_pairs
+
+
+def get_type_changed_uris(rledg_list: List[core.RelationEdge]) -> set:
+    """
+    Return the uris of all entities whose type closure (see `get_type_constraint_uris`) is affected by the relation
+    edges in `rledg_list`: the subject of an R4 edge and the subject of an R3 edge together with all its subclasses
+    and their instances.
+    """
+
+    res = set()
+    for rledg in rledg_list:
+        subj, pred, _ = rledg.relation_tuple
+        if not isinstance(subj, core.Entity):
+            continue
+        if pred.uri == bi.R4.uri:
+            res.add(subj.uri)
+        elif pred.uri == bi.R3.uri:
+            res.add(subj.uri)
+            res.update(get_subclass_uris(subj.uri))
+            res.update(get_instance_uris(subj.uri))
+    return res
+
+
+def _set_simple_graph_edges(G: nx.DiGraph, entity_uri: str) -> set:
+    """
+    (Re)create the outgoing edges of the node `entity_uri` and return the set of changed node pairs
+    """
+
+    old_edges = {obj_uri: data["rel_uri"] for _, obj_uri, data in G.out_edges(entity_uri, data=True)}
+    G.remove_edges_from(list(G.out_edges(entity_uri)))
+
+    new_edges = {}
+    for obj_uri, rel_cont in get_node_relations(entity_uri, all_edges=G.graph.get("all_edges", False)).items():
+        if obj_uri in G.nodes:
+            G.add_edge(
+                entity_uri,
+                obj_uri,
+                itm1=core.ds.get_entity_by_uri(entity_uri),
+                itm2=core.ds.get_entity_by_uri(obj_uri),
+                **rel_cont,
+            )
+            new_edges[obj_uri] = rel_cont.rel_uri
+
+    return {
+        (entity_uri, obj_uri)
+        for obj_uri in set(old_edges).union(new_edges)
+        if old_edges.get(obj_uri) != new_edges.get(obj_uri)
+    }
+
+
 def is_node_for_simple_graph(item: core.Item) -> bool:
     """
     exclude nodes which are defined inside certain scopes
@@ -280,26 +844,53 @@ def get_simple_properties(item: core.Item) -> dict:
     return res
 
 
-def get_all_node_relations() -> dict:
+def get_all_node_relations(all_edges: bool = False) -> dict:
 
     res = {}
-    for entity_uri, rledg_dict in core.ds.relation_edges.items():
-        entity = core.ds.get_entity_by_uri(entity_uri, strict=False)
-        if not isinstance(entity, core.Item):
-            continue
+    for entity_uri in core.ds.relation_edges.keys():
+        for obj_uri, c in get_node_relations(entity_uri, all_edges=all_edges).items():
+            res[(entity_uri, obj_uri)] = c
+    return res
+
+
+def get_node_relations(entity_uri: str, all_edges: bool = False) -> dict:
+    """
+    Return a dict like {obj_uri: Container(rel_uri=...), ...} of the item-valued relation edges of one item.
+
+    :param entity_uri:  uri of the item
+    :param all_edges:   if False (default), only the first item-valued edge of every relation is considered
+    """
+
+    res = {}
+    entity = core.ds.get_entity_by_uri(entity_uri, strict=False)
+    if not isinstance(entity, core.Item):
+        return res
 
-        for rel_uri, rledg_list in rledg_dict.items():
-            for rledg in rledg_list:
-                assert isinstance(rledg, core.RelationEdge)
-                assert len(rledg.relation_tuple) == 3
-                if rledg.corresponding_entity is not None:
-                    assert rledg.corresponding_literal is None
-                    if not isinstance(rledg.corresponding_entity, core.Item):
-                        # some relation edges point to an relation-type
-                        # (maybe this will change in the future)
-                        continue
-                    c = Container(rel_uri=rel_uri)
-                    res[(entity_uri, rledg.corresponding_entity.uri)] = c
+    for rel_uri, rledg_list in core.ds.relation_edges.get(entity_uri, {}).items():
+        for rledg in rledg_list:
+            assert isinstance(rledg, core.RelationEdge)
+            assert len(rledg.relation_tuple) == 3
+            if rledg.corresponding_entity is not None:
+                assert rledg.corresponding_literal is None
+                if not isinstance(rledg.corresponding_entity, core.Item):
+                    # some relation edges point to an relation-type
+                    # (maybe this will change in the future)
+                    continue
+                c = Container(rel_uri=rel_uri)
+                res[rledg.corresponding_entity.uri] = c
+                if not all_edges:
                     # TODO: support multiple relations in the graph (MultiDiGraph)
                     break
     return res
+
+
+def get_inv_node_relation_subjects(entity_uri: str) -> List[str]:
+    """
+    Return the uris of all subjects of relation edges whose object is the entity `entity_uri`.
+    """
+
+    res = {}
+    for rledg_list in core.ds.inv_primal_relation_edges.get(entity_uri, {}).values():
+        for rledg in rledg_list:
+            res[rledg.relation_tuple[0].uri] = None
+    return list(res)
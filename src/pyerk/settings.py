@@ -27,3 +27,34 @@ URI_SEP = "#"
 # todo: some time in the future pyerk should become indendent from the OCSE
 # for now it is convenient to have the URI stored here
 OCSE_URI = "erk:/ocse/0.2"
+
+# keys of relation edges ("RE<n>"): by default they are counted per module (see core.RelationEdgeKeyAllocator) and do
+# not consume keys of the KeyManager. Note: this changes the keys which the KeyManager provides after the first
+# relation edge (e.g. the keys of items created via `pop_uri_based_key`) compared to older versions of pyerk. If True,
+# the relation edges (and the former inverse edges) consume keys of the KeyManager like before, i.e. the old key
+# sequence is reproduced but the number of entities and relation edges per module is then limited by the size of the
+# KeyManager reservoir. This setting must not be changed while modules are loaded.
+RLEDG_KEYS_FROM_KEYMANAGER = os.environ.get("PYERK_RLEDG_KEYS_FROM_KEYMANAGER", "False").lower() == "true"
+
+# storage engine for the relation edges in `core.ds`: "dict" (nested dicts, default) or "columnar"
+# (integer-interned array-backed triple store, see triplestore.py; its indexes need about half of the memory of the
+# nested dicts, but reading and removing edges is slightly slower)
+DATASTORE_ENGINE = os.environ.get("PYERK_DATASTORE_ENGINE", "dict")
+
+# directory for the compiled-module cache of erkloader (see erkloader.load_mod_from_path); `None` disables the cache
+LOADER_CACHE_DIR = os.environ.get("PYERK_LOADER_CACHE_DIR")
+
+# backend of `ds.rdfgraph`: "memory" (separate in-memory copy of all triples which is synchronized incrementally,
+# default) or "datastore" (rdflib Store which reads directly from the DataStore, see rdfstack.py). Note: the
+# "datastore" backend is read-only, i.e. `ds.rdfgraph.add(...)` etc. raise `auxiliary.ReadOnlyError`.
+RDFGRAPH_BACKEND = os.environ.get("PYERK_RDFGRAPH_BACKEND", "memory")
+
+# maximum number of entries of each query-related cache of `core.ds` (prepared queries, results, preprocessed queries)
+QUERY_CACHE_SIZE = int(os.environ.get("PYERK_QUERY_CACHE_SIZE", 128))
+
+# evaluate simple sparql queries (basic graph patterns with filters) natively on the DataStore (see queryengine.py)
+USE_NATIVE_QUERY_ENGINE = os.environ.get("PYERK_USE_NATIVE_QUERY_ENGINE", "True").lower() == "true"
+
+# algorithm to match the premises of semantic rules (see ruleengine.SUBGRAPH_MATCHERS): "join" (join of the premise
+# relations based on the indexes of the DataStore) or "vf2" (generic subgraph isomorphism search of networkx)
+RULEENGINE_MATCHER = os.environ.get("PYERK_RULEENGINE_MATCHER", "join")
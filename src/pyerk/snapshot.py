@@ -0,0 +1,399 @@
+"""
+This module allows to save the state of `core.ds` (i.e. the entities and relation edges of all loaded modules) to a
+binary snapshot and to restore it without executing the code of the knowledge modules.
+
+The builtin entities are not part of a snapshot (they are created anyway when pyerk is imported). All other objects are
+pickled. References to objects which are not part of the snapshot (e.g. builtin entities or imported python modules)
+are stored by name and resolved when the snapshot is loaded. Functions which are defined in knowledge modules (e.g.
+methods added via `Entity.add_method`) are stored as marshalled code objects because their modules are not importable
+in the usual way.
+
+Usage:
+
+```
+pyerk.snapshot.save_snapshot("kb.snapshot")
+# in another process:
+pyerk.snapshot.load_snapshot("kb.snapshot")
+```
+
+Known limitations: objects which are defined in knowledge modules and cannot be pickled (e.g. classes, closures or
+generators) are not part of the restored module namespace (see `ModuleData.skipped_names`).
+"""
+
+import builtins
+import hashlib
+import importlib
+import io
+import marshal
+import pickle
+import sys
+import types
+from typing import Dict, List
+
+from . import core
+from . import settings
+from . import auxiliary as aux
+from .release import __version__
+
+# increase this if the structure of the pickled data changes
+SNAPSHOT_FORMAT_VERSION = 1
+
+# these attributes of a module are not restored from the snapshot (they are set explicitly or are not needed)
+SKIPPED_MODULE_ATTRIBUTES = ("__builtins__", "__loader__", "__spec__", "__cached__")
+
+
+class ModuleData:
+    """
+    Container for the data of one module which is not stored in the entities or relation edges themselves
+    """
+
+    def __init__(self, mod_uri: str):
+        self.mod_uri = mod_uri
+        self.modname = core.ds.modnames.get(mod_uri)
+        self.prefix = core.ds.uri_prefix_mapping.a.get(mod_uri)
+        self.modpath = core.ds.mod_path_mapping.a.get(mod_uri)
+        self.keymanager = core.ds.uri_keymanager_dict.get(mod_uri)
+        self.rledg_key_allocator = core.ds.uri_rledg_key_allocator_dict.get(mod_uri)
+        self.n_key_str_inspections = core.ds.key_str_inspection_counter.get(mod_uri, 0)
+
+        self.entities = [core.ds.get_entity_by_uri(uri) for uri in core.ds.entities_created_in_mod.get(mod_uri, [])]
+
+        # python namespace of the module (if it was loaded via erkloader) like {"I1234": <Item I1234>, ...}
+        self.namespace = None
+        self.skipped_names = []
+
+
+def get_builtins_fingerprint() -> str:
+    """
+    Return a hash which changes if the builtin entities change (snapshots refer to builtin entities by their uri).
+    """
+
+    uris = sorted(core.ds.entities_created_in_mod.get(settings.BUILTINS_URI, []))
+    n_rledgs = len(core.ds.rledgs_created_in_mod.get(settings.BUILTINS_URI, {}))
+    txt = f"{__version__};{n_rledgs};{';'.join(uris)}"
+    return hashlib.sha256(txt.encode("utf8")).hexdigest()
+
+
+def _make_function(code_bytes: bytes, modname: str, name: str, qualname: str, defaults, kwdefaults, func_dict):
+    """
+    Recreate a function which was defined in a knowledge module (counterpart of `SnapshotPickler.reducer_override`).
+    """
+
+    code = marshal.loads(code_bytes)
+    func = types.FunctionType(code, sys.modules[modname].__dict__, name, defaults)
+    func.__qualname__ = qualname
+    func.__kwdefaults__ = kwdefaults
+    func.__dict__.update(func_dict)
+    return func
+
+
+class SnapshotPickler(pickle.Pickler):
+    """
+    Pickler which stores references for all objects which do not belong to the modules `mod_uris`.
+    """
+
+    def __init__(self, file, mod_uris: List[str], trial: bool = False):
+        """
+
+        :param file:        file-like object
+        :param mod_uris:    uris of the modules whose entities and relation edges are pickled by value
+        :param trial:       bool; if True all entities and relation edges are pickled by reference (this is used to
+                            cheaply test if an object can be pickled at all)
+        """
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.mod_uris = set(mod_uris)
+        self.trial = trial
+
+        # names of all modules which were loaded by erkloader (their functions are pickled by value)
+        self.knowledge_modnames = set(core.ds.modnames.values())
+        self.knowledge_modules = set(id(mod) for mod in core.ds.uri_mod_dict.values())
+
+        # uris of the (non-builtin) modules whose entities or relation edges are referenced
+        self.referenced_mod_uris = set()
+
+    def _reference(self, kind: str, obj):
+        if obj.base_uri != settings.BUILTINS_URI:
+            self.referenced_mod_uris.add(obj.base_uri)
+        return kind, obj.uri
+
+    def persistent_id(self, obj):
+        if isinstance(obj, core.Entity):
+            if self.trial or obj.base_uri not in self.mod_uris:
+                return self._reference("entity", obj)
+        elif isinstance(obj, core.RelationEdge):
+            if self.trial or obj.base_uri not in self.mod_uris:
+                return self._reference("rledg", obj)
+        elif isinstance(obj, types.ModuleType):
+            if id(obj) in self.knowledge_modules:
+                return "knowledge_module", obj.__name__
+            return "module", obj.__name__
+        elif obj is core.ds:
+            return ("ds",)
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, types.FunctionType):
+            if obj.__module__ not in self.knowledge_modnames and "<locals>" not in obj.__qualname__:
+                # the function can be pickled by reference
+                return NotImplemented
+            if obj.__closure__ is not None:
+                msg = f"Cannot pickle function {obj.__qualname__} because it has a closure."
+                raise pickle.PicklingError(msg)
+            args = (
+                marshal.dumps(obj.__code__),
+                obj.__module__,
+                obj.__name__,
+                obj.__qualname__,
+                obj.__defaults__,
+                obj.__kwdefaults__,
+                obj.__dict__,
+            )
+            return _make_function, args
+        if isinstance(obj, type) and obj.__module__ in self.knowledge_modnames:
+            msg = f"Cannot pickle class {obj.__qualname__} which is defined in a knowledge module."
+            raise pickle.PicklingError(msg)
+        return NotImplemented
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    """
+    Unpickler which resolves the references created by `SnapshotPickler`.
+    """
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        try:
+            if kind == "entity":
+                return core.ds.get_entity_by_uri(pid[1])
+            elif kind == "rledg":
+                return core.ds.relation_edge_uri_map[pid[1]]
+            elif kind == "knowledge_module":
+                return sys.modules[pid[1]]
+            elif kind == "module":
+                return importlib.import_module(pid[1])
+            elif kind == "ds":
+                return core.ds
+        except (KeyError, aux.UnknownURIError, ImportError) as err:
+            msg = f"Could not resolve the reference {pid} (maybe a required module is not loaded)."
+            raise aux.SnapshotError(msg) from err
+        raise aux.SnapshotError(f"Unknown persistent id: {pid}")
+
+
+def _is_picklable(obj, mod_uris: List[str]) -> bool:
+    try:
+        SnapshotPickler(io.BytesIO(), mod_uris, trial=True).dump(obj)
+    except Exception:
+        return False
+    return True
+
+
+def _get_namespace(mod: types.ModuleType, module_data: ModuleData, mod_uris: List[str]) -> Dict[str, object]:
+    namespace = {}
+    for name, value in mod.__dict__.items():
+        if name in SKIPPED_MODULE_ATTRIBUTES:
+            continue
+        if _is_picklable(value, mod_uris):
+            namespace[name] = value
+        else:
+            module_data.skipped_names.append(name)
+    return namespace
+
+
+def dump_modules(mod_uris: List[str]) -> bytes:
+    """
+    Serialize the entities, relation edges and module namespaces of the modules with the given uris.
+
+    Entities and relation edges of other modules are stored by reference. Thus, these modules must be loaded when the
+    data is restored (see `load_modules`).
+
+    :param mod_uris:    list of module uris (in load order)
+    :return:            bytes
+    """
+
+    if settings.BUILTINS_URI in mod_uris:
+        msg = "The builtin entities cannot be part of a snapshot."
+        raise aux.SnapshotError(msg)
+
+    module_data_list = []
+    for mod_uri in mod_uris:
+        module_data = ModuleData(mod_uri)
+        mod = core.ds.uri_mod_dict.get(mod_uri)
+        if mod is not None:
+            module_data.namespace = _get_namespace(mod, module_data, mod_uris)
+        module_data_list.append(module_data)
+
+    # the relation edges are stored in the global order of their creation (this reproduces the order of the indexes)
+    mod_uri_set = set(mod_uris)
+    rledgs = [rledg for rledg in core.ds.relation_edge_uri_map.values() if rledg.base_uri in mod_uri_set]
+    stored_flags = [core.ds.is_stored_relation_edge(rledg) for rledg in rledgs]
+
+    entity_uris = set(entity.uri for module_data in module_data_list for entity in module_data.entities)
+    scope_relation_edges = {
+        uri: list(rledg_list) for uri, rledg_list in core.ds.scope_relation_edges.items() if uri in entity_uris
+    }
+
+    payload = {
+        "module_data_list": module_data_list,
+        "rledgs": rledgs,
+        "stored_flags": stored_flags,
+        "scope_relation_edges": scope_relation_edges,
+    }
+
+    stream = io.BytesIO()
+    pickler = SnapshotPickler(stream, mod_uris)
+    try:
+        pickler.dump(payload)
+    except (pickle.PicklingError, TypeError, AttributeError) as err:
+        msg = f"Could not serialize the modules {mod_uris}: {err}"
+        raise aux.SnapshotError(msg) from err
+
+    header = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        # marshalled code objects are specific to the python version
+        "python_cache_tag": sys.implementation.cache_tag,
+        "builtins_fingerprint": get_builtins_fingerprint(),
+        "mod_uris": list(mod_uris),
+        "modnames": [module_data.modname for module_data in module_data_list],
+        # these modules have to be loaded before the data can be restored
+        "dependencies": sorted(pickler.referenced_mod_uris),
+    }
+
+    return pickle.dumps({"header": header, "payload": stream.getvalue()}, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def get_header(data: bytes) -> dict:
+    """
+    Return the header of data which was created by `dump_modules` (e.g. to find out its dependencies).
+    """
+
+    return pickle.loads(data)["header"]
+
+
+def _check_header(header: dict) -> None:
+    if header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        msg = f"Unsupported snapshot format version: {header.get('format_version')}."
+        raise aux.SnapshotError(msg)
+    if header["python_cache_tag"] != sys.implementation.cache_tag:
+        msg = f"The snapshot was created with an incompatible python version ({header['python_cache_tag']})."
+        raise aux.SnapshotError(msg)
+    if header["builtins_fingerprint"] != get_builtins_fingerprint():
+        msg = "The snapshot was created with different builtin entities (i.e. another version of pyerk)."
+        raise aux.SnapshotError(msg)
+
+    for mod_uri in header["mod_uris"]:
+        if mod_uri in core.ds.entities_created_in_mod or mod_uri in core.ds.uri_mod_dict:
+            msg = f"The module {mod_uri} is already loaded."
+            raise aux.ModuleAlreadyLoadedError(msg)
+    for mod_uri in header["dependencies"]:
+        if not core.ds.entities_created_in_mod.get(mod_uri):
+            msg = f"The snapshot depends on the module {mod_uri} which is not loaded."
+            raise aux.SnapshotError(msg)
+    for modname in header["modnames"]:
+        if modname is not None and modname in sys.modules:
+            msg = f"A module with name {modname} is already present in sys.modules."
+            raise aux.ModuleAlreadyLoadedError(msg)
+
+
+def load_modules(data: bytes) -> List[types.ModuleType]:
+    """
+    Restore the modules which were serialized with `dump_modules`.
+
+    :param data:    bytes
+    :return:        list of the restored python modules (for modules which were loaded by erkloader)
+    """
+
+    container = pickle.loads(data)
+    header = container["header"]
+    _check_header(header)
+
+    # the module objects must exist before unpickling (functions defined in these modules refer to their namespace)
+    new_modnames = [modname for modname in header["modnames"] if modname is not None]
+    for modname in new_modnames:
+        sys.modules[modname] = types.ModuleType(modname)
+
+    try:
+        payload = SnapshotUnpickler(io.BytesIO(container["payload"])).load()
+    except Exception:
+        for modname in new_modnames:
+            sys.modules.pop(modname, None)
+        raise
+
+    ds = core.ds
+    res = []
+    for module_data in payload["module_data_list"]:
+        module_data: ModuleData
+        mod_uri = module_data.mod_uri
+
+        for entity in module_data.entities:
+            if isinstance(entity, core.Relation):
+                ds.relations[entity.uri] = entity
+            else:
+                ds.items[entity.uri] = entity
+            ds.entities_created_in_mod[mod_uri].append(entity.uri)
+
+        if module_data.keymanager is not None:
+            ds.uri_keymanager_dict[mod_uri] = module_data.keymanager
+        if module_data.rledg_key_allocator is not None:
+            ds.uri_rledg_key_allocator_dict[mod_uri] = module_data.rledg_key_allocator
+        if module_data.n_key_str_inspections:
+            ds.key_str_inspection_counter[mod_uri] = module_data.n_key_str_inspections
+        if module_data.modpath is not None:
+            ds.mod_path_mapping.add_pair(key_a=mod_uri, key_b=module_data.modpath)
+        if module_data.prefix is not None:
+            ds.uri_prefix_mapping.add_pair(mod_uri, module_data.prefix)
+        if module_data.modname is not None:
+            ds.modnames[mod_uri] = module_data.modname
+
+        if module_data.namespace is not None:
+            mod = sys.modules[module_data.modname]
+            mod.__dict__.update(module_data.namespace)
+            mod.__builtins__ = builtins.__dict__
+            mod.__fresh_load__ = True
+            ds.uri_mod_dict[mod_uri] = mod
+            res.append(mod)
+
+    for rledg, stored in zip(payload["rledgs"], payload["stored_flags"]):
+        ds.restore_relation_edge(rledg, stored=stored)
+
+    for uri, rledg_list in payload["scope_relation_edges"].items():
+        ds.scope_relation_edges[uri].extend(rledg_list)
+
+    ds.invalidate_key_str_cache()
+    return res
+
+
+def get_loaded_mod_uris() -> List[str]:
+    """
+    Return the uris of all loaded modules (except builtins) in the order of their loading.
+    """
+
+    return [
+        mod_uri
+        for mod_uri, entity_uris in core.ds.entities_created_in_mod.items()
+        if entity_uris and mod_uri != settings.BUILTINS_URI
+    ]
+
+
+def save_snapshot(fpath: str) -> None:
+    """
+    Save the state of all loaded modules to a binary file.
+
+    :param fpath:   path of the snapshot file
+    """
+
+    data = dump_modules(get_loaded_mod_uris())
+    with open(fpath, "wb") as fp:
+        fp.write(data)
+
+
+def load_snapshot(fpath: str) -> List[types.ModuleType]:
+    """
+    Restore the state which was saved by `save_snapshot` (without executing the code of the knowledge modules).
+
+    :param fpath:   path of the snapshot file
+    :return:        list of the restored python modules
+    """
+
+    with open(fpath, "rb") as fp:
+        data = fp.read()
+    return load_modules(data)
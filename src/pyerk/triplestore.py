@@ -0,0 +1,504 @@
+"""
+This module contains an optional storage engine for the relation edges of `core.DataStore`.
+
+Every entity-URI is interned to a dense integer id. Relation edges are stored as rows of array-backed columns
+(subject, predicate, object). Three indexes (SPO, POS, OS) map integer ids to the row numbers. The engine is activated
+via the environment variable `PYERK_DATASTORE_ENGINE=columnar` (evaluated in settings.py) or at runtime via
+`core.ds.set_storage_engine("columnar")`.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Union
+
+# typecode for signed 64-bit integers
+ID_TYPECODE = "q"
+
+
+class URIInterner:
+    """
+    Bidirectional mapping between uris and dense integer ids. Every id is reference-counted; ids which are no longer
+    referenced are released and reused for new uris.
+    """
+
+    def __init__(self):
+        # maps uri-strings to integer ids
+        self.ids = {}
+
+        # maps integer ids to the uri; None for released ids
+        self.terms = []
+
+        # number of references (e.g. rows of a ColumnarTripleStore) per id
+        self.refcounts = array(ID_TYPECODE)
+
+        # released ids which can be reused
+        self.free_ids = array(ID_TYPECODE)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def make_key(term, is_literal: bool):
+        if is_literal:
+            # distinguish e.g. the literal string "erk:/builtins#I1" from the uri and `1` from `True` or `1.0`
+            return "lit", type(term), term
+        return term
+
+    def intern(self, uri: str) -> int:
+        """
+        Return the id of an uri and increase its reference count (see also `release`).
+        """
+        idx = self.ids.get(uri)
+        if idx is None:
+            if self.free_ids:
+                idx = self.free_ids.pop()
+                self.terms[idx] = uri
+                self.refcounts[idx] = 0
+            else:
+                idx = len(self.terms)
+                self.terms.append(uri)
+                self.refcounts.append(0)
+            self.ids[uri] = idx
+        self.refcounts[idx] += 1
+        return idx
+
+    def release(self, idx: int) -> None:
+        """
+        Decrease the reference count of an id. If it drops to zero the uri is forgotten and the id is reused.
+        """
+        refcount = self.refcounts[idx] - 1
+        self.refcounts[idx] = refcount
+        if refcount > 0:
+            return
+        del self.ids[self.terms[idx]]
+        self.terms[idx] = None
+        self.free_ids.append(idx)
+
+    def get_id(self, uri: str) -> Optional[int]:
+        return self.ids.get(uri)
+
+    def get_term(self, idx: int) -> str:
+        return self.terms[idx]
+
+
+# object id of all literals (literals are not interned because they are not indexed individually)
+LITERAL_ID = -1
+
+# maximum number of rows which are stored as tuple in an index entry (larger groups are stored as dict)
+MAX_TUPLE_LEN = 8
+
+
+def _group_rows(group) -> tuple:
+    """
+    Return the row numbers of an index entry (group) in insertion order.
+
+    An index entry is an int (one row), a tuple of up to `MAX_TUPLE_LEN` rows or a dict like {rledg: row, ...}. Most
+    entries contain only one or a few rows, and ints and tuples need much less memory than dicts or arrays. The dict
+    allows to find and remove the row of an edge in O(1) for large groups.
+    """
+    if type(group) is int:
+        return (group,)
+    if type(group) is tuple:
+        return group
+    return tuple(group.values())
+
+
+def _group_add(inner: dict, key: int, row: int, rledg, edges: list) -> None:
+    group = inner.get(key)
+    if group is None:
+        inner[key] = row
+    elif type(group) is int:
+        inner[key] = (group, row)
+    elif type(group) is tuple:
+        if len(group) < MAX_TUPLE_LEN:
+            inner[key] = group + (row,)
+        else:
+            group = {edges[old_row]: old_row for old_row in group}
+            group[rledg] = row
+            inner[key] = group
+    else:
+        group[rledg] = row
+
+
+def _group_remove(inner: dict, key: int, row: int, rledg) -> None:
+    group = inner[key]
+    if type(group) is int:
+        del inner[key]
+    elif type(group) is tuple:
+        rest = tuple(old_row for old_row in group if old_row != row)
+        inner[key] = rest[0] if len(rest) == 1 else rest
+    else:
+        del group[rledg]
+        if len(group) == 0:
+            del inner[key]
+
+
+class ColumnarTripleStore:
+    """
+    Array-backed storage of (primal) relation edges, i.e. edges with `.role == RelationRole.SUBJECT`.
+
+    Every row consists of the ids of subject, predicate and object (see `URIInterner`; literals get `LITERAL_ID`),
+    an insertion counter and a reference to the RelationEdge object. The rows are indexed by subject and predicate
+    (SPO), by predicate and object (POS) and by object (OS, only entities). Inverse edges (role: OBJECT) are created
+    on demand by the caller (see `RelationEdge.dual_relation_edge`).
+    """
+
+    def __init__(self):
+        self.interner = URIInterner()
+
+        # one entry per row (rows of removed edges are reused, see `free_rows`)
+        self.subj = array(ID_TYPECODE)
+        self.pred = array(ID_TYPECODE)
+        self.obj = array(ID_TYPECODE)
+        self.edges: List[Optional[object]] = []
+
+        # insertion counter per row: this allows to reproduce the insertion order despite reused rows
+        self.seq = array(ID_TYPECODE)
+        self.next_seq = 0
+
+        # released row numbers which can be reused
+        self.free_rows = array(ID_TYPECODE)
+
+        # indexes: {subj_id: {pred_id: group}}, {pred_id: {obj_id: group}} and {obj_id: group}
+        # (see `_group_rows` for the possible types of group)
+        self.spo: Dict[int, dict] = {}
+        self.pos: Dict[int, dict] = {}
+        self.os: Dict[int, Union[int, tuple, dict]] = {}
+
+    def __len__(self):
+        return len(self.edges) - len(self.free_rows)
+
+    def _find_row(self, rledg) -> Optional[int]:
+        """
+        Return the row of a stored edge (or None). The edge is looked up in the SPO-index entry of its subject and
+        predicate which usually contains only a few rows.
+        """
+        subj, pred, _ = rledg.relation_tuple
+        ids = self.interner.ids
+        inner = self.spo.get(ids.get(subj.uri))
+        if inner is None:
+            return None
+        group = inner.get(ids.get(pred.uri))
+        if group is None:
+            return None
+        if type(group) is dict:
+            return group.get(rledg)
+        for row in _group_rows(group):
+            if self.edges[row] is rledg:
+                return row
+        return None
+
+    def contains_edge(self, rledg) -> bool:
+        return self._find_row(rledg) is not None
+
+    def add_edge(self, rledg) -> int:
+        """
+        Insert a primal relation edge.
+
+        :param rledg:   RelationEdge instance (role: SUBJECT)
+        :return:        row number
+        """
+
+        subj, pred, obj = rledg.relation_tuple
+        s = self.interner.intern(subj.uri)
+        p = self.interner.intern(pred.uri)
+        if rledg.corresponding_entity is None:
+            o = LITERAL_ID
+        else:
+            o = self.interner.intern(obj.uri)
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.subj[row], self.pred[row], self.obj[row] = s, p, o
+            self.edges[row] = rledg
+            self.seq[row] = self.next_seq
+        else:
+            row = len(self.edges)
+            self.subj.append(s)
+            self.pred.append(p)
+            self.obj.append(o)
+            self.edges.append(rledg)
+            self.seq.append(self.next_seq)
+        self.next_seq += 1
+
+        edges = self.edges
+        inner = self.spo.get(s)
+        if inner is None:
+            inner = self.spo[s] = {}
+        _group_add(inner, p, row, rledg, edges)
+        inner = self.pos.get(p)
+        if inner is None:
+            inner = self.pos[p] = {}
+        _group_add(inner, o, row, rledg, edges)
+        if o != LITERAL_ID:
+            _group_add(self.os, o, row, rledg, edges)
+        return row
+
+    def remove_edge(self, rledg) -> bool:
+        """
+        Remove a primal relation edge (tolerate if it is not present).
+
+        :param rledg:   RelationEdge instance (role: SUBJECT)
+        :return:        bool; whether the edge was present
+        """
+        row = self._find_row(rledg)
+        if row is None:
+            return False
+
+        s, p, o = self.subj[row], self.pred[row], self.obj[row]
+
+        # do not keep empty containers (this makes a global clean-up obsolete)
+        inner = self.spo[s]
+        _group_remove(inner, p, row, rledg)
+        if not inner:
+            del self.spo[s]
+        inner = self.pos[p]
+        _group_remove(inner, o, row, rledg)
+        if not inner:
+            del self.pos[p]
+        interner = self.interner
+        if o != LITERAL_ID:
+            _group_remove(self.os, o, row, rledg)
+            interner.release(o)
+        interner.release(s)
+        interner.release(p)
+
+        self.edges[row] = None
+        self.subj[row] = self.pred[row] = self.obj[row] = -1
+        self.free_rows.append(row)
+        return True
+
+    def count(self, subj_uri: str, rel_uri: str) -> int:
+        s = self.interner.get_id(subj_uri)
+        p = self.interner.get_id(rel_uri)
+        if s is None or p is None:
+            return 0
+        group = self.spo.get(s, {}).get(p)
+        if group is None:
+            return 0
+        return 1 if type(group) is int else len(group)
+
+    def _edges_from_group(self, group) -> list:
+        if group is None:
+            return []
+        if type(group) is dict:
+            return list(group)
+        edges = self.edges
+        return [edges[row] for row in _group_rows(group)]
+
+    def _sorted_rows(self, rows) -> list:
+        # sorting by the insertion counter reproduces the insertion order
+        return sorted(rows, key=self.seq.__getitem__)
+
+    def get_edges(self, subj_uri: str, rel_uri: str) -> list:
+        """
+        :return:    list of primal edges with the given subject and predicate
+        """
+        s = self.interner.get_id(subj_uri)
+        p = self.interner.get_id(rel_uri)
+        if s is None or p is None:
+            return []
+        return self._edges_from_group(self.spo.get(s, {}).get(p))
+
+    def get_inv_edges(self, obj_uri: str, rel_uri: str) -> list:
+        """
+        :return:    list of primal edges with the given object and predicate
+        """
+        o = self.interner.get_id(obj_uri)
+        p = self.interner.get_id(rel_uri)
+        if o is None or p is None:
+            return []
+        return self._edges_from_group(self.pos.get(p, {}).get(o))
+
+    def has_subject(self, subj_uri: str) -> bool:
+        return self.interner.get_id(subj_uri) in self.spo
+
+    def has_object(self, obj_uri: str) -> bool:
+        return self.interner.get_id(obj_uri) in self.os
+
+    def has_predicate(self, rel_uri: str) -> bool:
+        return self.interner.get_id(rel_uri) in self.pos
+
+    def get_edge_dict(self, subj_uri: str) -> Dict[str, list]:
+        """
+        :return:    dict like {rel_uri: [primal_edge, ...], ...}
+        """
+        s = self.interner.get_id(subj_uri)
+        if s is None:
+            return {}
+        get_term = self.interner.get_term
+        return {get_term(p): self._edges_from_group(group) for p, group in self.spo.get(s, {}).items()}
+
+    def get_inv_edge_dict(self, obj_uri: str) -> Dict[str, list]:
+        """
+        :return:    dict like {rel_uri: [primal_edge, ...], ...} (where `obj_uri` is the object)
+        """
+        o = self.interner.get_id(obj_uri)
+        group = self.os.get(o)
+        if group is None:
+            return {}
+
+        res = {}
+        get_term = self.interner.get_term
+        for row in self._sorted_rows(_group_rows(group)):
+            res.setdefault(get_term(self.pred[row]), []).append(self.edges[row])
+        return res
+
+    def get_predicate_edges(self, rel_uri: str) -> list:
+        """
+        :return:    list of all primal edges with the given predicate (in insertion order)
+        """
+        p = self.interner.get_id(rel_uri)
+        if p is None:
+            return []
+        all_rows = []
+        for group in self.pos.get(p, {}).values():
+            all_rows.extend(_group_rows(group))
+        edges = self.edges
+        return [edges[row] for row in self._sorted_rows(all_rows)]
+
+    def subject_uris(self):
+        get_term = self.interner.get_term
+        return (get_term(s) for s in self.spo)
+
+    def object_uris(self):
+        get_term = self.interner.get_term
+        return (get_term(o) for o in self.os)
+
+    def predicate_uris(self):
+        get_term = self.interner.get_term
+        return (get_term(p) for p in self.pos)
+
+    def iter_edges(self):
+        """
+        iterate over all stored primal edges in insertion order
+        """
+        edges = self.edges
+        rows = self._sorted_rows(row for row, rledg in enumerate(edges) if rledg is not None)
+        return (edges[row] for row in rows)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Estimate the memory consumption of the store (sizes of the columns, the interner and the indexes including
+        their entries; the uris and the RelationEdge objects themselves are not included because they are shared
+        with the rest of the DataStore).
+
+        :return:    dict like {"columns": n_bytes, "interner": n_bytes, "indexes": n_bytes, "total": n_bytes}
+        """
+
+        def group_size(group) -> int:
+            # (the int objects of the row numbers are shared by all indexes and counted in "columns")
+            return 0 if type(group) is int else sys.getsizeof(group)
+
+        def index_size(index: dict, nested: bool) -> int:
+            res = sys.getsizeof(index)
+            for value in index.values():
+                if nested:
+                    res += sys.getsizeof(value) + sum(group_size(group) for group in value.values())
+                else:
+                    res += group_size(value)
+            return res
+
+        int_size = sys.getsizeof(2**30)
+        res = {
+            "columns": sum(
+                sys.getsizeof(obj) for obj in (self.subj, self.pred, self.obj, self.seq, self.edges, self.free_rows)
+            )
+            + int_size * len(self),
+            "interner": sum(
+                sys.getsizeof(obj)
+                for obj in (self.interner.ids, self.interner.terms, self.interner.refcounts, self.interner.free_ids)
+            )
+            + int_size * len(self.interner),
+            "indexes": index_size(self.spo, True) + index_size(self.pos, True) + index_size(self.os, False),
+        }
+        res["total"] = sum(res.values())
+        return res
+
+
+class _ReadOnlyIndexView(Mapping):
+    """
+    Read-only dict-like access to one of the indexes of a ColumnarTripleStore. This allows code which accesses
+    e.g. `ds.relation_edges` directly to work independently of the storage engine. Like a defaultdict, unknown keys
+    result in an empty value (but are not inserted).
+
+    The results are computed on demand from the store (i.e. the caller gets new containers which it may modify).
+    """
+
+    def __init__(self, store: ColumnarTripleStore):
+        self.store = store
+
+    def _keys(self):
+        raise NotImplementedError
+
+    def _compute(self, key):
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        return self._compute(key)
+
+    def __iter__(self):
+        return iter(list(self._keys()))
+
+    def __len__(self):
+        return sum(1 for _ in self._keys())
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self._compute(key)
+
+
+class SubjectIndexView(_ReadOnlyIndexView):
+    """
+    replacement for `ds.relation_edges`: {subj_uri: {rel_uri: [primal_edge, ...]}}
+    """
+
+    def _keys(self):
+        return self.store.subject_uris()
+
+    def __len__(self):
+        return len(self.store.spo)
+
+    def __contains__(self, subj_uri):
+        return self.store.has_subject(subj_uri)
+
+    def _compute(self, subj_uri: str) -> Dict[str, list]:
+        return self.store.get_edge_dict(subj_uri)
+
+
+class ObjectIndexView(_ReadOnlyIndexView):
+    """
+    replacement for `ds.inv_primal_relation_edges`: {obj_uri: {rel_uri: [primal_edge, ...]}}
+    """
+
+    def _keys(self):
+        return self.store.object_uris()
+
+    def __len__(self):
+        return len(self.store.os)
+
+    def __contains__(self, obj_uri):
+        return self.store.has_object(obj_uri)
+
+    def _compute(self, obj_uri: str) -> Dict[str, list]:
+        return self.store.get_inv_edge_dict(obj_uri)
+
+
+class PredicateIndexView(_ReadOnlyIndexView):
+    """
+    replacement for `ds.relation_relation_edges`: {rel_uri: [primal_edge, ...]}
+    """
+
+    def _keys(self):
+        return self.store.predicate_uris()
+
+    def __len__(self):
+        return len(self.store.pos)
+
+    def __contains__(self, rel_uri):
+        return self.store.has_predicate(rel_uri)
+
+    def _compute(self, rel_uri: str) -> list:
+        return self.store.get_predicate_edges(rel_uri)
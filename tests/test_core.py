@@ -1,6 +1,13 @@
 import unittest
+from unittest import mock
 import sys
 import os
+import tempfile
+import shutil
+import gc
+import pickle
+import weakref
+from contextlib import contextmanager
 from os.path import join as pjoin
 
 import rdflib
@@ -88,6 +95,50 @@ class HouskeeperMixin:
             # noinspection PyUnresolvedReferences
             print("In method", p.aux.bgreen(self._testMethodName))
 
+    @staticmethod
+    def create_test_item(**kwargs) -> p.Item:
+        """
+        Create an item with a new key in the module of the tests (kwargs like `R1="unit test item"` are passed on).
+        """
+        with p.uri_context(uri=TEST_BASE_URI):
+            return p.create_item(key_str=p.pop_uri_based_key("I"), **kwargs)
+
+    @staticmethod
+    def create_test_relation(**kwargs) -> p.Relation:
+        """
+        Create a relation with a new key in the module of the tests (see `create_test_item`).
+        """
+        with p.uri_context(uri=TEST_BASE_URI):
+            return p.create_relation(key_str=p.pop_uri_based_key("R"), **kwargs)
+
+    @staticmethod
+    @contextmanager
+    def modified_settings(**kwargs):
+        """
+        Temporarily change attributes of `p.settings`, e.g. `with self.modified_settings(RDFGRAPH_BACKEND="memory"):`
+        """
+        original_values = {name: getattr(p.settings, name) for name in kwargs}
+        for name, value in kwargs.items():
+            setattr(p.settings, name, value)
+        try:
+            yield
+        finally:
+            for name, value in original_values.items():
+                setattr(p.settings, name, value)
+
+    @staticmethod
+    @contextmanager
+    def modified_storage_engine(engine: str):
+        """
+        Temporarily use another storage engine of `p.ds` (the context value is `p.ds.triple_store`).
+        """
+        original_engine = p.ds.storage_engine
+        p.ds.set_storage_engine(engine)
+        try:
+            yield p.ds.triple_store
+        finally:
+            p.ds.set_storage_engine(original_engine)
+
 
 class Test_00_Core(HouskeeperMixin, unittest.TestCase):
     def test_a0__ensure_expected_test_data(self):
@@ -173,6 +224,29 @@ class Test_00_Core(HouskeeperMixin, unittest.TestCase):
         self.assertEqual(k, 104)
         self.assertEqual(km.key_reservoir, [103, 101, 100])
 
+    def test_key_manager_lazy(self):
+
+        for n in (1, 2, 5, 100, 1234):
+            perm = p.core.KeyPermutation(n, seed=1750)
+            self.assertEqual(sorted(perm[i] for i in range(n)), list(range(n)))
+
+        km = p.KeyManager(minval=100, maxval=200, keyseed=42, lazy=True)
+        self.assertIsNone(km.key_reservoir)
+        keys = [km.pop() for i in range(100)]
+        self.assertEqual(sorted(keys), list(range(100, 200)))
+        self.assertNotEqual(keys, sorted(keys))
+        with self.assertRaises(IndexError):
+            km.pop()
+
+        # reproducible and resumable
+        km2 = p.KeyManager(minval=100, maxval=200, keyseed=42, lazy=True, position=30)
+        self.assertEqual(km2.pop(), keys[30])
+        self.assertEqual(km2.position, 31)
+
+        # huge key ranges are cheap
+        km3 = p.KeyManager(minval=1000, maxval=10**12, lazy=True)
+        self.assertTrue(1000 <= km3.pop() < 10**12)
+
     def test_uri_attr_of_entities(self):
 
         self.assertEqual(p.I1.uri, f"{p.BUILTINS_URI}#I1")
@@ -307,7 +381,9 @@ class Test_01_Core(HouskeeperMixin, unittest.TestCase):
         # ensure that builtins are loaded
         self.assertGreater(len(p.ds.items), 40)
         self.assertGreater(len(p.ds.relations), 40)
-        self.assertGreater(len(p.ds.relation_edge_uri_map), 300)
+        # (the inverse edges are views which are not registered in `relation_edge_uri_map`)
+        n_inv_rledgs = sum(len(lst) for rel_dict in p.ds.inv_relation_edges.values() for lst in rel_dict.values())
+        self.assertGreater(len(p.ds.relation_edge_uri_map) + n_inv_rledgs, 300)
 
         # ensure that no residuals are left from last test
         non_builtin_rledges = [k for k in p.ds.relation_edge_uri_map.keys() if not k.startswith(p.BUILTINS_URI)]
@@ -387,6 +463,796 @@ class Test_01_Core(HouskeeperMixin, unittest.TestCase):
             pass
 
 
+    def test_c03__columnar_storage_engine(self):
+
+        itm1 = self.create_test_item(R1="unit test item1", R4=p.I1["general item"])
+        itm2 = self.create_test_item(R1="unit test item2", R5__is_part_of=itm1)
+
+        expected_rels = itm1.get_relations()
+        expected_inv_rels = p.I1.get_inv_relations("R4__is_instance_of")
+
+        with self.modified_storage_engine("columnar") as store:
+            self.assertIsInstance(store, p.triplestore.ColumnarTripleStore)
+            self.assertEqual(itm1.get_relations(), expected_rels)
+            self.assertEqual(p.I1.get_inv_relations("R4__is_instance_of"), expected_inv_rels)
+            self.assertEqual(itm2.R5, [itm1])
+            self.assertEqual(itm1.get_inv_relations("R5", return_subj=True), [itm2])
+            self.assertEqual(p.ds.relation_relation_edges[p.R5.uri][-1].relation_tuple, (itm2, p.R5, itm1))
+
+            # the index views return new containers which do not affect the store
+            p.ds.relation_edges[itm1.uri][p.R1.uri].clear()
+            self.assertEqual(len(p.ds.relation_edges[itm1.uri][p.R1.uri]), 1)
+
+            # functional relations are still checked
+            with self.assertRaises(ValueError):
+                with p.uri_context(uri=TEST_BASE_URI):
+                    itm2.set_relation(p.R4["is instance of"], p.I1["general item"])
+                    itm2.set_relation(p.R4["is instance of"], p.I2["Metaclass"])
+
+            p.unload_mod(TEST_BASE_URI, strict=False)
+            self.assertEqual(itm1.get_inv_relations("R5"), [])
+            self.assertNotIn(itm1.uri, p.ds.relation_edges)
+
+        self.assertEqual(p.ds.relation_edges.get(itm1.uri), None)
+        self.assertEqual(p.I12.R1, "mathematical object")
+
+    def test_c03b__columnar_storage_reuse(self):
+
+        def create_and_unload():
+            itm1 = self.create_test_item(R1="unit test item1")
+            rel1 = self.create_test_relation(R1="unit test relation")
+            with p.uri_context(uri=TEST_BASE_URI):
+                for i in range(200):
+                    itm1.set_relation(rel1, f"value {i}")
+            self.unload_all_mods()
+            self.register_this_module()
+
+        with self.modified_storage_engine("columnar") as store:
+            n_terms = len(store.interner)
+            create_and_unload()
+            n_rows = len(store.edges)
+            memory_usage = store.memory_usage()
+
+            for i in range(3):
+                create_and_unload()
+
+            # rows and interned terms of removed edges are reused, i.e. the memory consumption does not grow
+            self.assertEqual(len(store.edges), n_rows)
+            self.assertEqual(len(store.interner), n_terms)
+            self.assertEqual(store.memory_usage(), memory_usage)
+
+            # the insertion order is preserved despite reused rows
+            itm1 = self.create_test_item(R1="unit test item1", R4=p.I1["general item"])
+            self.assertEqual(list(store.iter_edges())[-2:], itm1.get_relations("R1") + itm1.get_relations("R4"))
+            self.assertEqual(p.ds.relation_relation_edges[p.R4.uri][-1], itm1.get_relations("R4")[0])
+            self.assertEqual(len(store.edges), n_rows)
+
+    def test_c04__rledg_key_allocator(self):
+
+        km = p.ds.uri_keymanager_dict[TEST_BASE_URI]
+        n_keys = len(km.key_reservoir)
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1", R4=p.I1["general item"])
+            rel1 = self.create_test_relation(R1="unit test relation")
+
+            # relation edges do not consume keys of the KeyManager
+            self.assertEqual(len(km.key_reservoir), n_keys - 2)
+
+            # more relation edges than the KeyManager could provide keys
+            n_rledgs = len(p.ds.rledgs_created_in_mod[TEST_BASE_URI])
+            for i in range(n_keys + 10):
+                itm1.set_relation(rel1, f"value {i}")
+
+        rledg_dict = p.ds.rledgs_created_in_mod[TEST_BASE_URI]
+        self.assertEqual(len(rledg_dict), n_rledgs + n_keys + 10)
+        self.assertEqual(itm1.get_relations(rel1.uri)[-1].short_key, f"RE{len(rledg_dict)}")
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertNotIn(TEST_BASE_URI, p.ds.uri_rledg_key_allocator_dict)
+
+        # compatibility mode: relation edges consume keys of the KeyManager (old key sequence)
+        self.register_this_module()
+        km = p.ds.uri_keymanager_dict[TEST_BASE_URI]
+        key1, key2, key3, key4, key5 = reversed(km.key_reservoir[-5:])
+        with self.modified_settings(RLEDG_KEYS_FROM_KEYMANAGER=True), p.uri_context(uri=TEST_BASE_URI):
+            itm1 = p.create_item(key_str=p.pop_uri_based_key("I"), R1="unit test item1")
+            rledg = itm1.set_relation(p.R4["is instance of"], p.I1["general item"])
+            # (key4 was used by the stored inverse edge)
+            itm2 = p.create_item(key_str=p.pop_uri_based_key("I"), R1="unit test item2")
+        self.assertEqual(itm1.short_key, f"I{key1}")
+        self.assertEqual(itm1.get_relations("R1")[0].short_key, f"RE{key2}")
+        self.assertEqual(rledg.short_key, f"RE{key3}")
+        self.assertEqual(itm2.short_key, f"I{key5}")
+        self.assertNotIn(TEST_BASE_URI, p.ds.uri_rledg_key_allocator_dict)
+
+    def test_c05__unload_without_empty_containers(self):
+
+        oset = p.aux.OrderedSet([3, 1, 2])
+        oset.add(1)
+        self.assertEqual(list(oset), [3, 1, 2])
+        self.assertEqual((oset[0], oset[1], oset[-1]), (3, 1, 2))
+        oset.discard(1)
+        oset.discard(1)
+        self.assertEqual(list(oset), [3, 2])
+
+        # indexing and slicing behave like for a list
+        lst = list(range(10))
+        oset = p.aux.OrderedSet(lst)
+        for index in (0, 1, 5, -1, -2, -10, slice(2, 5), slice(None, None, -2), slice(-3, None), slice(20, 30)):
+            self.assertEqual(oset[index], lst[index], index)
+        for index in (10, -11):
+            with self.assertRaises(IndexError):
+                oset[index]
+        oset.remove(5)
+        lst.remove(5)
+        self.assertEqual((oset[5], oset[5:]), (lst[5], lst[5:]))
+        oset.add(20)
+        self.assertEqual((oset[-2], oset.index(20)), (9, 9))
+        self.assertEqual(pickle.loads(pickle.dumps(oset))[1:], oset[1:])
+
+        n_inv_R4 = len(p.I2.get_inv_relations("R4"))
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1", R4=p.I2["Metaclass"])
+            itm2 = self.create_test_item(R1="unit test item2", R5__is_part_of=itm1)
+            rel1 = self.create_test_relation(R1="unit test relation")
+            itm2.set_relation(rel1, p.I2)
+
+        self.assertEqual(len(p.I2.get_inv_relations("R4")), n_inv_R4 + 1)
+        self.assertEqual(itm1.get_inv_relations("R5", return_subj=True), [itm2])
+
+        # `ds.inv_relation_edges` provides the inverse edges (the index itself stores the primal edges)
+        inv_rledg = p.ds.inv_relation_edges[itm1.uri][p.R5.uri][0]
+        self.assertEqual(inv_rledg.role, p.RelationRole.OBJECT)
+        self.assertEqual(inv_rledg.corresponding_entity, itm2)
+        self.assertEqual(list(p.ds.inv_primal_relation_edges[itm1.uri][p.R5.uri]), [inv_rledg.dual_relation_edge])
+        # the inverse edge is a cached view which only references the primal edge
+        self.assertIs(inv_rledg.dual_relation_edge.dual_relation_edge, inv_rledg)
+        self.assertIs(p.ds.inv_relation_edges[itm1.uri][p.R5.uri][0], inv_rledg)
+        self.assertFalse(hasattr(inv_rledg, "__dict__"))
+        self.assertEqual(type(inv_rledg).__slots__, ("primal",))
+        self.assertEqual(inv_rledg.subject, itm2)
+        self.assertEqual(p.ds.inv_relation_edges[itm1.uri]["unknown"], [])
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+
+        # unloading removes the edges and does not leave empty containers behind
+        self.assertEqual(len(p.I2.get_inv_relations("R4")), n_inv_R4)
+        self.assertNotIn(rel1.uri, p.ds.inv_relation_edges[p.I2.uri])
+        for uri in (itm1.uri, itm2.uri, rel1.uri):
+            self.assertNotIn(uri, p.ds.relation_edges)
+            self.assertNotIn(uri, p.ds.inv_relation_edges)
+            self.assertNotIn(uri, p.ds.relation_relation_edges)
+
+    def test_c06__hashable_entities(self):
+
+        self.assertEqual(len({p.I1, p.I2, p.I1, p.R1}), 3)
+        self.assertEqual({p.I1: 1}[p.I1], 1)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1", R4=p.I2["Metaclass"])
+            rledg = itm1.set_relation(p.R5["is part of"], p.I2)
+
+        self.assertIn(rledg, {rledg})
+        self.assertEqual({rledg.dual_relation_edge for _ in range(3)}, {rledg.dual_relation_edge})
+
+        self.assertTrue(p.ds.has_relation_edge(itm1.uri, p.R4.uri, p.I2))
+        self.assertFalse(p.ds.has_relation_edge(itm1.uri, p.R4.uri, p.I1))
+        self.assertTrue(p.ds.has_relation_edge(itm1.uri, p.R1.uri, "unit test item1"))
+        self.assertFalse(p.ds.has_relation_edge(itm1.uri, p.R1.uri, "unit test item2"))
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertFalse(p.ds.has_relation_edge(itm1.uri, p.R4.uri, p.I2))
+        self.assertFalse(p.ds.has_relation_edge(itm1.uri, p.R1.uri, "unit test item1"))
+
+    def test_c07__key_str_cache(self):
+
+        res1 = p.process_key_str("R4__is_instance_of")
+        self.assertIs(p.process_key_str("R4__is_instance_of"), res1)
+        self.assertIsNot(p.process_key_str("R4__is_instance_of", check=False), res1)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            self.assertEqual(p.u("I1"), p.I1.uri)
+
+            # an entity of the active module takes precedence over builtin_entities -> cache must be invalidated
+            itm = p.create_item(key_str="I1", R1="unit test item")
+            self.assertEqual(p.u("I1"), itm.uri)
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertEqual(len(p.ds.key_str_cache), 0)
+        with p.uri_context(uri=TEST_BASE_URI):
+            self.assertEqual(p.u("I1"), p.I1.uri)
+
+        # the label check respects changes of the label
+        self.register_this_module()
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm = self.create_test_item(R1="unit test item")
+            key_str = f"{itm.short_key}__unit_test_item"
+            self.assertEqual(p.u(key_str), itm.uri)
+
+            itm.get_relations("R1")[0].unlink()
+            itm.set_relation(p.R1, "renamed item")
+            with self.assertRaises(ValueError):
+                p.u(key_str)
+            self.assertEqual(p.u(f"{itm.short_key}__renamed_item"), itm.uri)
+
+    def test_c08__relation_metadata(self):
+
+        self.assertTrue(p.ds.get_relation_metadata(p.R22.uri).functional)
+        self.assertTrue(p.ds.get_relation_metadata(p.R1.uri).functional_for_each_language)
+        self.assertEqual(len(p.ds.get_relation_metadata(p.R24.uri).range), 1)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1")
+            rel1 = self.create_test_relation(R1="unit test relation")
+            itm1.set_relation(rel1, p.I1)
+            self.assertEqual(itm1.get_relations(rel1.uri, return_obj=True), [p.I1])
+            self.assertEqual(getattr(itm1, rel1.short_key), [p.I1])
+            self.assertFalse(p.ds.get_relation_metadata(rel1.uri).functional)
+
+            # setting R22 later invalidates the cached metadata
+            rel1.set_relation(p.R22["is functional"], True)
+            self.assertTrue(p.ds.get_relation_metadata(rel1.uri).functional)
+            self.assertEqual(getattr(itm1, rel1.short_key), p.I1)
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertNotIn(rel1.uri, p.ds.relation_metadata)
+
+    def test_c09__language_store(self):
+
+        # (other tests might have changed the default language)
+        with self.modified_settings(DEFAULT_DATA_LANGUAGE="en"):
+            self._test_c09__language_store()
+
+    def _test_c09__language_store(self):
+
+        itm = self.create_test_item(
+            R1__has_label=["test-label in english" @ p.en, "test-label auf deutsch" @ p.de],
+            R2__has_description="test-description in english",
+        )
+
+        self.assertEqual(p.ds.get_objects_for_language(itm.uri, p.R1.uri, "de"), ["test-label auf deutsch" @ p.de])
+        self.assertEqual(p.ds.get_objects_for_language(itm.uri, p.R2.uri, "de"), [])
+        self.assertIn((itm.uri, p.R2.uri), p.ds.language_store)
+
+        # raw strings are interpreted as default language
+        self.assertEqual(itm.R2, "test-description in english")
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm.set_relation(p.R2, "test-beschreibung auf deutsch" @ p.de)
+
+        self.assertNotIn((itm.uri, p.R2.uri), p.ds.language_store)
+        self.assertEqual(
+            p.ds.get_objects_for_language(itm.uri, p.R2.uri, "de"), ["test-beschreibung auf deutsch" @ p.de]
+        )
+        self.assertEqual(itm.R2, "test-description in english")
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm.set_relation(p.R2, "another description" @ p.en)
+        with self.assertRaises(ValueError):
+            itm.R2
+
+    def test_c10__key_str_by_inspection(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            instances = []
+            for i in range(3):
+                my_instance = p.instance_of(p.I2["Metaclass"])
+                instances.append(my_instance)
+            other_instance = p.instance_of(p.I2["Metaclass"], r1="explicit label")
+
+        self.assertEqual([itm.R1 for itm in instances], ["my_instance"] * 3)
+        self.assertEqual(other_instance.R1, "explicit label")
+        self.assertEqual(p.ds.key_str_inspection_counter[TEST_BASE_URI], 3)
+
+        # the source line is only read once for this call site
+        self.assertEqual(sum("my_instance" in line for line in p.ds.key_str_inspection_cache.values()), 1)
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertNotIn(TEST_BASE_URI, p.ds.key_str_inspection_counter)
+
+    def test_c11__snapshot(self):
+
+        n_rledgs0 = len(p.ds.relation_edge_uri_map)
+        mod = p.erkloader.load_mod_from_path(pjoin(TEST_DATA_DIR1, "tmod2_snapshot.py"), prefix="tm2")
+        n_items = len(p.ds.items)
+        n_rledgs = len(p.ds.relation_edge_uri_map)
+        self.assertEqual(mod.I1001.double(3), 6)
+        self.assertEqual(mod.I1001.get_relations(mod.R1000.uri, return_obj=True), [mod.I1000])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = pjoin(tmpdir, "test.snapshot")
+            p.snapshot.save_snapshot(fpath)
+            p.unload_mod(mod.__URI__)
+            self.assertNotIn(mod.I1000.uri, p.ds.items)
+
+            mod_list = p.snapshot.load_snapshot(fpath)
+
+            with self.assertRaises(p.aux.ModuleAlreadyLoadedError):
+                p.snapshot.load_snapshot(fpath)
+
+        self.assertEqual(len(mod_list), 1)
+        mod2 = mod_list[0]
+        self.assertIsNot(mod2, mod)
+        self.assertEqual(len(p.ds.items), n_items)
+        self.assertEqual(len(p.ds.relation_edge_uri_map), n_rledgs)
+
+        itm1 = p.ds.get_entity_by_uri(mod.I1001.uri)
+        self.assertIs(itm1, mod2.I1001)
+        self.assertEqual(itm1.double(4), 8)
+        self.assertEqual(itm1.get_relations(mod2.R1000.uri, return_obj=True), [mod2.I1000])
+        self.assertEqual(mod2.I1000.R4, p.I2)
+        self.assertEqual(p.ds.get_entity_by_key_str("tm2__I1000"), mod2.I1000)
+        self.assertEqual(mod2.I1000.get_inv_relations("R4", return_subj=True), [itm1])
+
+        # the keymanager continues where it stopped
+        self.assertEqual(mod2.keymanager.keyseed, mod.keymanager.keyseed)
+        self.assertEqual(len(mod2.keymanager.key_reservoir), len(mod.keymanager.key_reservoir))
+
+        p.unload_mod(mod2.__URI__)
+        self.assertNotIn(itm1.uri, p.ds.items)
+        self.assertEqual(len(p.ds.relation_edge_uri_map), n_rledgs0)
+
+    def test_c12__loader_cache(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            modpath = pjoin(tmpdir, "tmod2_snapshot.py")
+            shutil.copy(pjoin(TEST_DATA_DIR1, "tmod2_snapshot.py"), modpath)
+            cache_dir = pjoin(tmpdir, "cache")
+            with self.modified_settings(LOADER_CACHE_DIR=cache_dir):
+                mod1 = p.erkloader.load_mod_from_path(modpath, prefix="tm2", use_cache=True)
+                self.assertIsNotNone(mod1.__spec__)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                self.assertIn(mod1.__URI__, p.ds.uri_content_hash_dict)
+
+                # unchanged module: restored from the cache (i.e. not executed)
+                mod2 = p.erkloader.load_mod_from_path(modpath, prefix="tm2", use_cache=True)
+                self.assertIsNone(mod2.__spec__)
+                self.assertEqual(mod2.I1001.double(5), 10)
+                self.assertEqual(mod2.I1001.R4, mod2.I1000)
+                self.assertEqual(p.ds.get_entity_by_key_str("tm2__I1001"), mod2.I1001)
+
+                # changed module: executed again
+                with open(modpath, "a") as fp:
+                    fp.write("\n# modification\n")
+                mod3 = p.erkloader.load_mod_from_path(modpath, prefix="tm2", use_cache=True)
+                self.assertIsNotNone(mod3.__spec__)
+                self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            p.unload_mod(mod3.__URI__)
+            self.assertNotIn(mod3.__URI__, p.ds.uri_content_hash_dict)
+
+    def test_c12b__loader_cache_errors(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for fname in ("tmod2_snapshot.py", "tmod3_dependent.py"):
+                shutil.copy(pjoin(TEST_DATA_DIR1, fname), pjoin(tmpdir, fname))
+            modpath2 = pjoin(tmpdir, "tmod2_snapshot.py")
+            modpath3 = pjoin(tmpdir, "tmod3_dependent.py")
+            cache_dir = pjoin(tmpdir, "cache")
+            with self.modified_settings(LOADER_CACHE_DIR=cache_dir):
+                mod1 = p.erkloader.load_mod_from_path(modpath2, prefix="tm2", use_cache=True)
+                (cache_fname,) = os.listdir(cache_dir)
+
+                # corrupt cache file (e.g. due to an interrupted write): the module is executed again
+                with open(pjoin(cache_dir, cache_fname), "wb") as fp:
+                    fp.write(b"garbage")
+                mod2 = p.erkloader.load_mod_from_path(modpath2, prefix="tm2", use_cache=True)
+                self.assertIsNotNone(mod2.__spec__)
+                self.assertEqual(mod2.I1001.double(5), 10)
+
+                # ... and the cache file is valid again
+                mod3 = p.erkloader.load_mod_from_path(modpath2, prefix="tm2", use_cache=True)
+                self.assertIsNone(mod3.__spec__)
+                p.unload_mod(mod3.__URI__)
+
+                # tmod3 loads tmod2 itself
+                p.erkloader.load_mod_from_path(modpath3, prefix="tm3", use_cache=True)
+                with open(modpath2, "a") as fp:
+                    fp.write("\n# modification\n")
+
+                # the cache entry of tmod3 is invalid -> the nested module tmod2 must be executed only once
+                with mock.patch.object(p.erkloader, "_exec_mod", wraps=p.erkloader._exec_mod) as exec_mod:
+                    tmod3 = p.erkloader.load_mod_from_path(modpath3, prefix="tm3", use_cache=True)
+                executed_paths = [call.args[0] for call in exec_mod.call_args_list]
+                self.assertEqual(executed_paths, [modpath3, modpath2])
+                self.assertIsNotNone(tmod3.__spec__)
+
+            p.unload_mod(tmod3.__URI__)
+            p.unload_mod(tmod3.tm2.__URI__)
+
+    def test_c13__incremental_reload(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for fname in ("tmod2_snapshot.py", "tmod3_dependent.py"):
+                shutil.copy(pjoin(TEST_DATA_DIR1, fname), pjoin(tmpdir, fname))
+
+            tmod1 = p.erkloader.load_mod_from_path(pjoin(TEST_DATA_DIR1, "tmod1.py"), prefix="tm1")
+            tmod3 = p.erkloader.load_mod_from_path(pjoin(tmpdir, "tmod3_dependent.py"), prefix="tm3")
+            tmod2 = tmod3.tm2
+
+            self.assertEqual(p.ds.mod_reference_counts[tmod3.__URI__], {tmod2.__URI__: 1})
+            self.assertEqual(p.ds.get_referencing_mod_uris(tmod2.__URI__), [tmod3.__URI__])
+            self.assertEqual(p.ds.uri_parent_mod_dict[tmod2.__URI__], tmod3.__URI__)
+            self.assertEqual(p.erkloader.get_dependent_mod_uris([tmod2.__URI__]), [tmod2.__URI__, tmod3.__URI__])
+            self.assertEqual(p.erkloader.get_modified_mod_uris(), [])
+
+            modpath = pjoin(tmpdir, "tmod2_snapshot.py")
+            with open(modpath) as fp:
+                source = fp.read()
+            with open(modpath, "w") as fp:
+                fp.write(source.replace("test class in tmod2", "modified class in tmod2"))
+            self.assertEqual(p.erkloader.get_modified_mod_uris(), [tmod2.__URI__])
+
+            # only the parent module tmod3 is loaded explicitly (it loads tmod2 itself)
+            mod_list = p.erkloader.reload_mods()
+
+        self.assertEqual(len(mod_list), 1)
+        new_tmod3 = mod_list[0]
+        new_tmod2 = new_tmod3.tm2
+        self.assertIsNot(new_tmod2, tmod2)
+        self.assertEqual(new_tmod2.I1000.R1, "modified class in tmod2")
+        self.assertIs(new_tmod3.I1000.R4, new_tmod2.I1000)
+        self.assertEqual(p.ds.get_entity_by_uri(tmod2.I1000.uri).R1, "modified class in tmod2")
+
+        # the independent module remains untouched
+        self.assertIs(p.ds.get_entity_by_uri(tmod1.I1000.uri), tmod1.I1000)
+        self.assertEqual(p.erkloader.get_modified_mod_uris(), [])
+
+        p.unload_mod(new_tmod3.__URI__)
+        self.assertNotIn(new_tmod3.__URI__, p.ds.mod_reference_counts)
+
+    def test_c14__parallel_loading(self):
+
+        mod_specs = [
+            (pjoin(TEST_DATA_DIR1, "tmod1.py"), "tm1"),
+            (pjoin(TEST_DATA_DIR1, "tmod2_snapshot.py"), "tm2", "tmod2_renamed"),
+        ]
+        tmod1, tmod2 = p.erkloader.load_mods_in_parallel(mod_specs, processes=2)
+
+        self.assertEqual(tmod1.__URI__, "erk:/pyerk/testmodule1")
+        self.assertIs(sys.modules["tmod2_renamed"], tmod2)
+        self.assertIs(p.ds.get_entity_by_key_str("tm1__I1000"), tmod1.I1000)
+        self.assertEqual(tmod2.I1001.double(2), 4)
+        self.assertIs(tmod2.I1001.R4, tmod2.I1000)
+        self.assertIn(tmod2.__URI__, p.ds.uri_content_hash_dict)
+
+        # the result is the same as for sequential loading
+        labels = [itm.R1 for itm in (tmod1.I1000, tmod2.I1000, tmod2.I1001)]
+        n_rledgs = len(p.ds.relation_edge_uri_map)
+        self.unload_all_mods()
+        self.register_this_module()
+        tmod1, tmod2 = p.erkloader.load_mods_in_parallel(mod_specs, processes=1)
+        self.assertEqual([itm.R1 for itm in (tmod1.I1000, tmod2.I1000, tmod2.I1001)], labels)
+        self.assertEqual(len(p.ds.relation_edge_uri_map), n_rledgs)
+
+    def test_c14b__parallel_loading_shared_dependency(self):
+
+        tmod2 = p.erkloader.load_mod_from_path(pjoin(TEST_DATA_DIR1, "tmod2_snapshot.py"), prefix="tm2")
+        tmod2_uri = tmod2.__URI__
+
+        # a failing worker does not change the DataStore
+        with tempfile.TemporaryDirectory() as tmpdir:
+            failing_modpath = pjoin(tmpdir, "tmod_c14b_failing.py")
+            with open(failing_modpath, "w") as fp:
+                fp.write("raise ValueError('intended error')\n")
+            mod_specs = [
+                (pjoin(TEST_DATA_DIR1, "tmod3_dependent.py"), "tm3"),
+                (failing_modpath, "tmf"),
+            ]
+            with self.assertRaises(ValueError):
+                p.erkloader.load_mods_in_parallel(mod_specs, processes=2)
+        self.assertIs(p.ds.uri_mod_dict[tmod2_uri], tmod2)
+        self.assertIs(p.ds.get_entity_by_key_str("tm2__I1000"), tmod2.I1000)
+
+        # both modules load tmod2 (which replaces the old version exactly once)
+        mod_specs = [
+            (pjoin(TEST_DATA_DIR1, "tmod3_dependent.py"), "tm3"),
+            (pjoin(TEST_DATA_DIR1, "tmod4_dependent.py"), "tm4"),
+        ]
+        tmod3, tmod4 = p.erkloader.load_mods_in_parallel(mod_specs, processes=2)
+        new_tmod2 = p.ds.uri_mod_dict[tmod2_uri]
+        self.assertIsNot(new_tmod2, tmod2)
+        self.assertIs(tmod3.tm2, new_tmod2)
+        self.assertIs(tmod4.tm2, new_tmod2)
+        self.assertIs(tmod3.I1000.R4, new_tmod2.I1000)
+        self.assertIs(tmod4.I1000.R4, new_tmod2.I1000)
+        self.assertEqual(p.ds.uri_parent_mod_dict[tmod2_uri], tmod3.__URI__)
+
+        for mod in (tmod3, tmod4, new_tmod2):
+            p.unload_mod(mod.__URI__)
+
+    def test_c15__incremental_rdfgraph(self):
+
+        try:
+            # (the native query engine does not use the rdflib graph)
+            with self.modified_settings(RDFGRAPH_BACKEND="memory", USE_NATIVE_QUERY_ENGINE=False):
+                self._test_incremental_rdfgraph()
+        finally:
+            p.ds.rdfgraph = None
+
+    def _test_incremental_rdfgraph(self):
+        p.ds.rdfgraph = None
+        qsrc = f"""
+            PREFIX : <{p.rdfstack.ERK_URI}>
+            SELECT ?s ?o
+            WHERE {{
+                ?s :R5 ?o.
+            }}
+        """
+        n0 = len(p.rdfstack.perform_sparql_query(qsrc))
+        graph = p.ds.rdfgraph
+        self.assertIsNotNone(graph)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1")
+            rledg1 = itm1.set_relation(p.R5["is part of"], p.I2)
+            rledg2 = itm1.set_relation(p.R5["is part of"], p.I2)
+
+        res = p.rdfstack.perform_sparql_query(qsrc)
+        self.assertIs(p.ds.rdfgraph, graph)
+        self.assertEqual(len(res), n0 + 1)
+        self.assertIn([itm1, p.I2], res)
+        self.assertEqual(len(p.ds.rdfgraph_pending_rledgs), 0)
+
+        # the triple remains as long as one of the corresponding edges exists
+        rledg1.unlink()
+        self.assertIn([itm1, p.I2], p.rdfstack.perform_sparql_query(qsrc))
+        rledg2.unlink()
+        self.assertEqual(len(p.rdfstack.perform_sparql_query(qsrc)), n0)
+
+        # different pyerk values might correspond to the same rdf triple
+        with p.uri_context(uri=TEST_BASE_URI):
+            rel1 = self.create_test_relation(R1="unit test relation")
+            rledg3 = itm1.set_relation(rel1, "abc")
+            rledg4 = itm1.set_relation(rel1, rdflib.Literal("abc"))
+        triple = p.rdfstack.make_rdf_triple(rledg3)
+        self.assertEqual(p.rdfstack.make_rdf_triple(rledg4), triple)
+        self.assertIn(triple, p.rdfstack.get_rdfgraph())
+        rledg3.unlink()
+        self.assertIn(triple, p.rdfstack.get_rdfgraph())
+        rledg4.unlink()
+        self.assertNotIn(triple, p.rdfstack.get_rdfgraph())
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertEqual(len(p.rdfstack.get_rdfgraph()), len(p.rdfstack.create_rdf_triples()))
+
+    def test_c16__datastore_rdf_store(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1", R4=p.I2["Metaclass"])
+            itm1.set_relation(p.R5["is part of"], p.I2)
+            itm1.set_relation(p.R5["is part of"], p.I2)
+
+        graph = rdflib.Graph(store="pyerk")
+        mirror = p.rdfstack.create_rdf_triples()
+        self.assertEqual(len(graph), len(mirror))
+
+        I2 = rdflib.URIRef(p.I2.uri)
+        R5 = rdflib.URIRef(p.R5.uri)
+        itm1_ref = rdflib.URIRef(itm1.uri)
+        patterns = [
+            (itm1_ref, None, None),
+            (itm1_ref, R5, None),
+            (None, R5, I2),
+            (None, None, I2),
+            (None, rdflib.URIRef(p.R1.uri), rdflib.Literal("unit test item1")),
+        ]
+        for pattern in patterns:
+            self.assertEqual(set(graph.triples(pattern)), set(mirror.triples(pattern)))
+        self.assertEqual(len(list(graph.triples((itm1_ref, R5, None)))), 1)
+        self.assertEqual(set(graph), set(mirror))
+
+        # the store reflects the current data without synchronization
+        p.ds.rdfgraph = graph
+        qsrc = f"PREFIX : <{p.rdfstack.ERK_URI}> SELECT ?s WHERE {{ ?s :R5 :I2. }}"
+        self.assertIn([itm1], p.rdfstack.perform_sparql_query(qsrc))
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertNotIn([itm1], p.rdfstack.perform_sparql_query(qsrc))
+        self.assertEqual(len(p.ds.rdfgraph_pending_rledgs), 0)
+        p.ds.rdfgraph = None
+
+        with self.assertRaises(p.aux.ReadOnlyError):
+            graph.add((I2, R5, I2))
+        with self.assertRaises(p.aux.ReadOnlyError):
+            graph.remove((I2, R5, I2))
+
+    def test_c17__sparql_query_cache(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1 = self.create_test_item(R1="unit test item1")
+            itm1.set_relation(p.R5["is part of"], p.I2)
+
+        qsrc = f"PREFIX : <{p.rdfstack.ERK_URI}> SELECT ?o WHERE {{ ?s :R5__is_part_of ?o. }}"
+        q1 = p.ds.preprocess_query(qsrc)
+        self.assertIs(p.ds.preprocess_query(qsrc), q1)
+        prepared_query = p.rdfstack.get_prepared_query(q1)
+        self.assertIs(p.rdfstack.get_prepared_query(q1), prepared_query)
+
+        res1 = p.rdfstack.perform_sparql_query(qsrc, init_bindings={"s": itm1}, preprocess=True, use_result_cache=True)
+        self.assertEqual(res1, [[p.I2]])
+        self.assertEqual(res1.vars, [rdflib.Variable("o")])
+
+        # the cached result is returned as a copy
+        res1.append("something")
+        res2 = p.rdfstack.perform_sparql_query(qsrc, init_bindings={"s": itm1}, preprocess=True, use_result_cache=True)
+        self.assertEqual(res2, [[p.I2]])
+
+        # the cache is invalidated if relation edges change
+        generation = p.ds.generation
+        with p.uri_context(uri=TEST_BASE_URI):
+            itm1.set_relation(p.R5["is part of"], p.I1)
+        self.assertGreater(p.ds.generation, generation)
+        res3 = p.rdfstack.perform_sparql_query(qsrc, init_bindings={"s": itm1}, preprocess=True, use_result_cache=True)
+        self.assertEqual(sorted(res3, key=repr), sorted([[p.I1], [p.I2]], key=repr))
+
+        # raw results are also returned as copies
+        kwargs = dict(init_bindings={"s": itm1}, preprocess=True, use_result_cache=True, return_raw=True)
+        raw_res1 = p.rdfstack.perform_sparql_query(qsrc, **kwargs)
+        self.assertEqual(len(list(raw_res1)), 2)
+        raw_res1.bindings.clear()
+        raw_res2 = p.rdfstack.perform_sparql_query(qsrc, **kwargs)
+        self.assertIsNot(raw_res2, raw_res1)
+        self.assertEqual(len(list(raw_res2)), 2)
+
+        # the caches are bounded
+        cache = p.ds.sparql_query_cache
+        maxsize = cache.maxsize
+        cache.maxsize = 2
+        try:
+            prepared_queries = [p.rdfstack.get_prepared_query(f"{q1} LIMIT {i + 1}") for i in range(3)]
+            self.assertEqual(len(cache), 2)
+            self.assertNotIn(prepared_queries[0], cache.values())
+            self.assertIn(prepared_queries[2], cache.values())
+        finally:
+            cache.maxsize = maxsize
+
+        # query plans do not keep their queries alive
+        self.assertIn(prepared_query, p.ds.native_query_plan_cache)
+        query_ref = weakref.ref(prepared_query)
+        del prepared_query
+        gc.collect()
+        self.assertIsNone(query_ref())
+
+        lru_cache = p.aux.LRUCache(maxsize=2)
+        lru_cache["a"] = 1
+        lru_cache["b"] = 2
+        self.assertEqual(lru_cache["a"], 1)
+        lru_cache["c"] = 3
+        self.assertEqual(list(lru_cache), ["a", "c"])
+
+    def test_c18__streaming_sparql_results(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            items = [self.create_test_item(R1=f"unit test item{i}") for i in range(5)]
+            for itm in items:
+                itm.set_relation(p.R5["is part of"], p.I2)
+
+        qsrc = f"PREFIX : <{p.rdfstack.ERK_URI}> SELECT ?s ?o WHERE {{ ?s :R5 ?o. }}"
+        res = p.rdfstack.perform_sparql_query(qsrc)
+        rows = p.rdfstack.iter_sparql_query(qsrc)
+        self.assertNotIsInstance(rows, list)
+        self.assertEqual(list(rows), list(res))
+        for itm in items:
+            self.assertIn([itm, p.I2], res)
+
+        self.assertEqual(len(list(p.rdfstack.iter_sparql_query(qsrc, limit=3))), 3)
+        self.assertEqual(list(p.rdfstack.iter_sparql_query(qsrc, limit=0)), [])
+
+        # entities are resolved only once per query
+        uri_cache = {}
+        obj1 = p.rdfstack.convert_from_rdf_to_pyerk(rdflib.URIRef(p.I2.uri), uri_cache)
+        self.assertIs(obj1, p.I2)
+        self.assertEqual(uri_cache, {p.I2.uri: p.I2})
+
+    def test_c19__native_query_engine(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            items = [self.create_test_item(R1=f"unit test item{i}") for i in range(4)]
+            for itm in items[:3]:
+                itm.set_relation(p.R5["is part of"], items[3])
+            # duplicate edge (corresponds to the same triple)
+            items[0].set_relation(p.R5["is part of"], items[3])
+            items[1].set_relation(p.R5["is part of"], items[2])
+
+        erk = f"PREFIX : <{p.rdfstack.ERK_URI}>"
+        queries = [
+            f"{erk} SELECT ?s ?o WHERE {{ ?s :R5 ?o. }}",
+            f"{erk} SELECT ?s WHERE {{ ?s :R5 <{items[3].uri}>. ?s :R1 ?label. FILTER(?label != 'unit test item2') }}",
+            f"{erk} SELECT DISTINCT ?o WHERE {{ ?s :R5 ?o. }}",
+            f"{erk} SELECT ?s ?x WHERE {{ ?s :R1 'unit test item1'. ?s :R5 ?o. ?o :R5 ?x. }}",
+            f"{erk} SELECT ?o WHERE {{ ?s :R5 ?o. FILTER(isURI(?o) && ?s = <{items[1].uri}>) }}",
+            f"{erk} SELECT * WHERE {{ ?s :R5 ?o. ?o :R1 ?label. }} LIMIT 2",
+            # filters which refer to variables that are not bound by the basic graph pattern
+            f"{erk} SELECT ?s WHERE {{ ?s :R5 ?o. FILTER(bound(?zz) || ?o = <{items[2].uri}>) }}",
+            f"{erk} SELECT ?s WHERE {{ ?s :R5 ?o. FILTER(?zz != 1 || ?o = <{items[2].uri}>) }}",
+        ]
+
+        def sort_key(row):
+            return repr(row)
+
+        for qsrc in queries:
+            prepared_query = p.rdfstack.get_prepared_query(qsrc)
+            self.assertIsNotNone(p.queryengine.get_query_plan(prepared_query), qsrc)
+
+            with self.modified_settings(USE_NATIVE_QUERY_ENGINE=False):
+                res_rdflib = p.rdfstack.perform_sparql_query(qsrc)
+            res_native = p.rdfstack.perform_sparql_query(qsrc)
+            self.assertEqual(res_native.vars, res_rdflib.vars)
+            if "LIMIT" in qsrc:
+                self.assertEqual(len(res_native), len(res_rdflib))
+            else:
+                self.assertEqual(sorted(res_native, key=sort_key), sorted(res_rdflib, key=sort_key), qsrc)
+
+        # variables which only occur in filters can be bound by the caller
+        qsrc = f"{erk} SELECT ?s WHERE {{ ?s :R5 ?o. FILTER(?o = ?zz) }}"
+        self.assertEqual(p.rdfstack.perform_sparql_query(qsrc, init_bindings={"zz": items[2]}), [[items[1]]])
+
+        # the rdflib graph is only created if it is needed (e.g. for EXISTS)
+        p.ds.rdfgraph = None
+        try:
+            # (the prefixes of the loaded modules are known without the graph)
+            qsrc = f"SELECT ?s WHERE {{ ?s bi:R5 <{items[2].uri}>. }}"
+            self.assertEqual(p.rdfstack.perform_sparql_query(qsrc), [[items[1]]])
+            self.assertIsNone(p.ds.rdfgraph)
+            qsrc = f"{erk} SELECT ?s WHERE {{ ?s :R5 ?o. FILTER EXISTS {{ ?o :R5 <{items[3].uri}> }} }}"
+            self.assertEqual(p.rdfstack.perform_sparql_query(qsrc), [[items[1]]])
+            self.assertIsNotNone(p.ds.rdfgraph)
+        finally:
+            p.ds.rdfgraph = None
+
+        # queries with unsupported elements are evaluated by rdflib
+        qsrc = f"{erk} SELECT ?s ?o WHERE {{ ?s :R1 ?l. OPTIONAL {{ ?s :R5 ?o. }} }}"
+        self.assertIsNone(p.queryengine.get_query_plan(p.rdfstack.get_prepared_query(qsrc)))
+        self.assertIn([items[3], None], p.rdfstack.perform_sparql_query(qsrc))
+
+        # without the (private) filter evaluation of rdflib, queries with filters are evaluated by rdflib
+        qsrc = f"{erk} SELECT ?s WHERE {{ ?s :R5 ?o. FILTER(?o = <{items[2].uri}>) }}"
+        with mock.patch.object(p.queryengine, "_ebv", None):
+            self.assertIsNone(p.queryengine.get_query_plan(p.rdfstack.get_prepared_query(qsrc)))
+            self.assertEqual(p.rdfstack.perform_sparql_query(qsrc), [[items[1]]])
+
+        # python api
+        res = list(p.queryengine.match_bgp([("?s", p.R5, "?o"), ("?o", p.R5, items[3])]))
+        self.assertEqual(res, [{"s": items[1], "o": items[2]}])
+        res = list(p.queryengine.match_bgp([("?s", p.R1, "unit test item2")]))
+        self.assertEqual(res, [{"s": items[2]}])
+        res = p.queryengine.match_bgp([("?s", p.R5, "?o")], init_bindings={"o": items[3]}, limit=2)
+        self.assertEqual(len(list(res)), 2)
+        res = p.queryengine.match_bgp([("?s", p.R5, "?o")], filter_func=lambda sol: sol["o"] is items[2])
+        self.assertEqual(list(res), [{"s": items[1], "o": items[2]}])
+
+    def test_c20__relation_statistics(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            rel = self.create_test_relation(R1="unit test relation")
+            items = [self.create_test_item(R1=f"unit test item{i}") for i in range(5)]
+            rledgs = [itm.set_relation(rel, items[0]) for itm in items[1:]]
+            rledgs.append(items[1].set_relation(rel, items[2]))
+
+        stats = p.ds.get_relation_statistics(rel.uri)
+        self.assertEqual(stats.n_edges, 5)
+        self.assertEqual(stats.n_subjects, 4)
+        self.assertEqual(stats.n_objects, 2)
+        self.assertEqual(stats.subject_counts[items[1].uri], 2)
+        self.assertEqual(dict(stats.fanout_histogram), {1: 3, 2: 1})
+        self.assertEqual(dict(stats.fanin_histogram), {4: 1, 1: 1})
+        self.assertEqual(stats.avg_fanout, 5 / 4)
+
+        rledgs[0].unlink()
+        self.assertEqual(stats.n_edges, 4)
+        self.assertEqual(dict(stats.fanin_histogram), {3: 1, 1: 1})
+
+        # patterns with a rare relation are evaluated first
+        common = p.queryengine.TriplePattern(rdflib.Variable("s"), p.R1.uri, rdflib.Variable("o"))
+        rare = p.queryengine.TriplePattern(rdflib.Variable("s"), rel.uri, rdflib.Variable("o"))
+        self.assertLess(p.queryengine.estimate_cost(rare, {}), p.queryengine.estimate_cost(common, {}))
+        bound = p.queryengine.TriplePattern(rdflib.Variable("s"), rel.uri, items[0].uri)
+        self.assertEqual(p.queryengine.estimate_cost(bound, {}), 3)
+
+        p.unload_mod(TEST_BASE_URI, strict=False)
+        self.assertNotIn(rel.uri, p.ds.relation_statistics)
+        self.assertEqual(p.ds.get_relation_statistics(rel.uri).n_edges, 0)
+
     def test_evaluated_mapping(self):
 
         res = p.ds.relation_edges.get("RE6229")
@@ -509,7 +1375,8 @@ class Test_01_Core(HouskeeperMixin, unittest.TestCase):
 
         # test the expected qualifier
         q = re.qualifiers[0]
-        self.assertEqual(q.relation_tuple[0], re)
+        # qualifiers belong to the primal relation edge (`re` is the inverse edge)
+        self.assertEqual(q.relation_tuple[0], re.dual_relation_edge)
         self.assertEqual(q.relation_tuple[1], p.R34["has proxy item"])
 
         # this is the proxy item
@@ -735,6 +1602,294 @@ class Test_02_ruleengine(HouskeeperMixin, unittest.TestCase):
         with p.uri_context(uri=TEST_BASE_URI):
             res = p.ruleengine.apply_all_semantic_rules()
 
+    def test_ruleengine06__shared_graph(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(4)]
+            for prop1, prop2 in zip(props[1:], props[:-1]):
+                prop1.set_relation(p.R17["is subproperty of"], prop2)
+
+            G = p.ruleengine.create_simple_graph()
+            n_edges = G.number_of_edges()
+            ra = p.ruleengine.RuleApplicator(self.rule1, G=G)
+            self.assertIs(ra.G, G)
+            res = ra.apply()
+
+        self.assertEqual(len(res), 2)
+
+        # the shared graph is updated incrementally and equals a newly created graph
+        G2 = p.ruleengine.create_simple_graph()
+        self.assertEqual(set(G.nodes), set(G2.nodes))
+        self.assertEqual(dict(G.edges), dict(G2.edges))
+        self.assertGreaterEqual(G.number_of_edges(), n_edges)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            res = p.ruleengine.apply_all_semantic_rules()
+        self.assertIsInstance(res, list)
+
+        # an item which is moved into a scope is removed from the graph
+        with p.uri_context(uri=TEST_BASE_URI):
+            rledg = props[0].set_relation(p.R20["has defining scope"], self.rule1.scp__context)
+        p.ruleengine.update_simple_graph(G, [rledg])
+        self.assertNotIn(props[0].uri, G.nodes)
+        self.assertEqual(set(G.nodes), set(p.ruleengine.create_simple_graph().nodes))
+
+    def test_ruleengine07__fixpoint(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(5)]
+            for prop1, prop2 in zip(props[1:], props[:-1]):
+                prop1.set_relation(p.R17["is subproperty of"], prop2)
+
+            # semi-naive evaluation: only matches which contain a changed node pair are considered
+            ra = p.ruleengine.RuleApplicator(self.rule1)
+            self.assertEqual(len(ra.match_subgraph_P()), 3)
+            self.assertEqual(ra.match_subgraph_P(changed_node_pairs=set()), [])
+            res_graph = ra.match_subgraph_P(changed_node_pairs={(props[1].uri, props[0].uri)})
+            self.assertEqual(len(res_graph), 1)
+            self.assertEqual(set(res_graph[0].values()), set(props[:3]))
+
+            res = p.ruleengine.apply_all_semantic_rules(fixpoint=True)
+
+            # no further consequences
+            self.assertEqual(p.ruleengine.apply_all_semantic_rules(fixpoint=True), [])
+
+        # transitive closure: every property is a subproperty of all properties with smaller index
+        self.assertEqual(len(res), 6)
+        for i, prop in enumerate(props):
+            objs = prop.get_relations("R17__is_subproperty_of", return_obj=True)
+            self.assertEqual(set(objs), set(props[:i]))
+
+    def test_ruleengine07b__non_fixpoint_semantics(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(3)]
+            for prop1, prop2 in zip(props[1:], props[:-1]):
+                prop1.set_relation(p.R17["is subproperty of"], prop2)
+
+            # this is the second R17 edge of props[2]
+            props[2].set_relation(p.R17["is subproperty of"], props[0])
+
+        # by default the graph only contains the first item-valued edge of every (subject, relation)
+        G = p.ruleengine.create_simple_graph()
+        self.assertFalse(G.has_edge(props[2].uri, props[0].uri))
+        G_all = p.ruleengine.create_simple_graph(all_edges=True)
+        self.assertTrue(G_all.has_edge(props[2].uri, props[0].uri))
+
+        # thus the rule matches and (without fixpoint mode) the existing assertion is created again
+        with p.uri_context(uri=TEST_BASE_URI):
+            res = p.ruleengine.apply_all_semantic_rules()
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0].relation_tuple, (props[2], p.R17, props[0]))
+        self.assertEqual(len(props[2].get_relations("R17__is_subproperty_of")), 3)
+
+        # in fixpoint mode (props[2], props[1], props[0]) is no induced match
+        with p.uri_context(uri=TEST_BASE_URI):
+            res = p.ruleengine.apply_all_semantic_rules(fixpoint=True)
+        self.assertEqual(res, [])
+
+    def test_ruleengine08__join_matcher(self):
+
+        def get_match_set(ra, matcher):
+            ra.matcher = matcher
+            return {tuple(sorted((k, v.uri) for k, v in d.items())) for d in ra.match_subgraph_P()}
+
+        with self.assertRaises(ValueError):
+            p.ruleengine.RuleApplicator(self.rule1, matcher="unknown")
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(6)]
+            for prop1, prop2 in zip(props[1:], props[:-1]):
+                prop1.set_relation(p.R17["is subproperty of"], prop2)
+
+            # due to this edge (props[3], props[2], props[1]) is no induced subgraph which matches the premises
+            props[3].set_relation(p.R17["is subproperty of"], props[1])
+
+            # this edge must not be used for matching
+            props[5].set_relation(p.R17["is subproperty of"], "unit test literal")
+
+        ra = p.ruleengine.RuleApplicator(self.rule1)
+        self.assertEqual(ra.matcher, p.settings.RULEENGINE_MATCHER)
+
+        # default graph: only the first R17 edge of props[3] is considered
+        self.assertEqual(get_match_set(ra, "join"), get_match_set(ra, "vf2"))
+
+        G = p.ruleengine.create_simple_graph(all_edges=True)
+        ra = p.ruleengine.RuleApplicator(self.rule1, G=G)
+
+        res_join = get_match_set(ra, "join")
+        res_vf2 = get_match_set(ra, "vf2")
+        self.assertEqual(res_join, res_vf2)
+        self.assertEqual(len(res_join), 5)
+
+        res_graph = p.ruleengine.match_subgraph_join(ra.G, ra.P)
+        matched_uri_tuples = {tuple(d[i] for i in range(3)) for d in res_graph}
+        self.assertNotIn((props[1].uri, props[2].uri, props[3].uri), matched_uri_tuples)
+        self.assertIn((props[0].uri, props[1].uri, props[2].uri), matched_uri_tuples)
+
+        # semi-naive matching and application with both matchers
+        changed_node_pairs = {(props[5].uri, props[4].uri)}
+        for matcher in p.ruleengine.SUBGRAPH_MATCHERS:
+            ra.matcher = matcher
+            self.assertEqual(len(ra.match_subgraph_P(changed_node_pairs)), 1)
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            res = p.ruleengine.RuleApplicator(self.rule1, G=G, matcher="join").apply()
+        self.assertEqual(len(res), 5)
+
+    def test_ruleengine09__type_constraints(self):
+
+        I11 = p.I11["mathematical property"]
+        with p.uri_context(uri=TEST_BASE_URI):
+            subclass = self.create_test_item(R1="unit test property subclass", R3__is_subclass_of=I11)
+            props = [p.instance_of(I11, r1=f"unit test property {i}") for i in range(2)]
+            props.append(p.instance_of(subclass, r1="unit test property 2"))
+            objs = [p.instance_of(p.I12["mathematical object"], r1=f"unit test object {i}") for i in range(3)]
+
+            for items in (props, objs):
+                for itm1, itm2 in zip(items[1:], items[:-1]):
+                    itm1.set_relation(p.R17["is subproperty of"], itm2)
+
+        self.assertIn(subclass.uri, p.ruleengine.get_subclass_uris(I11.uri))
+        instance_uris = p.ruleengine.get_instance_uris(I11.uri)
+        self.assertTrue({itm.uri for itm in props}.issubset(instance_uris))
+        self.assertFalse({itm.uri for itm in objs}.intersection(instance_uris))
+
+        # the index is invalidated by changes of relation edges
+        with p.uri_context(uri=TEST_BASE_URI):
+            prop3 = p.instance_of(subclass, r1="unit test property 3")
+        self.assertIn(prop3.uri, p.ruleengine.get_instance_uris(I11.uri))
+
+        # only the properties (instances of I11 or its subclass) match the rule variables
+        ra = p.ruleengine.RuleApplicator(self.rule1)
+        for matcher in p.ruleengine.SUBGRAPH_MATCHERS:
+            ra.matcher = matcher
+            res_graph = ra.match_subgraph_P()
+            self.assertEqual(len(res_graph), 1)
+            self.assertEqual(set(res_graph[0].values()), set(props))
+
+    def test_ruleengine09b__type_change_in_delta(self):
+
+        I11 = p.I11["mathematical property"]
+        with p.uri_context(uri=TEST_BASE_URI):
+            xx = [p.instance_of(I11, r1=f"unit test property {i}") for i in range(2)]
+            xx.append(self.create_test_item(R1="unit test untyped item"))
+            for itm1, itm2 in zip(xx[1:], xx[:-1]):
+                itm1.set_relation(p.R17["is subproperty of"], itm2)
+
+        ra = p.ruleengine.RuleApplicator(self.rule1)
+        self.assertEqual(ra.match_subgraph_P(), [])
+
+        # the new type of x2 only produces the edge (x2, I11) which is not part of the match
+        with p.uri_context(uri=TEST_BASE_URI):
+            rledg = xx[2].set_relation(p.R4["is instance of"], I11)
+        changed_node_pairs = p.ruleengine.update_simple_graph(ra.G, [rledg])
+        self.assertIn((xx[2].uri, xx[2].uri), changed_node_pairs)
+
+        for matcher in p.ruleengine.SUBGRAPH_MATCHERS:
+            ra.matcher = matcher
+            self.assertEqual(len(ra.match_subgraph_P()), 1)
+            self.assertEqual(ra.match_subgraph_P(changed_node_pairs), ra.match_subgraph_P())
+
+        # the same for a type change via R3 (the instances of the subclass are affected)
+        with p.uri_context(uri=TEST_BASE_URI):
+            cls = self.create_test_item(R1="unit test class", R4=p.I2["Metaclass"])
+            yy = [p.instance_of(I11, r1=f"unit test property y{i}") for i in range(2)]
+            yy.append(p.instance_of(cls, r1="unit test property y2"))
+            for itm1, itm2 in zip(yy[1:], yy[:-1]):
+                itm1.set_relation(p.R17["is subproperty of"], itm2)
+            rledg = cls.set_relation(p.R3["is subclass of"], I11)
+
+        ra = p.ruleengine.RuleApplicator(self.rule1)
+        changed_node_pairs = p.ruleengine.update_simple_graph(ra.G, [rledg])
+        self.assertIn((yy[2].uri, yy[2].uri), changed_node_pairs)
+        res_graph = ra.match_subgraph_P(changed_node_pairs)
+        self.assertEqual(len(res_graph), 1)
+        self.assertEqual(set(res_graph[0].values()), set(yy))
+
+    def test_ruleengine10__parallel(self):
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(6)]
+            for prop1, prop2 in zip(props[1:], props[:-1]):
+                prop1.set_relation(p.R17["is subproperty of"], prop2)
+
+        ra = p.ruleengine.RuleApplicator(self.rule1)
+        self.assertEqual(ra.get_anchor_node(), 1)
+        self.assertEqual(ra.get_anchor_candidates(), sorted(p.ruleengine.get_instance_uris(p.I11.uri) & set(ra.G)))
+
+        def get_match_set(uri_result_map):
+            return {tuple(sorted(d.items())) for d in uri_result_map}
+
+        expected = get_match_set(ra.match_subgraph_P_uris())
+        self.assertEqual(len(expected), 4)
+
+        # matches are partitioned by the anchor node
+        anchor_uris = {props[1].uri, props[2].uri}
+        self.assertEqual(len(ra.match_subgraph_P_uris(anchor_uris=anchor_uris)), 2)
+
+        # more processes than rules -> the candidates of the anchor node are partitioned
+        for matcher in p.ruleengine.SUBGRAPH_MATCHERS:
+            ra.matcher = matcher
+            res1 = p.ruleengine.match_rules_in_parallel([ra], processes=3)
+            res2 = p.ruleengine.match_rules_in_parallel([ra], processes=3)
+            self.assertEqual(len(res1), 1)
+            self.assertEqual(get_match_set(res1[0]), expected)
+
+            # deterministic order
+            self.assertEqual(res1, res2)
+
+        # sequential fallback
+        self.assertIsNone(p.ruleengine.match_rules_in_parallel([ra], processes=1))
+
+        with p.uri_context(uri=TEST_BASE_URI):
+            res = p.ruleengine.apply_all_semantic_rules(fixpoint=True, processes=2)
+
+        # transitive closure (5 + 4 + 3 + 2 + 1 edges, 5 of which existed before)
+        self.assertEqual(len(res), 10)
+        for i, prop in enumerate(props):
+            objs = prop.get_relations("R17__is_subproperty_of", return_obj=True)
+            self.assertEqual(set(objs), set(props[:i]))
+
+    def test_ruleengine11__parallel_dependent_rules(self):
+
+        def setup_data_and_apply(processes):
+            with p.uri_context(uri=TEST_BASE_URI):
+                # this rule creates the R17 edges which are used by self.rule1
+                rule2 = self.create_test_item(
+                    R1__has_label="part-subproperty rule",
+                    R4__is_instance_of=p.I41["semantic rule"],
+                )
+                with rule2["part-subproperty rule"].scope("context") as cm:
+                    cm.new_var(P1=p.instance_of(p.I11["mathematical property"]))
+                    cm.new_var(P2=p.instance_of(p.I11["mathematical property"]))
+                with rule2["part-subproperty rule"].scope("premises") as cm:
+                    cm.new_rel(cm.P2, p.R5["is part of"], cm.P1)
+                with rule2["part-subproperty rule"].scope("assertions") as cm:
+                    cm.new_rel(cm.P2, p.R17["is subproperty of"], cm.P1)
+
+                props = [p.instance_of(p.I11["mathematical property"], r1=f"unit test property {i}") for i in range(5)]
+                for prop1, prop2 in zip(props[1:], props[:-1]):
+                    prop1.set_relation(p.R5["is part of"], prop2)
+
+                with self.assertRaises(ValueError):
+                    p.ruleengine.apply_all_semantic_rules(processes=2)
+
+                res = p.ruleengine.apply_all_semantic_rules(fixpoint=True, processes=processes)
+
+            return {(rledg.relation_tuple[0].R1, rledg.relation_tuple[2].R1) for rledg in res}
+
+        res1 = setup_data_and_apply(processes=1)
+        self.assertEqual(len(res1), 4 + 6)
+
+        # start again with the same data
+        self.tearDown()
+        self.register_this_module()
+        self.setup_data1()
+
+        res2 = setup_data_and_apply(processes=2)
+        self.assertEqual(res1, res2)
+
 
 class Test_03_Core(HouskeeperMixin, unittest.TestCase):
     """
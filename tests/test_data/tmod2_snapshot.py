@@ -0,0 +1,35 @@
+import pyerk as p
+
+__URI__ = "erk:/pyerk/testmodule2"
+keymanager = p.KeyManager()
+p.register_mod(__URI__, keymanager)
+p.start_mod(__URI__)
+
+
+I1000 = p.create_item(
+    R1__has_label="test class in tmod2",
+    R2__has_description="item with a method",
+    R4__is_instance_of=p.I2["Metaclass"],
+)
+
+
+def double(self, value):
+    return 2 * value
+
+
+I1000.add_method(double)
+
+
+I1001 = p.create_item(
+    R1__has_label="test instance in tmod2",
+    R4__is_instance_of=I1000,
+)
+
+R1000 = p.create_relation(
+    R1__has_label="test relation in tmod2",
+)
+
+I1001.set_relation(R1000, I1000)
+
+
+p.end_mod()
@@ -0,0 +1,18 @@
+import pyerk as p
+
+# this module depends on tmod2 (it refers to its entities)
+tm2 = p.erkloader.load_mod_from_path("tmod2_snapshot.py", prefix="tm2")
+
+__URI__ = "erk:/pyerk/testmodule3"
+keymanager = p.KeyManager()
+p.register_mod(__URI__, keymanager)
+p.start_mod(__URI__)
+
+
+I1000 = p.create_item(
+    R1__has_label="test item in tmod3",
+    R4__is_instance_of=tm2.I1000,
+)
+
+
+p.end_mod()
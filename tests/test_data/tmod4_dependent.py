@@ -0,0 +1,18 @@
+import pyerk as p
+
+# this module also depends on tmod2 (like tmod3)
+tm2 = p.erkloader.load_mod_from_path("tmod2_snapshot.py", prefix="tm2")
+
+__URI__ = "erk:/pyerk/testmodule4"
+keymanager = p.KeyManager()
+p.register_mod(__URI__, keymanager)
+p.start_mod(__URI__)
+
+
+I1000 = p.create_item(
+    R1__has_label="test item in tmod4",
+    R4__is_instance_of=tm2.I1000,
+)
+
+
+p.end_mod()